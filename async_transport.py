@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+import asyncio
+import ssl
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit, urljoin
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import default_user_agent, get_encoding_from_headers
+from transport import TransportStats
+
+try:
+    import certifi
+except ImportError:
+    certifi = None
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class _Connection:
+    """A keep-alive HTTP/1.1 connection, only touched on the event loop thread"""
+
+    def __init__(self, origin, reader, writer):
+        self.origin = origin
+        self.reader = reader
+        self.writer = writer
+
+    @property
+    def usable(self):
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def abort(self):
+        self.writer.transport.abort()
+
+
+class _ConnectionHandle:
+    """Stands in for urllib3's raw.connection, so CancelToken can abort a blocked read from any thread"""
+
+    def __init__(self, loop, connection):
+        self._loop = loop
+        self._connection = connection
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._connection.abort)
+
+
+class _Body:
+    """File-like response body read through the event loop, used as requests.Response.raw
+
+    Provides the parts of urllib3's HTTPResponse that requests and this
+    launcher use: read(), stream(), close() and connection. The connection
+    goes back to the pool as soon as the last byte of the body is read.
+    """
+
+    def __init__(self, transport, connection, mode, length, keep_alive, read_timeout):
+        self._transport = transport
+        self._connection = connection
+        self._mode = mode  # "none", "length", "chunked" or "close"
+        self._remaining = length
+        self._chunk_left = 0
+        self._keep_alive = keep_alive
+        self._read_timeout = read_timeout
+        self._received = 0
+        self._done = False
+        self.connection = _ConnectionHandle(transport.loop, connection)
+        if mode == "none" or (mode == "length" and not length):
+            self._finish(keep_alive)
+
+    @property
+    def closed(self):
+        return self._done
+
+    def read(self, amt=None, decode_content=None):
+        """Read up to amt bytes, or the rest of the body, b"" once it is complete"""
+        if self._done:
+            return b""
+        return self._transport._run(self._read(amt))
+
+    def stream(self, amt=64 * 1024, decode_content=None):
+        while True:
+            data = self.read(amt)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        if not self._done:
+            self._transport.loop.call_soon_threadsafe(self._finish, False)
+
+    async def _read_some(self, size):
+        data = await asyncio.wait_for(self._connection.reader.read(size), self._read_timeout)
+        if not data:
+            raise ConnectionResetError("Connection closed before the body was complete")
+        return data
+
+    async def _read_line(self):
+        line = await asyncio.wait_for(self._connection.reader.readline(), self._read_timeout)
+        if not line:
+            raise ConnectionResetError("Connection closed before the body was complete")
+        return line
+
+    async def _read(self, amt=None):
+        out = bytearray()
+        try:
+            while not self._done and (amt is None or len(out) < amt):
+                want = 1024 * 1024 if amt is None else amt - len(out)
+                if self._mode == "length":
+                    data = await self._read_some(min(want, self._remaining))
+                    self._remaining -= len(data)
+                    if not self._remaining:
+                        self._finish(self._keep_alive)
+                elif self._mode == "chunked":
+                    if not self._chunk_left:
+                        size = int((await self._read_line()).split(b";")[0].strip(), 16)
+                        if not size:
+                            # Skip the trailers
+                            while (await self._read_line()).strip():
+                                pass
+                            self._finish(self._keep_alive)
+                            break
+                        self._chunk_left = size
+                    data = await self._read_some(min(want, self._chunk_left))
+                    self._chunk_left -= len(data)
+                    if not self._chunk_left:
+                        await asyncio.wait_for(self._connection.reader.readexactly(2), self._read_timeout)
+                else:
+                    data = await asyncio.wait_for(self._connection.reader.read(want), self._read_timeout)
+                    if not data:
+                        self._finish(False)
+                        break
+                self._received += len(data)
+                out += data
+        except asyncio.TimeoutError:
+            self._finish(False)
+            raise requests.ReadTimeout(f"Read timed out after {self._read_timeout}s")
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            self._finish(False)
+            raise requests.ConnectionError(f"Connection broken: {str(e)}")
+        return bytes(out)
+
+    def _finish(self, reusable):
+        if self._done:
+            return
+        self._done = True
+        if reusable:
+            self._transport._release(self._connection)
+        else:
+            self._connection.abort()
+        self._transport._stats.end(self._received)
+
+
+class AsyncioTransport:
+    """Transport multiplexing every request on one asyncio event loop thread
+
+    Connections are plain asyncio streams kept alive in a per-host pool, so
+    update checks and download segments share a handful of sockets and a
+    single I/O thread. Callers keep the blocking interface of HttpTransport:
+    each call hands a coroutine to the loop and waits for its result.
+    Responses are requests.Response objects, so raise_for_status() and
+    iter_content() behave the same. Proxies from the environment and
+    compressed encodings are not supported.
+    """
+
+    name = "asyncio"
+    # Bytes a connection buffers ahead of the reader before pausing the socket
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, pool_maxsize=16, timeout=30):
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self._idle = {}  # {(scheme, host, port): [_Connection]}, only touched on the loop thread
+        self._stats = TransportStats()
+        self._ssl_context = None
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, name="AsyncioTransport")
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a transport sized from the "downloads" section of config.json"""
+        options = (config or {}).get("downloads", {})
+        segments = options.get("segments", 4)
+        return cls(
+            pool_maxsize=options.get("pool_maxsize", max(16, segments * 4)),
+            timeout=options.get("timeout", 30)
+        )
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def head(self, url, headers=None, timeout=None, allow_redirects=False, **kwargs):
+        """Send a HEAD request"""
+        return self._run(self._request("HEAD", url, headers, timeout, False, allow_redirects))
+
+    def get(self, url, headers=None, timeout=None, stream=False, allow_redirects=True, **kwargs):
+        """Send a GET request, reading the body up front unless stream is set"""
+        return self._run(self._request("GET", url, headers, timeout, stream, allow_redirects))
+
+    def stats(self):
+        """Return request, connection reuse and throughput counters, see TransportStats"""
+        return self._stats.snapshot(self.name)
+
+    def prewarm(self, urls, timeout=5):
+        """Open pooled connections to the hosts of urls without sending a request"""
+        origins = []
+        for url in urls:
+            origin = self._origin(url)
+            if origin[1] and origin not in origins:
+                origins.append(origin)
+
+        for origin in origins:
+            asyncio.run_coroutine_threadsafe(self._prewarm(origin, timeout), self.loop)
+
+    async def _prewarm(self, origin, timeout):
+        try:
+            connection, _ = await self._acquire(origin, timeout)
+            self._release(connection)
+        except requests.RequestException as e:
+            print(f"Could not pre-warm connection to {origin[1]}: {str(e)}")
+
+    @staticmethod
+    def _origin(url):
+        parts = urlsplit(url)
+        return parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS.get(parts.scheme, 80)
+
+    def _timeouts(self, timeout):
+        """Split a requests-style timeout into (connect, read) seconds"""
+        if timeout is None:
+            timeout = self.timeout
+        if isinstance(timeout, tuple):
+            return timeout
+        return timeout, timeout
+
+    async def _request(self, method, url, headers, timeout, stream, allow_redirects):
+        connect_timeout, read_timeout = self._timeouts(timeout)
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._send(method, url, headers, connect_timeout, read_timeout)
+            location = response.headers.get("location")
+            if allow_redirects and response.status_code in REDIRECT_CODES and location:
+                # Drain the redirect body so its connection can be reused
+                await response.raw._read()
+                url = urljoin(url, location)
+                if response.status_code == 303:
+                    method = "GET"
+                continue
+
+            if not stream:
+                response._content = await response.raw._read()
+                response._content_consumed = True
+            return response
+
+        raise requests.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects")
+
+    async def _send(self, method, url, headers, connect_timeout, read_timeout):
+        parts = urlsplit(url)
+        origin = self._origin(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host = parts.hostname if origin[2] == DEFAULT_PORTS.get(origin[0]) else f"{parts.hostname}:{origin[2]}"
+
+        fields = CaseInsensitiveDict({
+            "Host": host,
+            "User-Agent": default_user_agent(),
+            "Accept-Encoding": "identity",
+            "Accept": "*/*",
+            "Connection": "keep-alive"
+        })
+        fields.update(headers or {})
+        request = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in fields.items()) + "\r\n"
+
+        self._stats.begin()
+        # Like requests, elapsed runs from sending the request until the headers are parsed
+        started = time.monotonic()
+        try:
+            # A pooled connection may have been closed by the server meanwhile, retry once on a new one
+            for attempt in range(2):
+                connection, reused = await self._acquire(origin, connect_timeout)
+                try:
+                    connection.writer.write(request.encode("latin-1"))
+                    status_line = await asyncio.wait_for(connection.reader.readline(), read_timeout)
+                    if not status_line:
+                        raise ConnectionResetError("Connection closed by the server")
+                    header_lines = []
+                    while True:
+                        line = await asyncio.wait_for(connection.reader.readline(), read_timeout)
+                        if not line.strip():
+                            break
+                        header_lines.append(line)
+                    break
+                except asyncio.TimeoutError:
+                    connection.abort()
+                    raise requests.ReadTimeout(f"{url} did not answer within {read_timeout}s")
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    connection.abort()
+                    if reused and not attempt:
+                        continue
+                    raise requests.ConnectionError(f"Connection to {origin[1]} broken: {str(e)}")
+        except Exception:
+            self._stats.end()
+            raise
+
+        version, status, reason = (status_line.decode("latin-1").strip().split(" ", 2) + [""])[:3]
+        status = int(status)
+        response_headers = CaseInsensitiveDict()
+        for line in header_lines:
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip(), value.strip()
+            response_headers[name] = f"{response_headers[name]}, {value}" if name in response_headers else value
+
+        length = 0
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            mode = "none"
+        elif "chunked" in response_headers.get("transfer-encoding", "").lower():
+            mode = "chunked"
+        elif "content-length" in response_headers:
+            mode = "length"
+            length = int(response_headers["content-length"])
+        else:
+            mode = "close"
+        keep_alive = (version == "HTTP/1.1" and mode != "close"
+                      and response_headers.get("connection", "").lower() != "close")
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = response_headers
+        response.url = url
+        response.encoding = get_encoding_from_headers(response_headers)
+        response.elapsed = timedelta(seconds=time.monotonic() - started)
+        response.raw = _Body(self, connection, mode, length, keep_alive, read_timeout)
+        return response
+
+    async def _acquire(self, origin, connect_timeout):
+        """Return (connection, reused) from the pool of origin, opening one if none is idle"""
+        idle = self._idle.get(origin, [])
+        while idle:
+            connection = idle.pop()
+            if connection.usable:
+                return connection, True
+            connection.abort()
+
+        scheme, host, port = origin
+        tls = self._get_ssl_context() if scheme == "https" else None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=tls, server_hostname=host if tls else None,
+                                        limit=self.BUFFER_SIZE),
+                connect_timeout)
+        except asyncio.TimeoutError:
+            raise requests.ConnectTimeout(f"Connection to {host}:{port} timed out")
+        except OSError as e:
+            raise requests.ConnectionError(f"Failed to connect to {host}:{port}: {str(e)}")
+        self._stats.connection_opened()
+        return _Connection(origin, reader, writer), False
+
+    def _release(self, connection):
+        """Return a connection whose response was fully read to its pool"""
+        idle = self._idle.setdefault(connection.origin, [])
+        if connection.usable and len(idle) < self.pool_maxsize:
+            idle.append(connection)
+        else:
+            connection.abort()
+
+    def _get_ssl_context(self):
+        if self._ssl_context is None:
+            # Same CA bundle as requests
+            self._ssl_context = ssl.create_default_context(cafile=certifi.where() if certifi else None)
+        return self._ssl_context
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket limiting a byte stream to rate bytes per second
+
+    The bucket holds up to burst bytes, so short bursts pass at full speed.
+    consume() takes tokens on credit and only sleeps once the debt is worth at
+    least MIN_SLEEP seconds, which keeps fast transfers from sleeping on every
+    chunk. A rate of 0 means unlimited and costs a single comparison.
+    """
+
+    # Smallest debt, in seconds, worth sleeping for
+    MIN_SLEEP = 0.05
+
+    def __init__(self, rate=0, burst=None):
+        self._lock = threading.Lock()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """Change the rate in bytes per second, 0 for unlimited; burst defaults to one second of rate"""
+        with self._lock:
+            self.rate = max(0, int(rate or 0))
+            self.burst = int(burst) if burst else self.rate
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    def consume(self, amount, token=None):
+        """Take amount bytes from the bucket, sleeping while too far in debt
+
+        token is an optional CancelToken whose trigger cuts the sleep short.
+        """
+        if not self.rate:
+            return
+        with self._lock:
+            rate = self.rate
+            if not rate:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            self.tokens -= amount
+            delay = -self.tokens / rate
+        if delay >= self.MIN_SLEEP:
+            if token is not None:
+                token.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+class TransferLimiter:
+    """Charges the bytes of one transfer to its own bucket and to the shared global one
+
+    The per-transfer cap is read from the BandwidthLimiter on every call, so
+    a changed cap applies from the next chunk and a cap of 0 drops the
+    transfer's bucket. Transfers whose token is marked as background are also
+    charged to the background bucket. The token is checked on every call too,
+    so a job raised to the foreground leaves the background bucket right away.
+    """
+
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+        self.transfer_bucket = None
+        self._lock = threading.Lock()
+        self._sync_transfer_bucket()
+
+    def _sync_transfer_bucket(self):
+        rate = self.bandwidth.transfer_rate
+        bucket = self.transfer_bucket
+        if (bucket.rate if bucket is not None else 0) == rate:
+            return bucket
+        # The cap changed, segments of the transfer may get here together
+        with self._lock:
+            bucket = self.transfer_bucket
+            if (bucket.rate if bucket is not None else 0) == rate:
+                return bucket
+            if not rate:
+                self.transfer_bucket = None
+            elif bucket is None:
+                self.transfer_bucket = TokenBucket(rate)
+            else:
+                bucket.set_rate(rate)
+            return self.transfer_bucket
+
+    def consume(self, amount, token=None):
+        self.bandwidth.global_bucket.consume(amount, token)
+        transfer_bucket = self._sync_transfer_bucket()
+        if transfer_bucket is not None:
+            transfer_bucket.consume(amount, token)
+        if token is not None and token.background:
+            self.bandwidth.background_bucket.consume(amount, token)
+
+
+class BandwidthLimiter:
+    """Global, per-transfer and background download caps, in bytes per second (0 = unlimited)"""
+
+    def __init__(self, global_rate=0, transfer_rate=0):
+        self.global_bucket = TokenBucket(global_rate)
+        # Shared by background transfers, only limited while a game is running
+        self.background_bucket = TokenBucket(0)
+        self.transfer_rate = 0
+        self.configure(global_rate, transfer_rate)
+
+    def configure(self, global_rate=0, transfer_rate=0):
+        """Apply new caps, running transfers pick them up on their next chunk"""
+        if int(global_rate or 0) != self.global_bucket.rate:
+            self.global_bucket.set_rate(global_rate)
+        self.transfer_rate = max(0, int(transfer_rate or 0))
+
+    def set_background_rate(self, rate):
+        """Cap all background transfers together, 0 lifts the cap"""
+        if int(rate or 0) != self.background_bucket.rate:
+            self.background_bucket.set_rate(rate)
+
+    def configure_from_settings(self, settings):
+        """Apply the KB/s limits stored in settings.json"""
+        self.configure(int(settings.get("bandwidth_limit_kbps", 0) or 0) * 1024,
+                       int(settings.get("transfer_limit_kbps", 0) or 0) * 1024)
+
+    def transfer(self):
+        """Create the limiter for a new transfer, shared by all of its segments"""
+        return TransferLimiter(self)
+
+
+_bandwidth = None
+_bandwidth_lock = threading.Lock()
+
+
+def get_bandwidth():
+    """Get the process-wide bandwidth limiter, unlimited until configured"""
+    global _bandwidth
+    with _bandwidth_lock:
+        if _bandwidth is None:
+            _bandwidth = BandwidthLimiter()
+        return _bandwidth
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Benchmarks against a local dev_server.py instance
+
+    python benchmark.py transport [--size 32] [--checks 200] [--backends requests asyncio]
+    python benchmark.py index [--files 0 1000 5000 20000] [--lookups 2000]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dev_server import serve_in_thread
+from transport import BACKENDS, create_transport
+from transfer import SegmentedDownloader, conditional_headers
+from game_index import GameIndex
+
+GAMES = ("PTD1", "PTD1_Hacked", "PTD2", "PTD2_Hacked", "PTD3", "PTD3_Hacked")
+
+
+def _benchmark_backend(backend, base_url, work_dir, args):
+    transport = create_transport({"downloads": {"timeout": 30}}, backend)
+    check_url = f"{base_url}/small.swf"
+    big_url = f"{base_url}/big.bin"
+
+    # Update checks: many small conditional HEADs at once
+    validators = {"etag": transport.head(check_url).headers.get("etag", "")}
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(lambda _: transport.head(check_url, headers=conditional_headers(validators)).status_code,
+                                 range(args.checks)))
+    checks_time = time.monotonic() - started
+    if any(status != 304 for status in statuses):
+        raise RuntimeError(f"{backend}: unexpected check answers {sorted(set(statuses))}")
+
+    # Segmented downloads of the big file
+    downloader = SegmentedDownloader(segments=args.segments, transport=transport)
+    target = os.path.join(work_dir, f"{backend}.bin")
+    download_times = []
+    for _ in range(args.rounds):
+        started = time.monotonic()
+        downloader.download(big_url, target)
+        download_times.append(time.monotonic() - started)
+        if os.path.getsize(target) != args.size * 1024 * 1024:
+            raise RuntimeError(f"{backend}: downloaded file has the wrong size")
+        os.remove(target)
+
+    stats = transport.stats()
+    best = min(download_times)
+    return {
+        "backend": backend,
+        "checks_per_s": args.checks / checks_time,
+        "download_mb_s": args.size / best,
+        "requests": stats["requests"],
+        "connections": stats["connections"],
+        "reused": stats["reused"],
+        "throughput_mb_s": stats["throughput"] / (1024 * 1024)
+    }
+
+
+def benchmark_transport(args):
+    """Compare the transport backends on update checks and segmented downloads"""
+    work_dir = tempfile.mkdtemp(prefix="ptd-benchmark-")
+    try:
+        serve_dir = os.path.join(work_dir, "mirror")
+        os.makedirs(serve_dir)
+        with open(os.path.join(serve_dir, "small.swf"), "wb") as f:
+            f.write(os.urandom(16 * 1024))
+        with open(os.path.join(serve_dir, "big.bin"), "wb") as f:
+            for _ in range(args.size):
+                f.write(os.urandom(1024 * 1024))
+
+        server = serve_in_thread(serve_dir)
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        print(f"{args.checks} checks with {args.concurrency} threads, "
+              f"{args.rounds} downloads of {args.size} MB in {args.segments} segments\n")
+        print(f"{'backend':<10}{'checks/s':>10}{'MB/s':>9}{'requests':>10}{'conns':>7}{'reused':>8}{'busy MB/s':>11}")
+        try:
+            for backend in args.backends:
+                row = _benchmark_backend(backend, base_url, work_dir, args)
+                print(f"{row['backend']:<10}{row['checks_per_s']:>10.0f}{row['download_mb_s']:>9.1f}"
+                      f"{row['requests']:>10}{row['connections']:>7}{row['reused']:>8}{row['throughput_mb_s']:>11.1f}")
+        finally:
+            server.shutdown()
+            server.server_close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _scan_lookup(games_dir, game):
+    """The lookup GameManager.find_game_path did before the index, for comparison"""
+    legacy_path = os.path.join(games_dir, f"{game}.swf")
+    if os.path.exists(legacy_path):
+        return legacy_path
+    latest_path = None
+    latest_time = 0
+    prefix = f"{game}-v"
+    for filename in os.listdir(games_dir):
+        if filename.startswith(prefix) and filename.endswith(".swf"):
+            file_time = os.path.getmtime(os.path.join(games_dir, filename))
+            if file_time > latest_time:
+                latest_time, latest_path = file_time, os.path.join(games_dir, filename)
+    return latest_path
+
+
+def _time_lookups(lookup, lookups):
+    """Microseconds per lookup, cycling through the games"""
+    started = time.perf_counter()
+    for i in range(lookups):
+        lookup(GAMES[i % len(GAMES)])
+    return (time.perf_counter() - started) / lookups * 1e6
+
+
+def benchmark_index(args):
+    """Compare game lookups through the index with directory scans as versioned files pile up"""
+    print(f"{'files':>7}{'scan us':>10}{'index build ms':>16}{'index us':>10}")
+    for count in args.files:
+        games_dir = tempfile.mkdtemp(prefix="ptd-benchmark-")
+        try:
+            # Only versioned files, the worst case for the scan: every lookup misses {game}.swf
+            for i in range(count):
+                open(os.path.join(games_dir, f"{GAMES[i % len(GAMES)]}-v{i}.swf"), "wb").close()
+            # Let the directory mtime age past the index's racy window
+            past = time.time() - 60
+            os.utime(games_dir, (past, past))
+
+            scan_us = _time_lookups(lambda game: _scan_lookup(games_dir, game), max(1, args.lookups // 100))
+            index = GameIndex(games_dir)
+            started = time.perf_counter()
+            index.refresh()
+            build_ms = (time.perf_counter() - started) * 1000
+            index_us = _time_lookups(index.find, args.lookups)
+            if count and index.find(GAMES[0]) != _scan_lookup(games_dir, GAMES[0]):
+                raise RuntimeError("Index and scan disagree")
+            print(f"{count:>7}{scan_us:>10.0f}{build_ms:>16.1f}{index_us:>10.1f}")
+        finally:
+            shutil.rmtree(games_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PTD Launcher benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    transport = commands.add_parser("transport", help="Compare the HTTP transport backends")
+    transport.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    transport.add_argument("--size", type=int, default=32, help="Size of the download in MB")
+    transport.add_argument("--rounds", type=int, default=3, help="Downloads per backend, the best counts")
+    transport.add_argument("--segments", type=int, default=4)
+    transport.add_argument("--checks", type=int, default=200, help="Number of update checks")
+    transport.add_argument("--concurrency", type=int, default=16, help="Threads sending update checks")
+    transport.set_defaults(run=benchmark_transport)
+
+    index = commands.add_parser("index", help="Compare game lookups with and without the game index")
+    index.add_argument("--files", nargs="+", type=int, default=[0, 1000, 5000, 20000],
+                       help="Numbers of versioned game files to look up among")
+    index.add_argument("--lookups", type=int, default=2000, help="Index lookups per size, scans do 1%% of them")
+    index.set_defaults(run=benchmark_index)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
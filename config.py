@@ -3,6 +3,7 @@ import os
 import json
 import platform
 import sys
+import threading
 from tkinter import messagebox
 from base_manager import BaseManager
 from pathlib import Path
@@ -24,6 +25,12 @@ class ConfigManager(BaseManager):
         self.version = None
         self.games_dir = None
         self.settings = {}
+        self.validators = {}  # {game: {etag, last_modified, content_length}}
+        self.mirrors = {}  # {item: {preferred, scores: {url: {throughput, ttfb, error_rate, samples}}}}
+        self.check_cache = {}  # {game: {server_version (None if unchanged), checked_at}}
+        self.installs = {}  # {game: {active, versions: {name: {version, digest, size, installed_at, last_used, validators}}}}
+        # Download and check threads update the state above concurrently, hold this to change and save it
+        self.lock = threading.RLock()
     
     def _get_os_specific_path(self, subdir):
         """Get OS-specific path for application data"""
@@ -88,6 +95,18 @@ class ConfigManager(BaseManager):
                 with open(version_path, "w") as f:
                     json.dump(self.version, f, indent=4)
             
+            # Load HTTP validators of the downloaded games
+            self.validators = self.load_validators()
+            
+            # Load the mirrors that served each item fastest
+            self.mirrors = self.load_mirrors()
+            
+            # Load the results of the last update check, used while offline
+            self.check_cache = self.load_check_cache()
+            
+            # Load the installed versions of each game
+            self.installs = self.load_installs()
+            
             # Load settings from settings.json
             self.settings = self.load_settings()
             
@@ -98,17 +117,111 @@ class ConfigManager(BaseManager):
             sys.exit(1)
             return False
     
-    def save_version_info(self):
-        """Save version information to file"""
+    def _load_json(self, filename, description):
+        """Read filename in the games directory, or return {} if it is missing or unreadable"""
         try:
-            version_path = os.path.join(self.games_dir, "version.json")
-            with open(version_path, "w") as f:
-                json.dump(self.version, f, indent=4)
+            path = os.path.join(self.games_dir, filename)
+            if not os.path.exists(path):
+                return {}
+            
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading {description}: {str(e)}")
+            return {}
+    
+    def _save_json(self, filename, data, description):
+        """Write data to filename in the games directory, replacing it atomically"""
+        try:
+            path = os.path.join(self.games_dir, filename)
+            temp_path = path + ".tmp"
+            with self.lock:
+                with open(temp_path, "w") as f:
+                    json.dump(data, f, indent=4)
+                os.replace(temp_path, path)
             return True
         except Exception as e:
-            print(f"Error saving version info: {str(e)}")
+            print(f"Error saving {description}: {str(e)}")
             return False
     
+    def set_game_version(self, game, version):
+        """Record the installed version of a game in version.json"""
+        with self.lock:
+            self.version["games"][game] = version
+            return self.save_version_info()
+    
+    def save_version_info(self):
+        """Save version information to file"""
+        return self._save_json("version.json", self.version, "version info")
+    
+    def load_validators(self):
+        """Load stored HTTP validators from validators.json in the games directory"""
+        return self._load_json("validators.json", "validators")
+    
+    def save_validators(self):
+        """Save HTTP validators to validators.json in the games directory"""
+        return self._save_json("validators.json", self.validators, "validators")
+    
+    def get_validators(self, game):
+        """Get the stored ETag, Last-Modified and Content-Length of a game"""
+        return self.validators.get(game)
+    
+    def set_validators(self, game, headers):
+        """Store the validators from the response a game was downloaded with"""
+        with self.lock:
+            self.validators[game] = {
+                "etag": headers.get("etag", ""),
+                "last_modified": headers.get("last-modified", ""),
+                "content_length": int(headers.get("content-length", 0) or 0)
+            }
+            return self.save_validators()
+    
+    def load_mirrors(self):
+        """Load mirror state from mirrors.json in the games directory"""
+        return self._load_json("mirrors.json", "mirrors")
+    
+    def save_mirrors(self):
+        """Save mirror state to mirrors.json in the games directory"""
+        return self._save_json("mirrors.json", self.mirrors, "mirrors")
+    
+    def get_preferred_mirror(self, item):
+        """Get the mirror that last served item, or None"""
+        return self.mirrors.get(item, {}).get("preferred")
+    
+    def set_preferred_mirror(self, item, url):
+        """Record the mirror that served item so the next download starts with it"""
+        with self.lock:
+            if self.get_preferred_mirror(item) == url:
+                return True
+            self.mirrors.setdefault(item, {})["preferred"] = url
+            return self.save_mirrors()
+    
+    def load_check_cache(self):
+        """Load the last update check results from update_check.json in the games directory"""
+        return self._load_json("update_check.json", "update check cache")
+    
+    def save_check_cache(self):
+        """Save the last update check results to update_check.json in the games directory"""
+        return self._save_json("update_check.json", self.check_cache, "update check cache")
+    
+    def load_installs(self):
+        """Load the installed game versions from installs.json in the games directory"""
+        return self._load_json("installs.json", "installs")
+    
+    def save_installs(self):
+        """Save the installed game versions to installs.json, replacing it atomically"""
+        return self._save_json("installs.json", self.installs, "installs")
+    
+    def get_game_urls(self, game):
+        """Get the mirror URLs of a game, game_urls entries may be a URL or a list of them"""
+        urls = self.config["game_urls"].get(game, [])
+        return [urls] if isinstance(urls, str) else list(urls)
+    
+    def get_game_url(self, game):
+        """Get the first configured URL of a game, or None"""
+        urls = self.get_game_urls(game)
+        return urls[0] if urls else None
+    
     def get_flash_player_path(self):
         """Get the path to Flash Player based on OS"""
         # Check if there's a custom path in settings
@@ -169,7 +282,9 @@ class ConfigManager(BaseManager):
                 "url": self.config["flash_player"]["linux"]["primary_url"],
                 "filename": "flash_player.tar.gz",
                 "full_path": os.path.join(flash_dir, "flash_player.tar.gz"),
-                "bin_name": self.config["flash_player"]["linux"]["filename"]
+                "bin_name": self.config["flash_player"]["linux"]["filename"],
+                # Archive members installed next to the binary, by name or path
+                "extract_members": self.config["flash_player"]["linux"].get("extract_members", [])
             }
             # Add fallback URL if available
             if "fallback_url" in self.config["flash_player"]["linux"]:
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import socket
+import threading
+from urllib.parse import urlsplit
+
+
+class Offline(Exception):
+    """Raised instead of making a network request while the launcher is offline"""
+
+
+class ConnectivityMonitor:
+    """Tracks whether the game hosts can be reached
+
+    probe() opens a TCP connection to every host at once and reports online as
+    soon as one succeeds, giving up after timeout seconds. While offline the
+    hosts are probed again every recheck_interval seconds, and listeners are
+    called with the new state whenever it changes.
+    """
+
+    def __init__(self, urls=(), timeout=2.0, recheck_interval=15.0):
+        self.timeout = timeout
+        self.recheck_interval = recheck_interval
+        # None until the first probe finishes
+        self.online = None
+        self._targets = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.set_targets(urls)
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a monitor for the game hosts from the "connectivity" section of config.json"""
+        config = config or {}
+        options = config.get("connectivity", {})
+        urls = []
+        for entry in config.get("game_urls", {}).values():
+            urls.extend([entry] if isinstance(entry, str) else entry)
+        return cls(
+            urls,
+            timeout=options.get("timeout", 2.0),
+            recheck_interval=options.get("recheck_interval", 15.0)
+        )
+
+    @property
+    def offline(self):
+        return self.online is False
+
+    def set_targets(self, urls):
+        """Set the URLs whose hosts are probed"""
+        targets = []
+        for url in urls:
+            parts = urlsplit(url)
+            if parts.hostname:
+                target = (parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+                if target not in targets:
+                    targets.append(target)
+        self._targets = targets
+
+    def add_listener(self, callback):
+        """Call callback(online) from the monitor thread whenever the state changes"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def probe(self):
+        """Check whether any host accepts a connection within the timeout, update and return the state"""
+        targets = list(self._targets)
+        if not targets:
+            self._set_state(True)
+            return True
+
+        reached = threading.Event()
+        done = threading.Event()
+        failures = [0]
+        lock = threading.Lock()
+
+        def connect(host, port):
+            try:
+                # Resolves the name too, which is what usually fails without a network
+                with socket.create_connection((host, port), timeout=self.timeout):
+                    reached.set()
+                    done.set()
+            except OSError:
+                with lock:
+                    failures[0] += 1
+                    if failures[0] == len(targets):
+                        done.set()
+
+        for host, port in targets:
+            threading.Thread(target=connect, args=(host, port), daemon=True).start()
+
+        # Name resolution can outlast the socket timeout, so bound the wait as well
+        done.wait(self.timeout)
+        online = reached.is_set()
+        self._set_state(online)
+        return online
+
+    def ensure_probed(self):
+        """Probe now if no probe has finished yet, return whether the hosts are reachable"""
+        if self.online is None:
+            return self.probe()
+        return self.online
+
+    def report_failure(self):
+        """Note that a request could not connect, so the monitor probes again right away"""
+        if self.online is not False:
+            self._wake.set()
+
+    def start(self):
+        """Probe in a background thread, repeating while offline or after reported failures"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.probe()
+            except Exception as e:
+                print(f"Error probing connectivity: {str(e)}")
+            # Online there is nothing to do until a request fails
+            self._wake.wait(self.recheck_interval if self.offline else None)
+            self._wake.clear()
+
+    def _set_state(self, online):
+        with self._lock:
+            changed = self.online != online
+            self.online = online
+            listeners = list(self._listeners)
+        if not changed:
+            return
+        for callback in listeners:
+            try:
+                callback(online)
+            except Exception as e:
+                print(f"Error in connectivity listener: {str(e)}")
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_connectivity(config=None):
+    """Get the process-wide connectivity monitor, creating it from config on first use"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = ConnectivityMonitor.from_config(config)
+        return _monitor
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Binary deltas between two versions of a file
+
+A delta is a header naming the base and target files by size and SHA-256,
+followed by a zlib-compressed list of instructions that rebuild the target:
+COPY a range of the base, or ADD literal bytes. Only unchanged runs of at
+least BLOCK_SIZE bytes are copied, which is enough for SWFs whose tags
+mostly stay the same between builds.
+
+Mirrors publish the delta from an old version next to the file, named by
+the old version's SHA-256, see publish() and dev_server.py:
+
+    python delta.py publish mirror/PTD1.swf old/PTD1.swf [...]
+"""
+import argparse
+import hashlib
+import os
+import struct
+import zlib
+
+# Name of the delta format in A-IM/IM headers (RFC 3229)
+DELTA_FORMAT = "ptd-delta"
+MAGIC = b"PTDD\x01"
+# base size, base SHA-256, target size, target SHA-256
+HEADER = struct.Struct(">Q32sQ32s")
+OP_COPY = 0x01  # offset, length
+OP_ADD = 0x02  # length, data
+COPY = struct.Struct(">BQI")
+ADD = struct.Struct(">BI")
+BLOCK_SIZE = 32
+# Bytes compared at once when extending a match
+EXTEND_STEP = 4096
+
+
+class DeltaError(ValueError):
+    """Raised when a delta is malformed or does not apply to the base it is given"""
+
+
+def delta_dir(path):
+    """Directory holding the deltas that produce path"""
+    return path + ".deltas"
+
+
+def delta_path(path, base_digest):
+    """Where a mirror keeps the delta from the file with SHA-256 base_digest to path"""
+    return os.path.join(delta_dir(path), base_digest + ".delta")
+
+
+def _match_length(base, base_offset, target, target_offset):
+    """Length of the common run of base and target starting at the given offsets"""
+    length = 0
+    limit = min(len(base) - base_offset, len(target) - target_offset)
+    # Whole steps first, then byte by byte within the step that differs
+    while length + EXTEND_STEP <= limit and (base[base_offset + length:base_offset + length + EXTEND_STEP] ==
+                                             target[target_offset + length:target_offset + length + EXTEND_STEP]):
+        length += EXTEND_STEP
+    while length < limit and base[base_offset + length] == target[target_offset + length]:
+        length += 1
+    return length
+
+
+def make_delta(base, target):
+    """Return the delta that turns the bytes base into the bytes target"""
+    blocks = {}
+    for offset in range(0, len(base) - BLOCK_SIZE + 1, BLOCK_SIZE):
+        blocks.setdefault(base[offset:offset + BLOCK_SIZE], offset)
+
+    ops = []
+    literal_start = 0
+    position = 0
+    end = len(target) - BLOCK_SIZE
+    while position <= end:
+        base_offset = blocks.get(target[position:position + BLOCK_SIZE])
+        if base_offset is None:
+            position += 1
+            continue
+        # Extend backwards into the pending literal, then forwards
+        back = 0
+        while (back < position - literal_start and back < base_offset and
+               base[base_offset - back - 1] == target[position - back - 1]):
+            back += 1
+        start, base_start = position - back, base_offset - back
+        length = back + _match_length(base, base_offset, target, position)
+        if start > literal_start:
+            ops.append(ADD.pack(OP_ADD, start - literal_start) + target[literal_start:start])
+        ops.append(COPY.pack(OP_COPY, base_start, length))
+        position = literal_start = start + length
+    if literal_start < len(target):
+        ops.append(ADD.pack(OP_ADD, len(target) - literal_start) + target[literal_start:])
+
+    header = HEADER.pack(len(base), hashlib.sha256(base).digest(), len(target), hashlib.sha256(target).digest())
+    return MAGIC + header + zlib.compress(b"".join(ops), 9)
+
+
+def read_header(delta):
+    """Return (base_size, base_sha256, target_size, target_sha256) of a delta, digests as hex"""
+    if not delta.startswith(MAGIC) or len(delta) < len(MAGIC) + HEADER.size:
+        raise DeltaError("Not a delta")
+    base_size, base_digest, target_size, target_digest = HEADER.unpack_from(delta, len(MAGIC))
+    return base_size, base_digest.hex(), target_size, target_digest.hex()
+
+
+def apply_delta(base_path, delta, write):
+    """Rebuild the target of delta from the file at base_path
+
+    write(offset, data) receives the target in order. The base is checked
+    against the delta header first, the target is not: the caller verifies
+    what it wrote against read_header(delta).
+
+    Returns the size of the target.
+    """
+    base_size, base_digest, target_size, _ = read_header(delta)
+    with open(base_path, "rb") as f:
+        base = f.read()
+    if len(base) != base_size or hashlib.sha256(base).hexdigest() != base_digest:
+        raise DeltaError("Delta was made for a different base")
+
+    try:
+        ops = zlib.decompress(delta[len(MAGIC) + HEADER.size:])
+    except zlib.error as e:
+        raise DeltaError(f"Corrupt delta: {str(e)}")
+
+    position = 0
+    offset = 0
+    while position < len(ops):
+        op = ops[position]
+        if op == OP_COPY and position + COPY.size <= len(ops):
+            _, base_offset, length = COPY.unpack_from(ops, position)
+            position += COPY.size
+            if base_offset + length > len(base):
+                raise DeltaError("Delta copies past the end of the base")
+            data = base[base_offset:base_offset + length]
+        elif op == OP_ADD and position + ADD.size <= len(ops):
+            _, length = ADD.unpack_from(ops, position)
+            position += ADD.size
+            data = ops[position:position + length]
+            position += length
+            if len(data) != length:
+                raise DeltaError("Delta ends inside a literal")
+        else:
+            raise DeltaError(f"Bad delta instruction at {position}")
+        write(offset, data)
+        offset += length
+
+    if offset != target_size:
+        raise DeltaError(f"Delta produced {offset} of {target_size} bytes")
+    return offset
+
+
+def publish(path, base_path):
+    """Write the delta from base_path to path where a mirror serving path looks for it
+
+    Returns the delta path, or None when the files are identical.
+    """
+    with open(path, "rb") as f:
+        target = f.read()
+    with open(base_path, "rb") as f:
+        base = f.read()
+    if base == target:
+        return None
+
+    delta = make_delta(base, target)
+    output = delta_path(path, hashlib.sha256(base).hexdigest())
+    os.makedirs(delta_dir(path), exist_ok=True)
+    temp_path = output + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(delta)
+    os.replace(temp_path, output)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Make binary deltas between file versions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish_parser = commands.add_parser("publish", help="Publish deltas from older versions next to a mirror file")
+    publish_parser.add_argument("path", help="Current version, as served by the mirror")
+    publish_parser.add_argument("bases", nargs="+", help="Older versions clients may have installed")
+    args = parser.parse_args()
+
+    size = os.path.getsize(args.path)
+    for base_path in args.bases:
+        output = publish(args.path, base_path)
+        if output:
+            print(f"{base_path}: {os.path.getsize(output)} bytes instead of {size} -> {output}")
+        else:
+            print(f"{base_path}: identical, no delta needed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Local HTTP server for testing downloads and update checks
+
+Serves the files of a directory over keep-alive HTTP/1.1 with HEAD, single
+byte ranges, If-Range, ETag/Last-Modified validators and 304 answers, like
+the game mirrors do, plus a Repr-Digest header carrying each file's SHA-256.
+ETags are SHA-256 digests too, so a client asking for a delta with A-IM and
+the ETag of its copy gets the matching delta published with delta.py as a
+226 response (RFC 3229).
+
+    python dev_server.py --root ./mirror --port 8000 [--rate 1048576] [--publish ./old]
+"""
+import argparse
+import base64
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+from object_store import file_sha256
+from delta import DELTA_FORMAT, delta_path, publish
+
+CHUNK_SIZE = 64 * 1024
+
+_digests = {}  # {(path, size, mtime_ns): SHA-256 hex digest}
+_digests_lock = threading.Lock()
+
+
+def content_digest(full_path, stat):
+    """SHA-256 hex digest of a file, hashed once per version of it"""
+    key = (full_path, stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        digest = file_sha256(full_path)
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
+
+
+def repr_digest(digest):
+    """Repr-Digest header value of a SHA-256 hex digest"""
+    return "sha-256=:" + base64.b64encode(bytes.fromhex(digest)).decode("ascii") + ":"
+
+
+class DevRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set on the server class by create_server
+    root = "."
+    rate = 0
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _resolve(self):
+        path = unquote(urlsplit(self.path).path).lstrip("/")
+        full_path = os.path.realpath(os.path.join(self.root, path))
+        if not full_path.startswith(os.path.realpath(self.root) + os.sep) or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def _send_empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _parse_range(self, size, etag, last_modified):
+        """Return the (start, end) byte range to send, None for the whole file, False if unsatisfiable"""
+        header = self.headers.get("Range", "")
+        if not header.startswith("bytes=") or "," in header:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range not in (etag, last_modified):
+            return None
+
+        first, _, last = header[6:].strip().partition("-")
+        try:
+            if first:
+                start, end = int(first), min(int(last) if last else size - 1, size - 1)
+            else:
+                start, end = max(0, size - int(last)), size - 1
+        except ValueError:
+            return None
+        if start > end or start >= size:
+            return False
+        return start, end
+
+    def _serve(self, send_body):
+        full_path = self._resolve()
+        if full_path is None:
+            self._send_empty(404)
+            return
+
+        stat = os.stat(full_path)
+        size = stat.st_size
+        digest = content_digest(full_path, stat)
+        etag = f'"{digest}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+        validators = {"ETag": etag, "Last-Modified": last_modified, "Accept-Ranges": "bytes"}
+
+        if self._not_modified(etag, stat.st_mtime):
+            self._send_empty(304, validators)
+            return
+
+        if self._send_delta(full_path, validators, digest, send_body):
+            return
+
+        byte_range = self._parse_range(size, etag, last_modified)
+        if byte_range is False:
+            self._send_empty(416, {"Content-Range": f"bytes */{size}"})
+            return
+
+        start, end = byte_range or (0, size - 1)
+        length = max(0, end - start + 1)
+        self.send_response(206 if byte_range else 200)
+        for name, value in validators.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Repr-Digest", repr_digest(digest))
+        self.send_header("Content-Length", str(length))
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        if send_body and length:
+            self._send_file(full_path, start, length)
+
+    def _send_delta(self, full_path, validators, digest, send_body):
+        """Answer with 226 and a published delta from the client's copy, return False if there is none"""
+        formats = [item.split(";")[0].strip().lower() for item in self.headers.get("A-IM", "").split(",")]
+        if DELTA_FORMAT not in formats:
+            return False
+        # The client names its copy by ETag, which here is its SHA-256
+        for tag in self.headers.get("If-None-Match", "").split(","):
+            base = tag.strip().strip('"')
+            path = delta_path(full_path, base) if base else None
+            if path and os.path.isfile(path):
+                break
+        else:
+            return False
+
+        size = os.path.getsize(path)
+        self.send_response(226, "IM Used")
+        for name, value in validators.items():
+            self.send_header(name, value)
+        self.send_header("IM", DELTA_FORMAT)
+        self.send_header("Delta-Base", f'"{base}"')
+        self.send_header("Cache-Control", "no-store, im")
+        self.send_header("Repr-Digest", repr_digest(digest))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        if send_body:
+            self._send_file(path, 0, size)
+        return True
+
+    def _send_file(self, full_path, start, length):
+        started = time.monotonic()
+        sent = 0
+        with open(full_path, "rb") as f:
+            f.seek(start)
+            while sent < length:
+                chunk = f.read(min(CHUNK_SIZE, length - sent))
+                if not chunk:
+                    break
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+                    return
+                sent += len(chunk)
+                if self.rate:
+                    # Pace the connection to rate bytes per second
+                    delay = sent / self.rate - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+
+
+def _handle_error(server, request, client_address):
+    # Clients drop connections whenever they stop reading a body they do not need
+    if not isinstance(sys.exc_info()[1], ConnectionError):
+        ThreadingHTTPServer.handle_error(server, request, client_address)
+
+
+def create_server(root, port=0, host="127.0.0.1", rate=0, quiet=True):
+    """Create a server for root, port 0 picks a free port (see server.server_port)"""
+    handler = type("Handler", (DevRequestHandler,), {"root": root, "rate": rate, "quiet": quiet})
+    # The default backlog of 5 drops bursts of parallel connects, which then wait a second for a SYN retry
+    server_class = type("Server", (ThreadingHTTPServer,), {"request_queue_size": 128, "handle_error": _handle_error})
+    server = server_class((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_thread(root, port=0, rate=0):
+    """Start a quiet server for root on a daemon thread and return it"""
+    server = create_server(root, port, rate=rate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a directory like a game mirror")
+    parser.add_argument("--root", default=".", help="Directory to serve")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--rate", type=int, default=0, help="Bytes per second per connection, 0 for unlimited")
+    parser.add_argument("--publish", metavar="DIR",
+                        help="Publish deltas from the files of DIR to the files of the same name in --root")
+    args = parser.parse_args()
+
+    if args.publish:
+        for name in sorted(os.listdir(args.publish)):
+            path, base_path = os.path.join(args.root, name), os.path.join(args.publish, name)
+            if os.path.isfile(path) and os.path.isfile(base_path) and publish(path, base_path):
+                print(f"Published delta from {base_path} to {path}")
+
+    server = create_server(args.root, args.port, args.host, args.rate, quiet=False)
+    print(f"Serving {os.path.abspath(args.root)} on http://{args.host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
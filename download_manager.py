@@ -1,9 +1,6 @@
 #!/usr/bin/env python3
-import threading
-import time
 import os
 import platform
-import requests
 import tempfile
 import shutil
 import subprocess
@@ -11,6 +8,20 @@ import tarfile
 import tkinter as tk
 from tkinter import Toplevel, Label, Button, Frame
 from base_manager import BaseManager
+from transfer import ProgressReader, CancelToken, TransferCancelled
+from transport import get_transport
+from fingerprint import extract_filename_and_version
+from progress import ProgressBus, format_transfer
+from retry import RetryPolicy
+from connectivity import get_connectivity
+from mirrors import MirrorRanking, download_from_mirrors, order_mirrors, race_mirrors
+from scheduler import DownloadScheduler, PRIORITY_PLAY, PRIORITY_USER
+from bandwidth import get_bandwidth
+from game_activity import get_game_activity
+from worker import create_downloader
+from object_store import get_object_store
+from installs import GameInstalls
+from game_index import get_game_index
 
 class DownloadManager(BaseManager):
     def __init__(self, config_manager, status_callback=None):
@@ -21,50 +32,44 @@ class DownloadManager(BaseManager):
         self.ongoing_downloads = {}  # {item: {progress: 0, version: "", type: "game/flash"}}
         # Track UI elements for progress updates
         self.ui_elements = {}  # {item: {progress_label, download_btn, frame, active}}
-        self.is_downloading = False
+        # Every transfer runs as a job under the scheduler's concurrency limits
+        self.scheduler = DownloadScheduler.from_config(config_manager.config)
+        # Retries transient failures and fails fast for hosts that are down
+        self.retry = RetryPolicy.from_config(config_manager.config)
+        # Progress of running transfers, drained by the Tk thread on a fixed tick
+        self.progress_bus = ProgressBus()
+        # Shared HTTP session and the segmented downloader built on it, which
+        # may run its transfers in a worker process (see worker.py)
+        self.transport = get_transport(config_manager.config)
+        self.downloader = create_downloader(config_manager.config, self.transport)
+        self.downloader.start()
+        # Step background work aside while a game is running
+        get_game_activity().add_listener(self._on_game_activity)
+    
+    def _on_game_activity(self, playing):
+        """Hold queued background jobs and throttle running ones while a game is running"""
+        options = self.config_manager.config.get("downloads", {})
+        limit = int(options.get("background_limit_while_playing_kbps", 64) or 0) * 1024
+        get_bandwidth().set_background_rate(limit if playing else 0)
+        self.scheduler.hold_background(playing)
     
     def set_update_manager(self, update_manager):
         """Set the update manager instance to check for ongoing updates."""
         self.update_manager = update_manager
     
-    def is_download_in_progress(self):
-        """Check if any download is currently in progress"""
-        return self.is_downloading or len(self.ongoing_downloads) > 0
+    def is_download_in_progress(self, item=None):
+        """Check if a download (of item, if given) is queued or running"""
+        return self.scheduler.is_active(item)
     
-    def _extract_filename_and_version(self, url, response):
-        """Extract filename and version from URL or response headers"""
-        filename = ""
-        version = ""
-        
-        # Try to get filename from content-disposition header
-        if "content-disposition" in response.headers:
-            try:
-                filename = response.headers['content-disposition'].split('filename=')[1].strip('"')
-            except (IndexError, KeyError):
-                # If header parsing fails, use URL
-                filename = url.split('/')[-1]
-        else:
-            # If no header, use URL
-            filename = url.split('/')[-1]
-        
-        # Extract version from filename
-        if '-v' in filename:
-            try:
-                version = filename.split('-v')[1].split('.swf')[0]
-            except (IndexError, KeyError):
-                # If version extraction fails, use timestamp
-                version = str(int(time.time()))
-        else:
-            # If no version in filename, use timestamp
-            version = str(int(time.time()))
-            
-        return filename, version
+    def _extract_filename_and_version(self, url, response, local_path=None, header=None):
+        """Extract filename and a stable version from the response, see fingerprint.py"""
+        return extract_filename_and_version(url, response, self.transport, local_path, header)
     
     def _create_progress_dialog(self, parent, title, item_name):
         """Create a progress dialog window"""
         dialog = Toplevel(parent)
         dialog.title(title)
-        dialog.geometry("350x120")
+        dialog.geometry("350x150")
         dialog.resizable(False, False)
         dialog.transient(parent)
         dialog.grab_set()
@@ -80,8 +85,15 @@ class DownloadManager(BaseManager):
         
         return dialog, progress_label
     
-    def _update_progress(self, item, progress, downloaded=None, total=None):
-        """Update download progress for an item - THREAD SAFE"""
+    def _track_progress(self, item, widget):
+        """Subscribe to the progress of item on the progress bus and return the subscriber"""
+        self.progress_bus.attach(widget)
+        subscriber = lambda p, d, t, rate, eta: self._update_progress(item, p, d, t, rate, eta)
+        self.progress_bus.subscribe(item, subscriber)
+        return subscriber
+    
+    def _update_progress(self, item, progress, downloaded=None, total=None, rate=None, eta=None):
+        """Update download progress for an item, called on the Tk thread by the progress bus"""
         # Ensure progress is within bounds
         progress = min(max(progress, 0), 100)
         
@@ -92,9 +104,7 @@ class DownloadManager(BaseManager):
         # Update status bar - THREAD SAFE
         if progress < 100:
             if downloaded and total:
-                downloaded_mb = downloaded / (1024 * 1024)
-                total_mb = total / (1024 * 1024)
-                status_msg = f"Downloading {item}: {progress}% ({downloaded_mb:.1f}/{total_mb:.1f} MB)"
+                status_msg = f"Downloading {item}: {progress}% {format_transfer(downloaded, total, rate, eta)}"
             else:
                 status_msg = f"Downloading {item}: {progress}%"
         else:
@@ -103,20 +113,18 @@ class DownloadManager(BaseManager):
             if item in self.ongoing_downloads and progress >= 100:
                 del self.ongoing_downloads[item]
         
-        # Update status using callback (thread safe)
+        # Update status using callback
         if self.status_callback:
             try:
                 self.status_callback(status_msg)
             except RuntimeError:
-                # If we're not in main thread, this will fail silently
-                # The UI update will happen through the dialog.after() calls
                 pass
         
         # Update UI elements if they exist
         if item in self.ui_elements:
-            self._update_ui_elements(item, progress, downloaded, total)
+            self._update_ui_elements(item, progress, downloaded, total, rate, eta)
     
-    def _update_ui_elements(self, item, progress, downloaded=None, total=None):
+    def _update_ui_elements(self, item, progress, downloaded=None, total=None, rate=None, eta=None):
         """Update UI elements for download progress"""
         ui_data = self.ui_elements.get(item)
         if not ui_data or not ui_data.get('active', False):
@@ -126,9 +134,7 @@ class DownloadManager(BaseManager):
             # Update progress label with more detailed info
             progress_text = f"{progress}%"
             if downloaded and total and total > 0:
-                downloaded_mb = downloaded / (1024 * 1024)
-                total_mb = total / (1024 * 1024)
-                progress_text = f"{progress}% ({downloaded_mb:.1f}/{total_mb:.1f} MB)"
+                progress_text = f"{progress}% {format_transfer(downloaded, total, rate, eta)}"
             
             if 'progress_label' in ui_data:
                 ui_data['progress_label'].config(text=progress_text)
@@ -145,168 +151,232 @@ class DownloadManager(BaseManager):
             ui_data['active'] = False
             print(f"Error updating UI for {item}: {str(e)}")
     
-    def download_game(self, game, parent=None):
-        """Download a game with progress dialog"""
-        if self.is_download_in_progress():
-            self.show_dialog(parent, "Download in Progress", 
-                           "Another download is already in progress. Please wait.", 
-                           dialog_type="info")
-            return None
+    def _run_with_dialog(self, item, title, item_name, parent, submit, priority):
+        """Submit a transfer with submit(set_status) and show its progress in a dialog
+        
+        submit returns the scheduler job, which may be one already in flight
+        for item that this dialog then follows.
         
-        # Check if the updater is running
-        if self.update_manager and self.update_manager.is_updating:
-            self.show_dialog(parent, "Update in Progress",
-                           "An update is currently in progress. Please wait.",
-                           dialog_type="info")
+        Pausing or closing the dialog stops the transfer through its cancel
+        token, unless another caller still follows the job.
+        
+        Returns the transfer result, or None if it failed or was stopped.
+        """
+        if get_connectivity().offline:
+            self.show_dialog(parent, "Offline", f"Cannot download {item_name} without a network connection.",
+                             dialog_type="info")
             return None
         
-        try:
-            # Get the URL
-            if game not in self.config_manager.config["game_urls"]:
-                self.show_dialog(parent, "Error", f"Game '{game}' not found in configuration", 
-                               dialog_type="error")
-                return None
-                
-            url = self.config_manager.config["game_urls"][game]
+        # Create progress dialog
+        dialog, progress_label = self._create_progress_dialog(parent, title, item_name)
+        
+        # Set up UI tracking
+        self.ui_elements[item] = {
+            'progress_label': progress_label,
+            'download_btn': None,
+            'frame': dialog,
+            'active': True
+        }
+        
+        # Initialize download tracking
+        self.ongoing_downloads[item] = {'progress': 0, 'version': "", 'type': 'flash' if item == "flash_player" else 'game'}
+        
+        # Result storage
+        result = [None]
+        
+        # Transfer threads report through the progress bus, the UI drains it
+        subscriber = self._track_progress(item, parent or dialog)
+        
+        def on_done(job):
+            # Clean up
+            self.progress_bus.unsubscribe(item, subscriber)
+            if item in self.ui_elements:
+                self.ui_elements[item]['active'] = False
+                del self.ui_elements[item]
+            if item in self.ongoing_downloads:
+                del self.ongoing_downloads[item]
             
-            # Create progress dialog
-            dialog, progress_label = self._create_progress_dialog(parent, f"Downloading {game}", game)
+            if isinstance(job.error, TransferCancelled):
+                # Stopped from the dialog, which is already closed
+                return
             
-            # Set up UI tracking
-            self.ui_elements[game] = {
-                'progress_label': progress_label,
-                'download_btn': None,
-                'frame': dialog,
-                'active': True
-            }
+            if job.error:
+                error_msg = f"Failed to download {item_name}: {str(job.error)}"
+                dialog.after(0, lambda: self.set_status(f"Failed to download {item_name}"))
+                
+                def show_error():
+                    try:
+                        self.show_dialog(parent, "Download Error", error_msg, dialog_type="error")
+                        dialog.destroy()
+                    except tk.TclError:
+                        pass
+                
+                dialog.after(0, show_error)
+                return
             
-            # Initialize download tracking
-            self.ongoing_downloads[game] = {'progress': 0, 'version': "", 'type': 'game'}
-            self.is_downloading = True
+            result[0] = job.result
             
-            # Result storage
-            result = [None]
+            # Final progress update
+            dialog.after(0, lambda: self._update_progress(item, 100))
             
-            def download_thread():
+            # Close dialog after delay
+            def close_dialog():
                 try:
-                    # Create a request to get headers
-                    response = requests.head(url, timeout=30)
-                    response.raise_for_status()
-                    
-                    # Extract filename and version
-                    _, version = self._extract_filename_and_version(url, response)
-                    
-                    # Create filename
-                    game_filename = f"{game}.swf"
-                    file_path = os.path.join(self.config_manager.games_dir, game_filename)
-                    
-                    # Download the file with progress updates
-                    with requests.get(url, stream=True, timeout=30) as r:
-                        r.raise_for_status()
-                        
-                        # Get total file size
-                        total_size = int(r.headers.get('content-length', 0))
-                        downloaded = 0
-                        
-                        with open(file_path, 'wb') as f:
-                            for chunk in r.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                                    downloaded += len(chunk)
-                                    
-                                    # Update progress
-                                    if total_size > 0:
-                                        progress = int((downloaded / total_size) * 100)
-                                        # Schedule UI update in main thread
-                                        dialog.after(0, lambda p=progress, d=downloaded, t=total_size: 
-                                                    self._update_progress(game, p, d, t))
-                                        
-                                        # Small delay for smoother progress display
-                                        time.sleep(0.01)
-                    
-                    # Update version information
-                    self.config_manager.version["games"][game] = version
-                    self.config_manager.save_version_info()
-                    
-                    # Final progress update
-                    dialog.after(0, lambda: self._update_progress(game, 100))
-                    
-                    result[0] = file_path
-                    
-                    # Close dialog after delay
-                    def close_dialog():
-                        try:
-                            dialog.destroy()
-                        except tk.TclError:
-                            pass
-                    
-                    dialog.after(1000, close_dialog)
-                    
-                except Exception as e:
-                    error_msg = f"Failed to download {game}: {str(e)}"
-                    dialog.after(0, lambda: self.set_status(f"Failed to download {game}"))
-                    
-                    def show_error():
-                        try:
-                            self.show_dialog(parent, "Download Error", error_msg, dialog_type="error")
-                            dialog.destroy()
-                        except tk.TclError:
-                            pass
-                    
-                    dialog.after(0, show_error)
-                
-                finally:
-                    # Clean up
-                    self.is_downloading = False
-                    if game in self.ui_elements:
-                        self.ui_elements[game]['active'] = False
-                        del self.ui_elements[game]
-                    if game in self.ongoing_downloads:
-                        del self.ongoing_downloads[game]
+                    dialog.destroy()
+                except tk.TclError:
+                    pass
             
-            # Set up dialog close handler
-            def close_dialog():
-                if game in self.ui_elements:
-                    self.ui_elements[game]['active'] = False
-                self.is_downloading = False
+            # Play continues once the dialog closes, so do not keep the player waiting
+            dialog.after(0 if priority == PRIORITY_PLAY else 1000, close_dialog)
+        
+        job = None
+        
+        # Closing the dialog cancels the transfer unless another caller still follows it
+        def stop_download(pause=False):
+            if item in self.ui_elements:
+                self.ui_elements[item]['active'] = False
+            if job is not None and self.scheduler.cancel(job, pause=pause):
+                self.set_status(f"Download of {item_name} {'paused' if pause else 'cancelled'}")
+            try:
                 dialog.destroy()
-            
-            dialog.protocol("WM_DELETE_WINDOW", close_dialog)
-            
-            # Start download thread
-            thread = threading.Thread(target=download_thread)
-            thread.daemon = True
-            thread.start()
-            
-            # Wait for dialog to close
+            except tk.TclError:
+                pass
+        
+        dialog.protocol("WM_DELETE_WINDOW", stop_download)
+        
+        btn_frame = Frame(dialog)
+        btn_frame.pack(pady=5)
+        Button(btn_frame, text="Pause", width=8,
+               command=lambda: stop_download(pause=True)).pack(side=tk.LEFT, padx=5)
+        Button(btn_frame, text="Cancel", width=8,
+               command=stop_download).pack(side=tk.LEFT, padx=5)
+        
+        def set_status(message):
+            # Status updates from the transfer thread go through the Tk event loop
             try:
-                parent.wait_window(dialog)
+                dialog.after(0, lambda: self.set_status(message))
             except tk.TclError:
                 pass
+        
+        # Queue the transfer, or join the one already running for this item
+        job = submit(set_status)
+        if job.state == "queued":
+            progress_label.config(text="Waiting for other downloads...")
+        job.add_done_callback(on_done)
+        
+        # Wait for dialog to close
+        try:
+            (parent or dialog).wait_window(dialog)
+        except tk.TclError:
+            pass
+        
+        return result[0]
+    
+    def submit_game(self, game, priority=PRIORITY_USER):
+        """Queue a game download, or join the one already in flight for the game"""
+        # Schedule against the host of the mirror the download will most likely use
+        url = MirrorRanking(self.config_manager, game).rank(self.config_manager.get_game_urls(game))[0]
+        return self.scheduler.submit(game, lambda token: self._fetch_game(game, token), url=url,
+                                     priority=priority)
+    
+    def _fetch_game(self, game, token=None):
+        """Download a game into the games directory and return its path, runs as a scheduler job"""
+        # Create filename
+        game_filename = f"{game}.swf"
+        file_path = os.path.join(self.config_manager.games_dir, game_filename)
+        store = get_object_store(self.config_manager.games_dir)
+        index = get_game_index(self.config_manager.games_dir)
+        
+        # The download replaces file_path, report it to the index instead of leaving it to a rescan
+        with index.changing():
+            # Download the file from the best mirror with progress updates, revalidating any existing copy
+            url, download = download_from_mirrors(self.downloader, MirrorRanking(self.config_manager, game),
+                                                  self.config_manager.get_game_urls(game), file_path,
+                                                  self.progress_bus.reporter(game),
+                                                  validators=self.config_manager.get_validators(game), token=token,
+                                                  retry=self.retry, store=store)
+            
+            # Keep the content in the object store, shared with identical files
+            digest = store.add(file_path, None if download.not_modified else download.headers, download.digest)
+            index.update(file_path)
+        
+        if not download.not_modified:
+            # Extract version from the response the file was downloaded with
+            _, version = self._extract_filename_and_version(url, download, file_path, download.swf_header)
+            if not version:
+                version = self.config_manager.version["games"].get(game, "")
             
-            return result[0]
+            # Update version and validator information
+            self.config_manager.set_game_version(game, version)
+            self.config_manager.set_validators(game, download.headers)
+        
+        # Keep this build next to the earlier ones so it can be rolled back to
+        GameInstalls(self.config_manager).record(game, self.config_manager.version["games"].get(game, ""), digest)
+        
+        return file_path
+    
+    def download_game(self, game, parent=None, priority=PRIORITY_PLAY):
+        """Download a game with progress dialog"""
+        try:
+            # Make sure the game is configured
+            if game not in self.config_manager.config["game_urls"]:
+                self.show_dialog(parent, "Error", f"Game '{game}' not found in configuration", 
+                               dialog_type="error")
+                return None
+                
+            return self._run_with_dialog(game, f"Downloading {game}", game, parent,
+                                         lambda set_status: self.submit_game(game, priority), priority)
             
         except Exception as e:
-            self.is_downloading = False
             self.show_dialog(parent, "Error", f"Failed to start download: {str(e)}", 
                            dialog_type="error")
             return None
     
-    def download_flash_player(self, parent=None):
-        """Download Flash Player with progress dialog"""
-        if self.is_download_in_progress():
-            self.show_dialog(parent, "Download in Progress", 
-                           "Another download is already in progress. Please wait.", 
-                           dialog_type="info")
-            return None
-
-        # Check if the updater is running
-        if self.update_manager and self.update_manager.is_updating:
-            self.show_dialog(parent, "Update in Progress",
-                           "An update is currently in progress. Please wait.",
-                           dialog_type="info")
-            return None
+    def _stream_flash_archive(self, url, download_info, flash_dir, progress_callback=None, token=None):
+        """Install the Flash Player projector from a tar.gz while it downloads
+        
+        The archive is read in "r|gz" stream mode straight off the response.
+        Only the binary and the configured extract_members are written, each
+        to a temporary file that replaces its final path once complete.
+        """
+        bin_name = download_info["bin_name"]
+        wanted = {bin_name, *download_info.get("extract_members", [])}
+        token = token or CancelToken()
+        found_bin = False
+        
+        with self.transport.get(url, stream=True, timeout=self.downloader.timeout) as r, token.watch(r):
+            r.raise_for_status()
+            reader = ProgressReader(r.raw, int(r.headers.get('content-length', 0)), progress_callback, token,
+                                    self.downloader.bandwidth.transfer())
+            
+            with tarfile.open(fileobj=reader, mode="r|gz") as tar:
+                for member in tar:
+                    name = os.path.basename(member.name)
+                    if not member.isfile() or (member.name not in wanted and name not in wanted):
+                        continue
+                    
+                    target = os.path.join(flash_dir, name)
+                    part_path = target + ".part"
+                    try:
+                        with open(part_path, 'wb') as f:
+                            shutil.copyfileobj(tar.extractfile(member), f, self.downloader.chunk_size)
+                        os.chmod(part_path, 0o755 if name == bin_name else member.mode & 0o777)
+                        os.replace(part_path, target)
+                    finally:
+                        if os.path.exists(part_path):
+                            os.remove(part_path)
+                    
+                    found_bin = found_bin or name == bin_name
+                    wanted.difference_update((member.name, name))
+                    if not wanted:
+                        # Everything needed is installed, skip the rest of the archive
+                        break
         
+        if not found_bin:
+            raise Exception(f"Could not find Flash Player binary in the archive. Expected: {bin_name}")
+    
+    def download_flash_player(self, parent=None, priority=PRIORITY_USER):
+        """Download Flash Player with progress dialog"""
         try:
             # Get download info
             download_info = self.config_manager.get_flash_download_info()
@@ -324,192 +394,78 @@ class DownloadManager(BaseManager):
             
             os.makedirs(flash_dir, exist_ok=True)
             
-            # Create progress dialog
-            dialog, progress_label = self._create_progress_dialog(parent, "Downloading Flash Player", "Flash Player")
-            
-            # Set up UI tracking
-            self.ui_elements["flash_player"] = {
-                'progress_label': progress_label,
-                'download_btn': None,
-                'frame': dialog,
-                'active': True
-            }
-            
-            # Initialize download tracking
-            self.ongoing_downloads["flash_player"] = {'progress': 0, 'version': "", 'type': 'flash'}
-            self.is_downloading = True
+            system = platform.system()
             
-            # Result storage
-            result = [None]
+            def fetch(url, report_progress, token):
+                if system == "Linux":
+                    # Unpack while downloading, the archive itself is never stored
+                    self._stream_flash_archive(url, download_info, flash_dir, report_progress, token)
+                else:
+                    self.downloader.download(url, download_info["full_path"], report_progress, token=token)
             
-            def download_thread():
-                try:
-                    # Try primary URL first
-                    url_to_use = download_info["url"]
-                    
+            def transfer(set_status, token):
+                report_progress = self.progress_bus.reporter("flash_player")
+                
+                # Start with the mirror that served the last install
+                urls = [download_info["url"]]
+                if "fallback_url" in download_info:
+                    urls.append(download_info["fallback_url"])
+                urls = order_mirrors(urls, self.config_manager.get_preferred_mirror("flash_player"))
+                
+                if len(urls) > 1 and self.config_manager.config["flash_player"].get("race_mirrors", False):
+                    # Commit to whichever mirror answers first instead of waiting out a timeout
+                    set_status("Finding the fastest Flash Player source...")
+                    urls = race_mirrors(urls, self.transport, timeout=self.downloader.timeout, token=token)
+                
+                for i, url_to_use in enumerate(urls):
                     try:
-                        # Schedule status update in main thread
-                        dialog.after(0, lambda: self.set_status("Downloading Flash Player from primary source..."))
-                        
-                        with requests.get(url_to_use, stream=True, timeout=30) as r:
-                            r.raise_for_status()
-                            
-                            # Get total file size
-                            total_size = int(r.headers.get('content-length', 0))
-                            downloaded = 0
-                            
-                            with open(download_info["full_path"], 'wb') as f:
-                                for chunk in r.iter_content(chunk_size=8192):
-                                    if chunk:
-                                        f.write(chunk)
-                                        downloaded += len(chunk)
-                                        
-                                        # Update progress
-                                        if total_size > 0:
-                                            progress = int((downloaded / total_size) * 100)
-                                            # Schedule UI update in main thread
-                                            dialog.after(0, lambda p=progress, d=downloaded, t=total_size: 
-                                                        self._update_progress("flash_player", p, d, t))
-                                            
-                                            # Small delay for smoother progress display
-                                            time.sleep(0.01)
-                                            
-                    except Exception as e:
-                        # Try fallback URL if available
-                        if "fallback_url" in download_info:
-                            # Schedule status update in main thread
-                            dialog.after(0, lambda: self.set_status("Primary download failed, trying fallback source..."))
-                            print(f"Primary download failed: {str(e)}")
-                            
-                            with requests.get(download_info["fallback_url"], stream=True, timeout=30) as r:
-                                r.raise_for_status()
-                                
-                                # Get total file size
-                                total_size = int(r.headers.get('content-length', 0))
-                                downloaded = 0
-                                
-                                with open(download_info["full_path"], 'wb') as f:
-                                    for chunk in r.iter_content(chunk_size=8192):
-                                        if chunk:
-                                            f.write(chunk)
-                                            downloaded += len(chunk)
-                                            
-                                            # Update progress
-                                            if total_size > 0:
-                                                progress = int((downloaded / total_size) * 100)
-                                                # Schedule UI update in main thread
-                                                dialog.after(0, lambda p=progress, d=downloaded, t=total_size: 
-                                                            self._update_progress("flash_player", p, d, t))
-                                                
-                                                # Small delay for smoother progress display
-                                                time.sleep(0.01)
+                        if i == 0:
+                            set_status("Downloading Flash Player...")
                         else:
-                            raise
-                    
-                    # Process the downloaded file based on OS
-                    system = platform.system()
-                    if system == "Darwin":  # macOS
-                        # Mount DMG and copy the app
-                        mount_point = tempfile.mkdtemp()
-                        subprocess.run(["hdiutil", "attach", download_info["full_path"], "-mountpoint", mount_point])
-                        app_path = os.path.join(mount_point, download_info["app_name"])
-                        dest_path = os.path.join(flash_dir, download_info["app_name"])
-                        shutil.copytree(app_path, dest_path)
-                        subprocess.run(["hdiutil", "detach", mount_point])
-                        shutil.rmtree(mount_point)
-                        os.remove(download_info["full_path"])
-                    elif system == "Linux":
-                        # Extract tar.gz file
-                        with tarfile.open(download_info["full_path"], "r:gz") as tar:
-                            tar.extractall(path=flash_dir)
-                        os.remove(download_info["full_path"])
-                        
-                        # Make the binary executable
-                        flash_bin = os.path.join(flash_dir, download_info["bin_name"])
+                            set_status("Download failed, trying fallback source...")
                         
-                        # Check if the binary exists
-                        if not os.path.exists(flash_bin):
-                            # Try to find the binary in the extracted files
-                            for root, dirs, files in os.walk(flash_dir):
-                                for file in files:
-                                    if file == download_info["bin_name"]:
-                                        flash_bin = os.path.join(root, file)
-                                        break
-                        
-                        # If we found the binary, make it executable
-                        if os.path.exists(flash_bin):
-                            os.chmod(flash_bin, 0o755)
-                            # If the binary is not in the expected location, move it there
-                            expected_path = os.path.join(flash_dir, download_info["bin_name"])
-                            if flash_bin != expected_path:
-                                shutil.move(flash_bin, expected_path)
-                        else:
-                            raise Exception(f"Could not find Flash Player binary after extraction. Expected: {download_info['bin_name']}")
+                        self.retry.call(lambda remaining: fetch(url_to_use, report_progress, token),
+                                        url_to_use, token)
+                        self.config_manager.set_preferred_mirror("flash_player", url_to_use)
+                        break
                     
-                    # Update version information
+                    except TransferCancelled:
+                        raise
+                    except Exception as e:
+                        print(f"Download from {url_to_use} failed: {str(e)}")
+                        # Report the error of the last source
+                        if i == len(urls) - 1:
+                            raise
+                
+                token.raise_if_triggered()
+                
+                # Process the downloaded file based on OS
+                if system == "Darwin":  # macOS
+                    # Mount DMG and copy the app
+                    mount_point = tempfile.mkdtemp()
+                    subprocess.run(["hdiutil", "attach", download_info["full_path"], "-mountpoint", mount_point])
+                    app_path = os.path.join(mount_point, download_info["app_name"])
+                    dest_path = os.path.join(flash_dir, download_info["app_name"])
+                    shutil.copytree(app_path, dest_path)
+                    subprocess.run(["hdiutil", "detach", mount_point])
+                    shutil.rmtree(mount_point)
+                    os.remove(download_info["full_path"])
+                
+                # Update version information
+                with self.config_manager.lock:
                     self.config_manager.version["flash_player"] = self.config_manager.config["flash_player"]["fallback_version"]
                     self.config_manager.save_version_info()
-                    
-                    # Final progress update
-                    dialog.after(0, lambda: self._update_progress("flash_player", 100))
-                    
-                    result[0] = self.config_manager.get_flash_player_path()
-                    
-                    # Close dialog after delay
-                    def close_dialog():
-                        try:
-                            dialog.destroy()
-                        except tk.TclError:
-                            pass
-                    
-                    dialog.after(1000, close_dialog)
-                    
-                except Exception as e:
-                    error_msg = f"Failed to download Flash Player: {str(e)}"
-                    dialog.after(0, lambda: self.set_status("Failed to download Flash Player"))
-                    
-                    def show_error():
-                        try:
-                            self.show_dialog(parent, "Download Error", error_msg, dialog_type="error")
-                            dialog.destroy()
-                        except tk.TclError:
-                            pass
-                    
-                    dialog.after(0, show_error)
                 
-                finally:
-                    # Clean up
-                    self.is_downloading = False
-                    if "flash_player" in self.ui_elements:
-                        self.ui_elements["flash_player"]['active'] = False
-                        del self.ui_elements["flash_player"]
-                    if "flash_player" in self.ongoing_downloads:
-                        del self.ongoing_downloads["flash_player"]
+                return self.config_manager.get_flash_player_path()
             
-            # Set up dialog close handler
-            def close_dialog():
-                if "flash_player" in self.ui_elements:
-                    self.ui_elements["flash_player"]['active'] = False
-                self.is_downloading = False
-                dialog.destroy()
-            
-            dialog.protocol("WM_DELETE_WINDOW", close_dialog)
-            
-            # Start download thread
-            thread = threading.Thread(target=download_thread)
-            thread.daemon = True
-            thread.start()
-            
-            # Wait for dialog to close
-            try:
-                parent.wait_window(dialog)
-            except tk.TclError:
-                pass
+            def submit(set_status):
+                return self.scheduler.submit("flash_player", lambda token: transfer(set_status, token),
+                                             url=download_info["url"], priority=priority)
             
-            return result[0]
+            return self._run_with_dialog("flash_player", "Downloading Flash Player", "Flash Player", parent,
+                                         submit, priority)
             
         except Exception as e:
-            self.is_downloading = False
             self.show_dialog(parent, "Error", f"Failed to start Flash Player download: {str(e)}", 
                            dialog_type="error")
             return None
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import hashlib
+from email.utils import parsedate_to_datetime
+
+# First bytes of an SWF: signature, format version and uncompressed length
+SWF_SIGNATURES = (b"FWS", b"CWS", b"ZWS")
+SWF_HEADER_SIZE = 8
+
+
+def filename_from_response(url, response):
+    """Get the filename from the Content-Disposition header, or from the URL"""
+    if "content-disposition" in response.headers:
+        try:
+            return response.headers['content-disposition'].split('filename=')[1].strip('"')
+        except (IndexError, KeyError):
+            pass
+    return url.split('/')[-1]
+
+
+def version_from_filename(filename):
+    """Get the version from a "{name}-v{version}.swf" filename, or "" if it has none"""
+    if '-v' in filename:
+        try:
+            return filename.split('-v')[1].split('.swf')[0]
+        except (IndexError, KeyError):
+            pass
+    return ""
+
+
+def version_from_validators(headers):
+    """Derive a stable version from the ETag, or Last-Modified plus length"""
+    etag = headers.get('etag', '')
+    if etag:
+        # Weak and strong forms of the same tag identify the same content
+        etag = etag[2:] if etag.startswith('W/') else etag
+        return hashlib.sha1(etag.strip('"').encode()).hexdigest()[:10]
+
+    last_modified = headers.get('last-modified', '')
+    length = headers.get('content-length', '')
+    if last_modified and length:
+        try:
+            stamp = parsedate_to_datetime(last_modified).strftime("%Y%m%d%H%M%S")
+        except (TypeError, ValueError):
+            return ""
+        return f"{stamp}-{length}"
+
+    return ""
+
+
+def version_from_swf_header(data):
+    """Derive a version from the SWF format version and uncompressed length fields"""
+    if len(data) < SWF_HEADER_SIZE or data[:3] not in SWF_SIGNATURES:
+        return ""
+    swf_version = data[3]
+    uncompressed_length = int.from_bytes(data[4:8], "little")
+    return f"swf{swf_version}-{uncompressed_length}"
+
+
+def read_swf_header(url, transport, timeout=10):
+    """Read the first bytes of a remote SWF with a small Range request"""
+    headers = {'Range': f'bytes=0-{SWF_HEADER_SIZE - 1}'}
+    with transport.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        data = b""
+        # A server that ignores Range sends the whole file, stop after the header
+        for chunk in r.iter_content(chunk_size=SWF_HEADER_SIZE):
+            data += chunk
+            if len(data) >= SWF_HEADER_SIZE:
+                break
+        return data[:SWF_HEADER_SIZE]
+
+
+def extract_filename_and_version(url, response, transport=None, local_path=None, header=None):
+    """Extract the filename and a stable version for a game response
+
+    The version comes from the filename when it carries one, then from the
+    ETag or Last-Modified plus length, then from the SWF header given as
+    header, read from local_path or, with a transport, fetched from the remote
+    file. It is "" when none are available.
+    """
+    filename = filename_from_response(url, response)
+
+    version = version_from_filename(filename) or version_from_validators(response.headers)
+    if version:
+        return filename, version
+
+    try:
+        if header:
+            version = version_from_swf_header(header)
+        elif local_path:
+            with open(local_path, "rb") as f:
+                version = version_from_swf_header(f.read(SWF_HEADER_SIZE))
+        elif transport:
+            version = version_from_swf_header(read_swf_header(url, transport))
+    except Exception as e:
+        print(f"Error reading SWF header of {url}: {str(e)}")
+
+    return filename, version
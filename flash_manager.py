@@ -4,6 +4,9 @@ import platform
 import subprocess
 from tkinter import messagebox, Toplevel
 from base_manager import BaseManager
+from scheduler import PRIORITY_PLAY, PRIORITY_USER
+from connectivity import get_connectivity
+from game_activity import get_game_activity
 
 class FlashManager(BaseManager):
     def __init__(self, config_manager, download_manager=None, status_callback=None):
@@ -12,29 +15,36 @@ class FlashManager(BaseManager):
         self.download_manager = download_manager
     
     def is_download_in_progress(self):
-        """Check if a download is currently in progress"""
+        """Check if a Flash Player download is queued or running"""
         if self.download_manager:
-            return self.download_manager.is_download_in_progress()
+            return self.download_manager.is_download_in_progress("flash_player")
         return False
     
-    def check_flash_player(self, parent=None):
+    def check_flash_player(self, parent=None, priority=PRIORITY_PLAY):
         """Check if Flash Player is installed and download if needed"""
         flash_path = self.config_manager.get_flash_player_path()
         
         # Check if Flash Player exists
         if not flash_path or not os.path.exists(flash_path):
+            if get_connectivity().offline:
+                self.show_dialog(parent, "Offline",
+                                 "Flash Player is not installed and there is no network connection.\n"
+                                 "It can be downloaded once the connection is back.",
+                                 dialog_type="info")
+                return None
+            
             result = self.show_dialog(parent, "Flash Player", "Flash Player is not installed. Do you want to download it now?")
             if result:
-                return self.download_flash_player(parent)
+                return self.download_flash_player(parent, priority=priority)
             else:
                 return None
         
         return flash_path
     
-    def download_flash_player(self, parent=None):
+    def download_flash_player(self, parent=None, priority=PRIORITY_USER):
         """Download Flash Player using DownloadManager"""
         if self.download_manager:
-            return self.download_manager.download_flash_player(parent)
+            return self.download_manager.download_flash_player(parent, priority=priority)
         else:
             self.show_dialog(parent, "Error", "Download manager not available", dialog_type="error")
             return None
@@ -52,7 +62,8 @@ class FlashManager(BaseManager):
             if system == "Windows":
                 cmd = [flash_path, game_path]
             elif system == "Darwin":  # macOS
-                cmd = ["open", "-a", flash_path, game_path]
+                # -W keeps open running until the player quits, so the game can be tracked
+                cmd = ["open", "-W", "-a", flash_path, game_path]
             elif system == "Linux":
                 cmd = [flash_path, game_path]
             else:
@@ -60,7 +71,9 @@ class FlashManager(BaseManager):
                 return False
                 
             if cmd:
-                subprocess.Popen(cmd)
+                process = subprocess.Popen(cmd)
+                # Background downloads are throttled while the game runs
+                get_game_activity().track(process)
                 return True
             
             return False
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import os
+import platform
+import shutil
+import subprocess
+import threading
+import time
+
+# Added to the nice value of background transfer threads on Linux
+BACKGROUND_NICE = 10
+
+
+def lower_thread_priority():
+    """Lower the CPU and I/O priority of the calling thread, best effort
+
+    Threads started afterwards by this thread inherit the lower priority.
+    Lowered priorities only matter when something else competes for the CPU
+    or disk, such as a running game. Unprivileged processes cannot raise
+    them again, so this is meant for threads that only run background work.
+    """
+    system = platform.system()
+    try:
+        if system == "Linux":
+            tid = threading.get_native_id()
+            nice = os.getpriority(os.PRIO_PROCESS, tid)
+            os.setpriority(os.PRIO_PROCESS, tid, min(19, nice + BACKGROUND_NICE))
+            if shutil.which("ionice"):
+                # Lowest level of the best-effort class, the idle class could starve the transfer
+                subprocess.run(["ionice", "-c", "2", "-n", "7", "-p", str(tid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=2)
+        elif system == "Darwin":
+            # PRIO_DARWIN_THREAD / PRIO_DARWIN_BG, lowers CPU and I/O priority of the thread
+            os.setpriority(3, 0, 0x1000)
+        elif system == "Windows":
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            # THREAD_MODE_BACKGROUND_BEGIN, lowers CPU and I/O priority of the thread
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 0x00010000)
+    except Exception as e:
+        print(f"Could not lower thread priority: {str(e)}")
+
+
+class GameActivity:
+    """Tracks the Flash Player processes started by the launcher
+
+    Listeners are called with True when the first game starts and with False
+    once every tracked game has exited. Processes are polled from a thread
+    that only runs while a game is alive.
+    """
+
+    # Seconds between checks for exited games
+    POLL_INTERVAL = 2.0
+
+    def __init__(self):
+        self._processes = []
+        self._listeners = []
+        self._lock = threading.Lock()
+        # Serializes notifications, so a stale "idle" cannot overtake a newer "playing"
+        self._notify_lock = threading.Lock()
+        self._reported = False
+        self._thread = None
+
+    @property
+    def playing(self):
+        return bool(self._processes)
+
+    def add_listener(self, callback):
+        """Call callback(playing) whenever a game starts with none running or the last one exits"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def track(self, process):
+        """Watch a Popen of a game until it exits"""
+        with self._lock:
+            started = not self._processes
+            self._processes.append(process)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if started:
+            self._notify(True)
+
+    def _run(self):
+        while True:
+            time.sleep(self.POLL_INTERVAL)
+            with self._lock:
+                self._processes = [process for process in self._processes if process.poll() is None]
+                if self._processes:
+                    continue
+                self._thread = None
+            self._notify(False)
+            return
+
+    def _notify(self, playing):
+        with self._notify_lock:
+            with self._lock:
+                # A game may have started or exited since the caller decided to notify
+                if bool(self._processes) != playing or self._reported == playing:
+                    return
+                self._reported = playing
+                listeners = list(self._listeners)
+            for callback in listeners:
+                try:
+                    callback(playing)
+                except Exception as e:
+                    print(f"Error in game activity listener: {str(e)}")
+
+
+_activity = None
+_activity_lock = threading.Lock()
+
+
+def get_game_activity():
+    """Get the process-wide game activity tracker"""
+    global _activity
+    with _activity_lock:
+        if _activity is None:
+            _activity = GameActivity()
+        return _activity
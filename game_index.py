@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Coarsest directory mtime resolution we expect (FAT), a scan this close to a change may have missed it
+MTIME_GRANULARITY = 2.0
+
+
+class GameIndex:
+    """In-memory index of the game files in a games directory
+
+    Built with one os.scandir pass and kept per game: the legacy {game}.swf
+    path and the newest {game}-v*.swf. Lookups are a dictionary access plus
+    one stat of the directory, whose mtime changes whenever a file is added,
+    removed or renamed in it, so changes made outside the launcher trigger a
+    rescan. The download pipeline reports its own changes through update()
+    and remove(), which keep the index current without one.
+    """
+
+    def __init__(self, games_dir):
+        self.games_dir = games_dir
+        self._games = {}  # {game: {"legacy": path or None, "versions": {path: mtime}, "latest": path or None}}
+        self._mtime = None
+        self._racy = True
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse(filename):
+        """Return (game, versioned) for a game filename, or (None, False)"""
+        if not filename.endswith(".swf"):
+            return None, False
+        stem = filename[:-4]
+        if "-v" in stem:
+            return stem.split("-v", 1)[0], True
+        return stem, False
+
+    def _dir_mtime(self):
+        try:
+            return os.stat(self.games_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def _scan(self):
+        games = {}
+        mtime = self._dir_mtime()
+        try:
+            with os.scandir(self.games_dir) as entries:
+                for entry in entries:
+                    game, versioned = self._parse(entry.name)
+                    if not game:
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        info = games.setdefault(game, {"legacy": None, "versions": {}, "latest": None})
+                        if versioned:
+                            info["versions"][entry.path] = entry.stat().st_mtime
+                        else:
+                            info["legacy"] = entry.path
+                    except OSError:
+                        # Removed while scanning
+                        continue
+        except OSError as e:
+            print(f"Error scanning games directory: {str(e)}")
+        for info in games.values():
+            self._find_latest(info)
+        self._games = games
+        self._mtime = mtime
+        # Changes in the same mtime tick as the scan would not move the mtime again
+        self._racy = mtime is None or time.time() - mtime / 1e9 < MTIME_GRANULARITY
+
+    @staticmethod
+    def _find_latest(info):
+        versions = info["versions"]
+        info["latest"] = max(versions, key=versions.get) if versions else None
+
+    def _validate(self):
+        if self._racy or self._dir_mtime() != self._mtime:
+            self._scan()
+
+    def refresh(self):
+        """Rescan the directory"""
+        with self._lock:
+            self._scan()
+
+    def find(self, game):
+        """Path of the legacy file of game, else of its newest versioned file, or None"""
+        with self._lock:
+            self._validate()
+            info = self._games.get(game)
+            if not info:
+                return None
+            return info["legacy"] or info["latest"]
+
+    @contextmanager
+    def changing(self):
+        """Wrap changes the launcher makes to the directory and reports with update() or remove()
+
+        When nothing else changed the directory since it was last scanned, the
+        index follows its new mtime instead of rescanning on the next lookup.
+        """
+        mtime_before = self._dir_mtime()
+        yield
+        with self._lock:
+            if mtime_before == self._mtime:
+                self._mtime = self._dir_mtime()
+
+    def update(self, path):
+        """Record a game file the launcher just wrote"""
+        game, versioned = self._parse(os.path.basename(path))
+        if not game:
+            return
+        with self._lock:
+            info = self._games.setdefault(game, {"legacy": None, "versions": {}, "latest": None})
+            if versioned:
+                try:
+                    mtime = info["versions"][path] = os.path.getmtime(path)
+                    if info["latest"] is None or mtime >= info["versions"].get(info["latest"], 0):
+                        info["latest"] = path
+                except OSError:
+                    info["versions"].pop(path, None)
+                    if info["latest"] == path:
+                        self._find_latest(info)
+            else:
+                info["legacy"] = path if os.path.exists(path) else None
+
+    def remove(self, path):
+        """Forget a game file the launcher just deleted"""
+        game, _ = self._parse(os.path.basename(path))
+        with self._lock:
+            info = self._games.get(game)
+            if info:
+                info["versions"].pop(path, None)
+                if info["latest"] == path:
+                    self._find_latest(info)
+                if info["legacy"] == path:
+                    info["legacy"] = None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_game_index(games_dir):
+    """Get the process-wide game index of a games directory"""
+    with _indexes_lock:
+        index = _indexes.get(games_dir)
+        if index is None:
+            index = _indexes[games_dir] = GameIndex(games_dir)
+        return index
@@ -3,6 +3,10 @@ import os
 import time
 from tkinter import messagebox
 from base_manager import BaseManager
+from scheduler import PRIORITY_PLAY, PRIORITY_BACKGROUND
+from connectivity import get_connectivity
+from installs import GameInstalls
+from game_index import get_game_index
 
 class GameManager(BaseManager):
     def __init__(self, config_manager, flash_manager, download_manager=None, status_callback=None, update_manager=None):
@@ -11,16 +15,19 @@ class GameManager(BaseManager):
         self.flash_manager = flash_manager
         self.download_manager = download_manager
         self._update_manager = update_manager
+        # Scan the games directory once, lookups then avoid touching the disk
+        self.game_index = get_game_index(config_manager.games_dir)
+        self.game_index.refresh()
     
     def set_update_manager(self, update_manager):
         """Set the update manager reference to avoid circular imports"""
         self._update_manager = update_manager
     
-    def download_game(self, game, parent=None):
+    def download_game(self, game, parent=None, priority=PRIORITY_PLAY):
         """Download or update a game using DownloadManager"""
         # Use the download manager if it's available
         if self.download_manager:
-            return self.download_manager.download_game(game, parent)
+            return self.download_manager.download_game(game, parent, priority=priority)
         elif self._update_manager:
             # Fallback to update manager for backward compatibility
             return self._update_manager.download_game(game, parent=parent)
@@ -29,49 +36,10 @@ class GameManager(BaseManager):
             return None
     
     def find_game_path(self, game):
-        """Find the path to the latest version of a game"""
+        """Find the path to the active or latest version of a game"""
         try:
-            games_dir = self.config_manager.games_dir
-            
-            # Create a list to store potential paths to check
-            paths_to_check = []
-            
-            """# 1. First check if the specific version from config exists
-            game_version = self.config_manager.version["games"].get(game, "")
-            if game_version:
-                paths_to_check.append(os.path.join(games_dir, f"{game}-v{game_version}.swf"))"""
-            
-            # 2. Check for legacy format (no version in filename)
-            paths_to_check.append(os.path.join(games_dir, f"{game}.swf"))
-            
-            # Check if any of the specific paths exist
-            for path in paths_to_check:
-                if os.path.exists(path):
-                    return path
-            
-            # 3. Find the latest version by checking file modification times
-            latest_path = None
-            latest_time = 0
-            
-            # Only scan for files that match our pattern
-            prefix = f"{game}-v"
-            suffix = ".swf"
-            
-            # Get all matching files in one operation
-            matching_files = [f for f in os.listdir(games_dir) 
-                             if f.startswith(prefix) and f.endswith(suffix)]
-            
-            # Find the most recently modified file
-            for filename in matching_files:
-                file_path = os.path.join(games_dir, filename)
-                file_time = os.path.getmtime(file_path)
-                
-                if file_time > latest_time:
-                    latest_time = file_time
-                    latest_path = file_path
-            
-            return latest_path
-            
+            # {game}.swf if present, else the newest {game}-v*.swf, see game_index.py
+            return self.game_index.find(game)
         except Exception as e:
             self.set_status(f"Error finding game: {str(e)}")
             return None
@@ -83,6 +51,14 @@ class GameManager(BaseManager):
         
         # If game not found or doesn't exist, offer to download
         if not game_path or not os.path.exists(game_path):
+            if get_connectivity().offline:
+                # Nothing to download from, do not offer it
+                self.show_dialog(parent, "Offline",
+                                 f"{game} is not downloaded and there is no network connection.\n"
+                                 "It can be downloaded once the connection is back.",
+                                 dialog_type="info")
+                return False
+            
             # Use the show_dialog method from BaseManager
             result = self.show_dialog(parent, "Game not found", 
                                     f"{game} is not downloaded.\nDo you want to download it now?")
@@ -98,6 +74,8 @@ class GameManager(BaseManager):
         result = self.flash_manager.launch_game(game_path, parent)
         
         if result:
+            # Versions that are played stay installed longest
+            GameInstalls(self.config_manager).mark_played(game)
             self.set_status(f"{game} launched")
             return True
         else:
@@ -113,7 +91,7 @@ class GameManager(BaseManager):
             game_path = self.find_game_path(game)
             if not game_path or not os.path.exists(game_path):
                 self.set_status(f"{game} not found. Downloading...")
-                if self.download_game(game):
+                if self.download_game(game, priority=PRIORITY_BACKGROUND):
                     games_downloaded += 1
         
         if games_downloaded > 0:
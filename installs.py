@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+import os
+import re
+import threading
+import time
+from object_store import get_object_store
+from game_index import get_game_index
+
+# Characters kept when a version string becomes part of a filename
+UNSAFE_VERSION_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class GameInstalls:
+    """Side-by-side installed versions of each game, persisted in installs.json
+
+    Every build a game was updated to is kept as {game}-v{version}.swf, a link
+    to its object in the object store, so keeping it costs no space beyond the
+    object itself. {game}.swf is the pointer to the active version: switching
+    versions swaps that link atomically and restores the version's entry in
+    version.json and its validators, so rolling back needs no download.
+
+    collect() removes the least recently used inactive versions beyond keep
+    per game, then beyond max_bytes in total, and finally the objects no
+    longer linked from anywhere.
+    """
+
+    # Installs change from download threads and the Tk thread
+    _lock = threading.RLock()
+
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+        options = (config_manager.config or {}).get("versions", {})
+        # Versions kept per game, including the active one
+        self.keep = max(1, int(options.get("keep", 3)))
+        # Bytes that inactive versions may occupy across all games
+        self.max_bytes = max(0, int(options.get("max_bytes", 256 * 1024 * 1024)))
+
+    @property
+    def store(self):
+        return get_object_store(self.config_manager.games_dir)
+
+    @property
+    def index(self):
+        return get_game_index(self.config_manager.games_dir)
+
+    def _entry(self, game):
+        return self.config_manager.installs.setdefault(game, {"active": None, "versions": {}})
+
+    def game_path(self, game):
+        """Path of the pointer to the active version"""
+        return os.path.join(self.config_manager.games_dir, f"{game}.swf")
+
+    def version_path(self, game, name):
+        return os.path.join(self.config_manager.games_dir, f"{game}-v{name}.swf")
+
+    def versions(self, game):
+        """Names of the installed versions of a game, most recently installed first"""
+        versions = self.config_manager.installs.get(game, {}).get("versions", {})
+        return sorted(versions, key=lambda name: versions[name]["installed_at"], reverse=True)
+
+    def active_version(self, game):
+        """Name of the version {game}.swf points to, or None"""
+        return self.config_manager.installs.get(game, {}).get("active")
+
+    def record(self, game, version, digest):
+        """Keep the file just installed at {game}.swf as a version of game and mark it active
+
+        Called after every download, including ones that found the file up to
+        date, so games installed before versioning are picked up as well.
+        Returns the name of the version.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entry(game)
+            name = UNSAFE_VERSION_CHARS.sub("_", version) or digest[:10]
+            info = entry["versions"].get(name)
+            if info is not None and info["digest"] != digest:
+                # Same version string for different bytes, e.g. a rebuilt SWF with the same header
+                name = f"{name}-{digest[:8]}"
+                info = entry["versions"].get(name)
+
+            if info is None:
+                info = entry["versions"][name] = {
+                    "version": version,
+                    "digest": digest,
+                    "size": os.path.getsize(self.game_path(game)),
+                    "installed_at": now,
+                    "last_used": now
+                }
+            with self.index.changing():
+                if not os.path.exists(self.version_path(game, name)):
+                    self.store.checkout(digest, self.version_path(game, name))
+                self.index.update(self.version_path(game, name))
+                # The download has just replaced it
+                self.index.update(self.game_path(game))
+            info["validators"] = dict(self.config_manager.get_validators(game) or {})
+            if entry["active"] != name:
+                info["last_used"] = now
+                entry["active"] = name
+            self.config_manager.save_installs()
+
+        self.collect()
+        return name
+
+    def activate(self, game, name):
+        """Point {game}.swf at an installed version, return False if its file is gone"""
+        with self._lock:
+            entry = self._entry(game)
+            info = entry["versions"].get(name)
+            if info is None:
+                return False
+            if not self.store.has(info["digest"]):
+                if not os.path.exists(self.version_path(game, name)):
+                    # Removed behind our back, drop it
+                    del entry["versions"][name]
+                    self.config_manager.save_installs()
+                    return False
+                self.store.add(self.version_path(game, name), digest=info["digest"])
+
+            try:
+                with self.index.changing():
+                    self.store.checkout(info["digest"], self.game_path(game))
+                    self.index.update(self.game_path(game))
+            except FileNotFoundError:
+                return False
+            entry["active"] = name
+            info["last_used"] = time.time()
+            self.config_manager.save_installs()
+
+            # Revalidation and update checks compare against the active version
+            self.config_manager.set_game_version(game, info["version"])
+            with self.config_manager.lock:
+                self.config_manager.validators[game] = dict(info.get("validators", {}))
+                self.config_manager.save_validators()
+            return True
+
+    def rollback(self, game):
+        """Switch back to the most recently used other version, return its name or None"""
+        with self._lock:
+            entry = self._entry(game)
+            previous = sorted((info["last_used"], name) for name, info in entry["versions"].items()
+                              if name != entry["active"])
+            for _, name in reversed(previous):
+                if self.activate(game, name):
+                    return name
+            return None
+
+    def mark_played(self, game):
+        """Record that the active version of game was just launched"""
+        with self._lock:
+            entry = self._entry(game)
+            info = entry["versions"].get(entry["active"])
+            if info is not None:
+                info["last_used"] = time.time()
+                self.config_manager.save_installs()
+
+    def _evict(self, game, name):
+        with self.index.changing():
+            self.store.release(self.version_path(game, name))
+            self.index.remove(self.version_path(game, name))
+        del self.config_manager.installs[game]["versions"][name]
+
+    def collect(self):
+        """Remove least recently used versions beyond the count and size bounds, return bytes freed"""
+        with self._lock:
+            installs = self.config_manager.installs
+            evicted = 0
+            candidates = []  # (last_used, game, name) of the inactive versions kept by count
+            for game, entry in installs.items():
+                inactive = sorted(((info["last_used"], game, name) for name, info in entry["versions"].items()
+                                   if name != entry["active"]), reverse=True)
+                for _, game_name, name in inactive[self.keep - 1:]:
+                    self._evict(game_name, name)
+                    evicted += 1
+                candidates.extend(inactive[:self.keep - 1])
+
+            # Only bytes not shared with an active version count towards max_bytes
+            active = {entry["versions"][entry["active"]]["digest"] for entry in installs.values()
+                      if entry["active"] in entry["versions"]}
+            sizes = {}
+            for _, game, name in candidates:
+                info = installs[game]["versions"][name]
+                if info["digest"] not in active:
+                    sizes[info["digest"]] = info["size"]
+            users = {}
+            for _, game, name in candidates:
+                digest = installs[game]["versions"][name]["digest"]
+                users[digest] = users.get(digest, 0) + 1
+
+            for _, game, name in sorted(candidates):
+                if sum(sizes.values()) <= self.max_bytes:
+                    break
+                digest = installs[game]["versions"][name]["digest"]
+                if digest not in sizes:
+                    continue
+                self._evict(game, name)
+                evicted += 1
+                users[digest] -= 1
+                if not users[digest]:
+                    del sizes[digest]
+
+            if evicted:
+                self.config_manager.save_installs()
+            return self.store.collect() if evicted else 0
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+from transfer import CancelToken, TransferCancelled
+from retry import CircuitOpen, RetryPolicy
+from connectivity import Offline
+
+
+def order_mirrors(urls, preferred=None):
+    """Return urls with the preferred mirror first, keeping the configured order otherwise"""
+    urls = list(dict.fromkeys(urls))
+    if preferred in urls:
+        urls.remove(preferred)
+        urls.insert(0, preferred)
+    return urls
+
+
+def race_mirrors(urls, transport, timeout=10, token=None):
+    """Probe every mirror at once and return the urls with the fastest responder first
+
+    Each mirror gets a one-byte Range request. The first to answer without an
+    error wins and the other probes are cancelled. The rest keep their order
+    so they can still serve as fallbacks. If no mirror answers within timeout
+    the order is left unchanged and the download reports the real error.
+    """
+    urls = list(dict.fromkeys(urls))
+    if len(urls) < 2:
+        return urls
+
+    token = token or CancelToken()
+    results = queue.Queue()
+    probes = {url: CancelToken() for url in urls}
+
+    def probe(url):
+        start = time.monotonic()
+        try:
+            with transport.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as r, \
+                    probes[url].watch(r):
+                r.raise_for_status()
+                elapsed = time.monotonic() - start
+                if r.status_code == 206:
+                    # Drain the single byte so the warm connection goes back to the pool
+                    r.content
+            results.put((url, elapsed))
+        except Exception as e:
+            results.put((url, None))
+            if not probes[url].triggered:
+                print(f"Mirror {url} failed to respond: {str(e)}")
+
+    for url in urls:
+        threading.Thread(target=probe, args=(url,), daemon=True).start()
+
+    winner = None
+    pending = len(urls)
+    deadline = time.monotonic() + timeout
+    try:
+        while pending and winner is None:
+            token.raise_if_triggered()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                url, elapsed = results.get(timeout=min(remaining, 0.1))
+            except queue.Empty:
+                continue
+            pending -= 1
+            if elapsed is not None:
+                winner = url
+    finally:
+        for url, probe_token in probes.items():
+            if url != winner:
+                probe_token.cancel()
+
+    return order_mirrors(urls, winner)
+
+
+class MirrorRanking:
+    """Ranks the mirrors of an item by scores persisted in mirrors.json
+
+    Every transfer updates an EWMA of the mirror's throughput, time to first
+    byte and error rate. Mirrors are ordered by the transfer time those
+    predict. Mirrors without a score yet are tried first so they get measured,
+    and ties keep the configured order.
+    """
+
+    # Weight of the newest sample in the moving averages
+    SMOOTHING = 0.3
+    # Size assumed when estimating transfer time without a known Content-Length
+    DEFAULT_SIZE = 1024 * 1024
+
+    def __init__(self, config_manager, item):
+        self.config_manager = config_manager
+        self.item = item
+
+    @property
+    def scores(self):
+        return self.config_manager.mirrors.setdefault(self.item, {}).setdefault("scores", {})
+
+    def expected_throughput(self, url):
+        """Average bytes per second of a mirror, or 0 if it has not been measured"""
+        return self.scores.get(url, {}).get("throughput", 0.0)
+
+    def estimated_time(self, url, size=None):
+        """Predicted seconds to fetch size bytes from a mirror, 0 if it has no score"""
+        score = self.scores.get(url)
+        if not score:
+            return 0.0
+        seconds = score.get("ttfb", 0.0) + (size or self.DEFAULT_SIZE) / max(score.get("throughput", 0.0), 1.0)
+        # Each failure costs another attempt somewhere else
+        return seconds / max(1.0 - score.get("error_rate", 0.0), 0.05)
+
+    def rank(self, urls, size=None):
+        """Return urls ordered best first"""
+        return sorted(dict.fromkeys(urls), key=lambda url: self.estimated_time(url, size))
+
+    def rank_for_check(self, urls):
+        """Return urls with the mirror that served the current file first
+
+        Its validators are the ones stored for the file, so revalidating
+        against it does not report a change just because mirrors differ.
+        """
+        return order_mirrors(self.rank(urls), self.config_manager.get_preferred_mirror(self.item))
+
+    def record(self, url, throughput=None, ttfb=None, error=False):
+        """Fold the outcome of one transfer into the mirror's score and persist it"""
+        # Rankings of the same item can run on several job threads
+        with self.config_manager.lock:
+            score = self.scores.setdefault(url, {"throughput": 0.0, "ttfb": 0.0, "error_rate": 0.0, "samples": 0})
+            weight = self.SMOOTHING if score["samples"] else 1.0
+            score["error_rate"] += weight * ((1.0 if error else 0.0) - score["error_rate"])
+            if throughput:
+                # Seed the average with the first measurement
+                previous = score["throughput"]
+                score["throughput"] = previous + self.SMOOTHING * (throughput - previous) if previous else throughput
+            if ttfb is not None:
+                previous = score["ttfb"]
+                score["ttfb"] = previous + self.SMOOTHING * (ttfb - previous) if previous else ttfb
+            score["samples"] += 1
+            self.config_manager.save_mirrors()
+
+
+class _DegradationMonitor:
+    """Progress callback wrapper that aborts a transfer running far below its mirror's usual speed"""
+
+    # Time allowed for the transfer to reach full speed before it is judged
+    WARMUP = 3.0
+    # Fraction of the expected throughput below which the mirror counts as degraded
+    THRESHOLD = 0.25
+
+    def __init__(self, expected, token, progress_callback=None):
+        self.expected = expected
+        self.token = token
+        self.progress_callback = progress_callback
+        self.started = time.monotonic()
+        self.baseline = None
+        self.degraded = False
+        # Throughput measured when the transfer was judged, in bytes per second
+        self.rate = 0.0
+
+    def __call__(self, downloaded, total):
+        if self.progress_callback:
+            self.progress_callback(downloaded, total)
+
+        if self.baseline is None:
+            # The first report includes bytes resumed from an earlier attempt
+            self.baseline = downloaded
+            return
+
+        elapsed = time.monotonic() - self.started
+        if self.expected and elapsed >= self.WARMUP and not self.degraded:
+            self.rate = (downloaded - self.baseline) / elapsed
+            if self.rate < self.expected * self.THRESHOLD:
+                self.degraded = True
+                self.token.cancel()
+
+
+def download_from_mirrors(downloader, ranking, urls, file_path, progress_callback=None, validators=None,
+                          token=None, retry=None, store=None):
+    """Download file_path from the best ranked mirror, moving on when one fails or degrades
+
+    Transient errors are retried on the same mirror by retry, resuming from the
+    journal, before moving on. Mirrors whose host circuit is open are skipped.
+    While another mirror is left to fall back to, a transfer running well below
+    its mirror's average throughput is dropped for the next best. Switching
+    mirrors restarts the file, as the journal only resumes from the same URL.
+    With an ObjectStore, a file already stored is linked instead of fetched.
+
+    Returns:
+        (url, DownloadResult) of the mirror that served the file
+    """
+    token = token or CancelToken()
+    retry = retry or RetryPolicy()
+    size = (validators or {}).get("content_length") or None
+    urls = ranking.rank(urls, size)
+
+    for i, url in enumerate(urls):
+        last = i == len(urls) - 1
+        attempt = token.child()
+        report = progress_callback
+        monitor = None
+        if not last:
+            monitor = _DegradationMonitor(ranking.expected_throughput(url), attempt, progress_callback)
+            report = monitor
+
+        try:
+            result = retry.call(
+                lambda remaining: downloader.download(url, file_path, report, validators=validators, token=attempt,
+                                                      store=store),
+                url, attempt)
+        except TransferCancelled:
+            if token.triggered or not (monitor and monitor.degraded):
+                raise
+            print(f"Mirror {url} degraded, switching to the next one")
+            ranking.record(url, throughput=monitor.rate, error=True)
+            continue
+        except Exception as e:
+            if isinstance(e, Offline):
+                raise
+            if not isinstance(e, CircuitOpen):
+                ranking.record(url, error=True)
+            if last:
+                raise
+            print(f"Mirror {url} failed: {str(e)}")
+            continue
+
+        ranking.record(url, throughput=result.throughput, ttfb=result.ttfb)
+        ranking.config_manager.set_preferred_mirror(ranking.item, url)
+        return url, result
+
+    # Only reached when urls is empty
+    raise ValueError("No mirrors configured")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+# Bytes hashed per read when adding a file
+HASH_CHUNK_SIZE = 1024 * 1024
+# Errors meaning the filesystem cannot make the link, not that the object is missing
+UNSUPPORTED_LINK_ERRORS = (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP,
+                           errno.EOPNOTSUPP, errno.ENOSYS)
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def validator_key(headers):
+    """Key identifying a response body by its validators, or None if it has none
+
+    A strong ETag or Last-Modified is combined with the length so two
+    different bodies are very unlikely to share a key.
+    """
+    length = headers.get('content-length', '')
+    etag = headers.get('etag', '')
+    if etag and not etag.startswith('W/'):
+        return f"etag:{etag}:{length}"
+    last_modified = headers.get('last-modified', '')
+    if last_modified and length:
+        return f"modified:{last_modified}:{length}"
+    return None
+
+
+class ObjectStore:
+    """Content-addressed store of downloaded files, keyed by SHA-256
+
+    Objects live in objects/<first two hex digits>/<digest> under the games
+    directory. Game paths such as PTD1.swf are hardlinks to them, or symlinks
+    where hardlinks are not possible, so identical bytes are stored once.
+    The index in objects/index.json maps response validators to digests, so a
+    download whose validators match a stored object is linked without a
+    transfer, and remembers which object each linked file points to.
+
+    Objects are never modified in place: downloads write a .part file and
+    replace the link, not the object it points to.
+    """
+
+    def __init__(self, games_dir):
+        self.games_dir = games_dir
+        self.root = os.path.join(games_dir, "objects")
+        self.index_path = os.path.join(self.root, "index.json")
+        self._lock = threading.Lock()
+        self._index = None
+
+    def __reduce__(self):
+        # Sent to the transfer worker process, which only looks objects up
+        return ObjectStore, (self.games_dir,)
+
+    def _load(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, "r") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            for section in ("objects", "validators", "files"):
+                self._index.setdefault(section, {})
+        return self._index
+
+    def _save(self):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self._index, f, indent=4)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"Error saving object index: {str(e)}")
+
+    def object_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def find(self, headers):
+        """Return the digest of a stored object matching the validators in headers, or None"""
+        key = validator_key(headers)
+        if not key:
+            return None
+        with self._lock:
+            # Read fresh, the index may have been updated by another process
+            self._index = None
+            digest = self._load()["validators"].get(key)
+        if digest and self.has(digest):
+            return digest
+        return None
+
+    def link(self, digest, path):
+        """Point path at a stored object, atomically replacing whatever is there
+
+        Raises FileNotFoundError if the object is not stored, e.g. because
+        collect() removed it meanwhile; path is left untouched then.
+        """
+        source = self.object_path(digest)
+        if not os.path.isfile(source):
+            raise FileNotFoundError(errno.ENOENT, "Object not in store", source)
+        temp_path = path + ".link"
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        try:
+            os.link(source, temp_path)
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_LINK_ERRORS:
+                raise
+            try:
+                os.symlink(source, temp_path)
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_LINK_ERRORS:
+                    raise
+                # Neither is supported here, e.g. on FAT volumes
+                shutil.copyfile(source, temp_path)
+        os.replace(temp_path, path)
+
+    def add(self, path, headers=None, digest=None):
+        """Move the file at path into the store and link it back, return its digest
+
+        A file with the same content already stored is kept and path is linked
+        to it instead. headers are the response headers the file came with,
+        recorded so the same download can later be served from the store.
+        digest skips hashing when the caller already knows it.
+        """
+        with self._lock:
+            index = self._load()
+            name = os.path.basename(path)
+
+            known = index["files"].get(name)
+            if digest is None and known and self.has(known) and os.path.samefile(path, self.object_path(known)):
+                # Already linked, e.g. a download that turned out not to be modified
+                digest = known
+            digest = digest or file_sha256(path)
+
+            target = self.object_path(digest)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # Link rather than move, so path stays playable throughout
+                temp_path = target + ".tmp"
+                try:
+                    if os.path.islink(path):
+                        raise OSError("Symlinks are copied")
+                    os.link(path, temp_path)
+                except OSError:
+                    shutil.copyfile(path, temp_path)
+                os.replace(temp_path, target)
+                index["objects"][digest] = {"size": os.path.getsize(target)}
+            if not (os.path.exists(path) and os.path.samefile(path, target)):
+                self.link(digest, path)
+
+            index["files"][name] = digest
+            key = validator_key(headers or {})
+            if key:
+                index["validators"][key] = digest
+            self._save()
+            return digest
+
+    def checkout(self, digest, path):
+        """Point path at a stored object and record it in the index"""
+        with self._lock:
+            self.link(digest, path)
+            self._load()["files"][os.path.basename(path)] = digest
+            self._save()
+
+    def release(self, path):
+        """Remove a linked file and its index entry, the object stays until collect()"""
+        with self._lock:
+            self._load()["files"].pop(os.path.basename(path), None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._save()
+
+    def collect(self):
+        """Remove the objects no linked file points to, return the number of bytes freed"""
+        with self._lock:
+            index = self._load()
+            for name in list(index["files"]):
+                if not os.path.lexists(os.path.join(self.games_dir, name)):
+                    del index["files"][name]
+            referenced = set(index["files"].values())
+
+            freed = 0
+            for digest in [digest for digest in index["objects"] if digest not in referenced]:
+                try:
+                    freed += os.path.getsize(self.object_path(digest))
+                    os.remove(self.object_path(digest))
+                except OSError:
+                    pass
+                del index["objects"][digest]
+            index["validators"] = {key: digest for key, digest in index["validators"].items() if digest in index["objects"]}
+            self._save()
+            return freed
+
+    def digest_of(self, path):
+        """Return the digest of the object a linked file points to, or None"""
+        with self._lock:
+            return self._load()["files"].get(os.path.basename(path))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_object_store(games_dir):
+    """Get the process-wide object store of a games directory"""
+    with _stores_lock:
+        store = _stores.get(games_dir)
+        if store is None:
+            store = _stores[games_dir] = ObjectStore(games_dir)
+        return store
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import base64
+import binascii
+import hashlib
+import os
+import threading
+from fingerprint import SWF_HEADER_SIZE
+
+# Out-of-order bytes kept in memory for the sequential sinks, beyond this they are read back from disk
+REORDER_LIMIT = 32 * 1024 * 1024
+READ_BACK_SIZE = 1024 * 1024
+
+
+class IntegrityError(IOError):
+    """Raised when a finished transfer fails its length or digest check"""
+
+
+class HashSink:
+    """Sequential sink computing the SHA-256 of a body"""
+
+    def __init__(self):
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+
+    @property
+    def digest(self):
+        return self.hash.digest()
+
+    @property
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+class SwfHeaderSink:
+    """Sequential sink keeping the first bytes of a body, where an SWF carries its version"""
+
+    def __init__(self):
+        self.header = b""
+
+    def write(self, data):
+        if len(self.header) < SWF_HEADER_SIZE:
+            self.header += data[:SWF_HEADER_SIZE - len(self.header)]
+
+
+class SequentialTee:
+    """Feeds the bytes written to a file, in file order, to sequential sinks
+
+    Transfer threads call write(offset, data) after writing data to the file
+    at offset. Data at the current position goes straight to the sinks. Data
+    ahead of it waits in a reorder buffer of up to limit bytes, so parallel
+    segments are hashed in the same pass. Data that does not fit, and bytes
+    resumed from an earlier attempt, are read back from the file by finish().
+    """
+
+    def __init__(self, sinks, file_path, limit=REORDER_LIMIT):
+        self.sinks = sinks
+        self.file_path = file_path
+        self.limit = limit
+        self.position = 0
+        self.read_back = 0
+        self._pending = {}  # {offset: data}
+        self._buffered = 0
+        self._lock = threading.Lock()
+
+    def write(self, offset, data):
+        with self._lock:
+            if offset == self.position:
+                self._feed(data)
+                # Chunks that were waiting for this one
+                while self.position in self._pending:
+                    data = self._pending.pop(self.position)
+                    self._buffered -= len(data)
+                    self._feed(data)
+            elif offset > self.position and self._buffered + len(data) <= self.limit:
+                self._pending[offset] = data
+                self._buffered += len(data)
+
+    def _feed(self, data):
+        for sink in self.sinks:
+            sink.write(data)
+        self.position += len(data)
+
+    def finish(self, size):
+        """Feed the sinks up to size, reading the bytes they have not seen back from the file"""
+        with self._lock:
+            if self.position >= size:
+                return
+            with open(self.file_path, "rb") as f:
+                while self.position < size:
+                    data = self._pending.pop(self.position, None)
+                    if data is not None:
+                        self._buffered -= len(data)
+                    else:
+                        following = [offset for offset in self._pending if offset > self.position]
+                        end = min(following + [size, self.position + READ_BACK_SIZE])
+                        f.seek(self.position)
+                        data = f.read(end - self.position)
+                        if not data:
+                            raise IntegrityError(f"File ends at {self.position} of {size} bytes")
+                        self.read_back += len(data)
+                    self._feed(data)
+
+
+def parse_digests(headers):
+    """Return the SHA-256 digests announced by Digest or Repr-Digest headers, as bytes"""
+    digests = []
+    for name in ("repr-digest", "digest"):
+        for item in headers.get(name, "").split(","):
+            algorithm, _, value = item.strip().partition("=")
+            if algorithm.strip().lower() != "sha-256" or not value:
+                continue
+            # Repr-Digest wraps the value in colons (RFC 9530), Digest does not (RFC 3230)
+            value = value.strip().strip(":")
+            try:
+                digests.append(base64.b64decode(value, validate=True))
+            except (binascii.Error, ValueError):
+                print(f"Ignoring malformed {name} header: {item.strip()}")
+    return digests
+
+
+class Verifier:
+    """Single-pass checks of a download written to part_path
+
+    The hash and SWF header sinks see every byte once, as it is written, so
+    the finished file is never read again unless the reorder buffer overflowed
+    or part of it was resumed from an earlier attempt.
+    """
+
+    def __init__(self, part_path):
+        self.hash = HashSink()
+        self.swf = SwfHeaderSink()
+        self.tee = SequentialTee([self.hash, self.swf], part_path)
+
+    def write(self, offset, data):
+        self.tee.write(offset, data)
+
+    def verify(self, size, expected_size=None, headers=None):
+        """Check the byte count and any announced SHA-256, raising IntegrityError
+
+        Returns the hex SHA-256 of the file.
+        """
+        if expected_size and size != expected_size:
+            raise IntegrityError(f"Received {size} of {expected_size} bytes")
+        self.tee.finish(size)
+        for expected in parse_digests(headers or {}):
+            if expected != self.hash.digest:
+                raise IntegrityError(f"SHA-256 mismatch: expected {expected.hex()}, got {self.hash.hexdigest}")
+        return self.hash.hexdigest
+
+
+def commit(part_path, file_path):
+    """Make a finished file durable and move it into place atomically"""
+    with open(part_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(part_path, file_path)
+    if os.name == "posix":
+        # Persist the rename itself
+        directory = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import math
+import threading
+import time
+
+
+class _ItemProgress:
+    """Counters for one transfer, written by transfer threads and read by the UI tick"""
+
+    def __init__(self):
+        self.downloaded = 0
+        self.total = 0
+        self.rate = 0.0
+        self.last_downloaded = 0
+        self.last_time = time.monotonic()
+        self.subscribers = []
+
+
+class ProgressBus:
+    """Coalesces transfer progress and delivers it to the UI on a fixed frame tick
+
+    Transfer threads only store their byte counts (see reporter). The Tk thread
+    drains the counters every interval_ms, computes EWMA throughput and ETA and
+    calls subscribers with (progress, downloaded, total, rate, eta).
+    """
+
+    def __init__(self, interval_ms=66, time_constant=2.0):
+        self.interval_ms = interval_ms
+        # Smoothing window of the throughput average, in seconds
+        self.time_constant = time_constant
+        self._items = {}
+        self._lock = threading.Lock()
+        self._widget = None
+
+    def attach(self, widget):
+        """Start draining on the Tk event loop of widget, if not already running"""
+        if self._widget is not None:
+            try:
+                if self._widget.winfo_exists():
+                    return
+            except Exception:
+                pass
+        self._widget = widget
+        widget.after(self.interval_ms, self._tick)
+
+    def subscribe(self, item, callback):
+        """Call callback(progress, downloaded, total, rate, eta) on every tick while item is active"""
+        with self._lock:
+            self._items.setdefault(item, _ItemProgress()).subscribers.append(callback)
+
+    def unsubscribe(self, item, callback):
+        """Remove one subscriber, and stop tracking the item once it has none left"""
+        with self._lock:
+            state = self._items.get(item)
+            if state is None:
+                return
+            if callback in state.subscribers:
+                state.subscribers.remove(callback)
+            if not state.subscribers:
+                del self._items[item]
+
+    def reporter(self, item):
+        """Create a cheap progress_callback(downloaded, total) for transfer threads"""
+        items = self._items
+
+        def report(downloaded, total):
+            # Plain attribute stores, the tick reads whatever is newest
+            state = items.get(item)
+            if state is not None:
+                state.downloaded = downloaded
+                state.total = total
+
+        return report
+
+    def _values(self, state):
+        downloaded, total = state.downloaded, state.total
+        progress = min(100, int((downloaded / total) * 100)) if total > 0 else 0
+        eta = (total - downloaded) / state.rate if total > 0 and state.rate > 0 else None
+        return progress, downloaded, total, state.rate, eta
+
+    def _tick(self):
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._items.values())
+
+        for state in items:
+            elapsed = now - state.last_time
+            if elapsed > 0:
+                instant = max(0, state.downloaded - state.last_downloaded) / elapsed
+                if state.rate == 0:
+                    # Seed the average with the first sample instead of ramping up from zero
+                    state.rate = instant
+                else:
+                    weight = 1 - math.exp(-elapsed / self.time_constant)
+                    state.rate += weight * (instant - state.rate)
+            state.last_downloaded = state.downloaded
+            state.last_time = now
+
+            if state.total <= 0:
+                continue
+            values = self._values(state)
+            for callback in list(state.subscribers):
+                try:
+                    callback(*values)
+                except Exception as e:
+                    print(f"Error delivering progress: {str(e)}")
+
+        try:
+            self._widget.after(self.interval_ms, self._tick)
+        except Exception:
+            # The widget was destroyed, attach() will restart the tick
+            self._widget = None
+
+
+def format_transfer(downloaded, total, rate=None, eta=None):
+    """Format sizes, throughput and ETA as "(1.2/3.4 MB, 2.1 MB/s, 3s left)" """
+    parts = [f"{downloaded / (1024 * 1024):.1f}/{total / (1024 * 1024):.1f} MB"]
+    if rate:
+        parts.append(f"{rate / (1024 * 1024):.1f} MB/s")
+    if eta is not None:
+        minutes, seconds = divmod(int(eta), 60)
+        parts.append(f"{minutes}m {seconds}s left" if minutes else f"{seconds}s left")
+    return f"({', '.join(parts)})"
@@ -2,6 +2,7 @@
 import os
 import sys
 import platform
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk
 import webbrowser
@@ -13,6 +14,10 @@ from download_manager import DownloadManager
 from flash_manager import FlashManager
 from game_manager import GameManager
 from updater import UpdateManager
+from connectivity import get_connectivity
+from retry import get_circuit_breaker
+from bandwidth import get_bandwidth
+from installs import GameInstalls
 
 class PTDLauncher:
     def __init__(self, root):
@@ -25,6 +30,14 @@ class PTDLauncher:
         self.config_manager = ConfigManager()
         self.config_manager.load_config()
         
+        # Apply the download limits from settings.json
+        get_bandwidth().configure_from_settings(self.config_manager.settings)
+        
+        # Probe the game hosts in the background, network work waits for the answer
+        self.connectivity = get_connectivity(self.config_manager.config)
+        self.connectivity.add_listener(lambda online: self.root.after(0, self._on_connectivity_change, online))
+        self.connectivity.start()
+        
         self.sound_manager = SoundManager(self.config_manager)
         
         # Initialize download manager
@@ -70,9 +83,28 @@ class PTDLauncher:
         # Create UI
         self.create_ui()
         
+        # Drain transfer progress on the Tk event loop
+        self.download_manager.progress_bus.attach(self.root)
+        
         # Check Flash and games on startup
         self.check_flash_and_games()
     
+    def _on_connectivity_change(self, online):
+        """Switch between online and offline mode, called on the Tk thread"""
+        if not online:
+            self.update_status("Offline: installed games can still be played")
+            return
+        
+        # Hosts failed while the network was down, not on their own
+        get_circuit_breaker().reset()
+        
+        # Open connections to the game hosts now so the first download skips the handshake
+        self.download_manager.downloader.prewarm(
+            url for game in self.config_manager.config["game_urls"] for url in self.config_manager.get_game_urls(game))
+        
+        if self.status_var.get().startswith("Offline"):
+            self.update_status("Back online")
+    
     def update_status(self, message):
         """Update status message"""
         self.status_var.set(message)
@@ -317,7 +349,7 @@ class PTDLauncher:
         
         settings_window = tk.Toplevel(self.root)
         settings_window.title("Settings")
-        settings_window.geometry("400x300")
+        settings_window.geometry("400x450")
         settings_window.resizable(False, False)
         
         # Center the window on the parent window
@@ -344,6 +376,18 @@ class PTDLauncher:
         # Add Flash Player download button
         download_btn = self._create_flash_download_button(main_frame)
         
+        # Add separator
+        ttk.Separator(main_frame, orient='horizontal').pack(fill=tk.X, pady=10)
+        
+        # Add download speed limits
+        limit_vars = self._create_bandwidth_settings(main_frame)
+        
+        # Add separator
+        ttk.Separator(main_frame, orient='horizontal').pack(fill=tk.X, pady=10)
+        
+        # Add installed game versions
+        self._create_version_settings(main_frame)
+        
         # Update button state initially
         if self.flash_manager.is_download_in_progress():
             download_btn.config(state=tk.DISABLED)
@@ -352,7 +396,7 @@ class PTDLauncher:
         self._schedule_button_update(settings_window, download_btn)
         
         # Add Save and Cancel buttons
-        self._create_settings_action_buttons(settings_window, sound_var, path_var)
+        self._create_settings_action_buttons(settings_window, sound_var, path_var, limit_vars)
     
     def _create_sound_settings(self, parent_frame):
         """Create the sound settings section"""
@@ -391,6 +435,95 @@ class PTDLauncher:
         
         return path_var
     
+    def _create_bandwidth_settings(self, parent_frame):
+        """Create the download speed limit section, returns the (total, per download) variables"""
+        limits_frame = tk.Frame(parent_frame, bg="#F8F8F8", pady=5)
+        limits_frame.pack(fill=tk.X)
+        
+        tk.Label(limits_frame, text="Speed Limit (KB/s, 0 = none):", font=("Arial", 11),
+                 bg="#F8F8F8").grid(row=0, column=0, columnspan=4, sticky=tk.W)
+        
+        settings = self.config_manager.settings
+        global_var = tk.StringVar(value=str(settings.get("bandwidth_limit_kbps", 0)))
+        transfer_var = tk.StringVar(value=str(settings.get("transfer_limit_kbps", 0)))
+        
+        tk.Label(limits_frame, text="Total:", font=("Arial", 10), bg="#F8F8F8").grid(row=1, column=0, sticky=tk.W)
+        tk.Entry(limits_frame, textvariable=global_var, width=8, font=("Arial", 10)).grid(row=1, column=1, padx=5)
+        tk.Label(limits_frame, text="Per download:", font=("Arial", 10), bg="#F8F8F8").grid(row=1, column=2, sticky=tk.W)
+        tk.Entry(limits_frame, textvariable=transfer_var, width=8, font=("Arial", 10)).grid(row=1, column=3, padx=5)
+        
+        return global_var, transfer_var
+    
+    def _create_version_settings(self, parent_frame):
+        """Create the game version section, switching versions applies immediately"""
+        versions_frame = tk.Frame(parent_frame, bg="#F8F8F8", pady=5)
+        versions_frame.pack(fill=tk.X)
+        
+        tk.Label(versions_frame, text="Game Version:", font=("Arial", 11),
+                 bg="#F8F8F8").grid(row=0, column=0, columnspan=4, sticky=tk.W)
+        
+        installs = GameInstalls(self.config_manager)
+        games = [game for game in self.config_manager.version["games"] if installs.versions(game)]
+        if not games:
+            tk.Label(versions_frame, text="No games downloaded yet", font=("Arial", 10),
+                     bg="#F8F8F8").grid(row=1, column=0, sticky=tk.W)
+            return
+        
+        game_var = tk.StringVar(value=games[0])
+        version_var = tk.StringVar()
+        tk.OptionMenu(versions_frame, game_var, *games).grid(row=1, column=0, sticky=tk.W)
+        version_menu = tk.OptionMenu(versions_frame, version_var, "")
+        version_menu.config(width=14)
+        version_menu.grid(row=1, column=1, padx=5)
+        
+        def show_versions(*args):
+            # List the versions of the selected game, newest first, with the active one selected
+            menu = version_menu["menu"]
+            menu.delete(0, tk.END)
+            for name in installs.versions(game_var.get()):
+                menu.add_command(label=name, command=lambda value=name: version_var.set(value))
+            version_var.set(installs.active_version(game_var.get()) or "")
+        
+        game_var.trace_add("write", show_versions)
+        show_versions()
+        
+        tk.Button(versions_frame, text="Use",
+                  command=lambda: self._activate_game_version(installs, game_var.get(), version_var.get()),
+                  bg="#4A6EA9", fg="white", font=("Arial", 10)).grid(row=1, column=2)
+        tk.Button(versions_frame, text="Roll back",
+                  command=lambda: self._rollback_game_version(installs, game_var.get(), version_var),
+                  bg="#6B7A8F", fg="white", font=("Arial", 10)).grid(row=1, column=3, padx=5)
+    
+    def _check_game_not_downloading(self, game):
+        """Show a dialog and return False if game is being downloaded"""
+        if self.download_manager.is_download_in_progress(game):
+            self.game_manager.show_dialog(self.root, "Busy", f"{game} is being downloaded, try again when it is done.",
+                                          dialog_type="info")
+            return False
+        return True
+    
+    def _activate_game_version(self, installs, game, name):
+        """Switch a game to one of its installed versions"""
+        if not name or name == installs.active_version(game):
+            return
+        if not self._check_game_not_downloading(game):
+            return
+        if installs.activate(game, name):
+            self.update_status(f"{game} switched to v{name}")
+        else:
+            self.update_status(f"v{name} of {game} is no longer installed")
+    
+    def _rollback_game_version(self, installs, game, version_var):
+        """Switch a game back to the version it used before the active one"""
+        if not self._check_game_not_downloading(game):
+            return
+        name = installs.rollback(game)
+        if name:
+            version_var.set(name)
+            self.update_status(f"{game} rolled back to v{name}")
+        else:
+            self.update_status(f"No earlier version of {game} is installed")
+    
     def _create_flash_download_button(self, parent_frame):
         """Create the Flash Player download button"""
         download_frame = tk.Frame(parent_frame, bg="#F8F8F8", pady=10)
@@ -403,7 +536,7 @@ class PTDLauncher:
         
         return download_btn
     
-    def _create_settings_action_buttons(self, settings_window, sound_var, path_var):
+    def _create_settings_action_buttons(self, settings_window, sound_var, path_var, limit_vars):
         """Create the Save and Cancel buttons for settings"""
         btn_frame = tk.Frame(settings_window, bg="#F8F8F8")
         btn_frame.pack(fill=tk.X, padx=15, pady=15)
@@ -414,7 +547,7 @@ class PTDLauncher:
         cancel_btn.pack(side=tk.RIGHT, padx=5)
         
         save_btn = tk.Button(btn_frame, text="Save", 
-                           command=lambda: self._save_settings(sound_var, path_var, settings_window),
+                           command=lambda: self._save_settings(sound_var, path_var, settings_window, limit_vars),
                            bg="#4A6EA9", fg="white", font=("Arial", 11), width=10)
         save_btn.pack(side=tk.RIGHT, padx=5)
     
@@ -495,16 +628,32 @@ class PTDLauncher:
         if window.winfo_exists():
             window.after(interval, lambda: self._schedule_button_update(window, button, interval))
     
-    def _save_settings(self, sound_var, path_var, window):
+    def _save_settings(self, sound_var, path_var, window, limit_vars):
         """Save settings"""
+        # Validate the speed limits before changing anything
+        try:
+            global_limit, transfer_limit = (int(var.get().strip() or 0) for var in limit_vars)
+            if global_limit < 0 or transfer_limit < 0:
+                raise ValueError
+        except ValueError:
+            self.flash_manager.show_dialog(window, "Error",
+                                         "Speed limits must be whole numbers of KB/s, 0 for no limit",
+                                         dialog_type="error")
+            return
+        
         # Update sound manager
         self.sound_manager.set_enabled(sound_var.get())
         
         # Create settings object
         settings = {
-            "sound_enabled": sound_var.get()
+            "sound_enabled": sound_var.get(),
+            "bandwidth_limit_kbps": global_limit,
+            "transfer_limit_kbps": transfer_limit
         }
         
+        # Running downloads pick up the new limits right away
+        get_bandwidth().configure_from_settings(settings)
+        
         # Save Flash Player path if changed
         if path_var.get() and path_var.get() != self.config_manager.get_flash_player_path():
             # Validate the path exists
@@ -555,8 +704,9 @@ class PTDLauncher:
                 self.config_manager.config["flash_player"]["linux"]["filename"] = filename
             
             # Save the version information
-            self.config_manager.version["flash_player"] = "custom"
-            self.config_manager.save_version_info()
+            with self.config_manager.lock:
+                self.config_manager.version["flash_player"] = "custom"
+                self.config_manager.save_version_info()
             
             # Add Flash Player path to settings
             settings["flash_player_path"] = path_var.get()
@@ -579,4 +729,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # The transfer worker is started with spawn, which frozen builds need this for
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+import urllib3
+from transfer import CancelToken, IncompleteDownload
+from pipeline import IntegrityError
+from connectivity import Offline, get_connectivity
+
+
+class CircuitOpen(Exception):
+    """Raised instead of contacting a host whose circuit breaker is open"""
+
+
+def is_transient(error):
+    """Check whether an error is worth retrying: timeouts, dropped connections, corrupt bodies and 5xx/408/429"""
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        return status >= 500 or status in (408, 429)
+    # urllib3 errors reach us directly when a raw response stream is read
+    return isinstance(error, (requests.RequestException, urllib3.exceptions.HTTPError, IncompleteDownload,
+                              IntegrityError))
+
+
+class CircuitBreaker:
+    """Fails fast for hosts that failed repeatedly
+
+    After threshold consecutive transient failures a host's circuit opens and
+    every request to it raises CircuitOpen for cooldown seconds. After that
+    requests go through again, and one more failure reopens the circuit.
+    """
+
+    def __init__(self, threshold=3, cooldown=30.0):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self._hosts = {}  # {host: {failures, opened}}
+        self._lock = threading.Lock()
+
+    def before(self, host):
+        """Raise CircuitOpen if host should not be contacted right now"""
+        with self._lock:
+            state = self._hosts.get(host)
+            if not state or state["opened"] is None:
+                return
+            remaining = state["opened"] + self.cooldown - time.monotonic()
+        if remaining > 0:
+            raise CircuitOpen(f"{host} is unavailable, retrying in {int(remaining) + 1}s")
+
+    def record_success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def reset(self):
+        """Close every circuit, e.g. once the network is back"""
+        with self._lock:
+            self._hosts.clear()
+
+    def record_failure(self, host):
+        with self._lock:
+            state = self._hosts.setdefault(host, {"failures": 0, "opened": None})
+            state["failures"] += 1
+            if state["failures"] >= self.threshold:
+                state["opened"] = time.monotonic()
+
+
+class RetryPolicy:
+    """Retries transient failures with jittered exponential backoff within a deadline
+
+    The deadline is a budget for the whole operation: no attempt starts once
+    it is spent, and the remaining seconds are passed to the operation so it
+    can cap its own timeouts.
+    """
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=8.0, deadline=None, breaker=None):
+        self.attempts = max(1, int(attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker = breaker or get_circuit_breaker()
+
+    @classmethod
+    def from_config(cls, config, **overrides):
+        """Create a policy from the "retry" section of config.json, sharing the circuit breaker"""
+        options = dict((config or {}).get("retry", {}))
+        options.update(overrides)
+        return cls(
+            attempts=options.get("attempts", 3),
+            base_delay=options.get("base_delay", 0.5),
+            max_delay=options.get("max_delay", 8.0),
+            deadline=options.get("deadline"),
+            breaker=get_circuit_breaker(config)
+        )
+
+    def backoff(self, attempt):
+        """Delay before retry number attempt + 1, between half and all of the exponential step"""
+        step = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return step / 2 + random.uniform(0, step / 2)
+
+    def call(self, fn, url=None, token=None, deadline=None):
+        """Run fn(remaining) until it succeeds, retrying transient errors
+
+        Args:
+            fn: Callable taking the seconds left in the budget (None without a deadline)
+            url: URL the operation talks to, for the host's circuit breaker
+            token: Optional CancelToken, cancelling also interrupts the backoff sleep
+            deadline: Budget in seconds, defaults to the policy's deadline
+
+        Raises:
+            Offline while the launcher is offline, CircuitOpen if the host is
+            failing, otherwise the last error of fn
+        """
+        token = token or CancelToken()
+        deadline = self.deadline if deadline is None else deadline
+        end = time.monotonic() + deadline if deadline is not None else None
+        host = urlsplit(url).netloc if url else ""
+
+        connectivity = get_connectivity()
+        for attempt in range(self.attempts):
+            token.raise_if_triggered()
+            if connectivity.offline:
+                raise Offline("No network connection")
+            if host:
+                self.breaker.before(host)
+
+            remaining = end - time.monotonic() if end is not None else None
+            try:
+                result = fn(remaining)
+            except Exception as e:
+                if token.triggered or not is_transient(e):
+                    raise
+                if host:
+                    self.breaker.record_failure(host)
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                    # Let the monitor find out whether the whole network is gone
+                    connectivity.report_failure()
+
+                delay = self.backoff(attempt)
+                if attempt == self.attempts - 1 or (end is not None and time.monotonic() + delay >= end):
+                    raise
+                print(f"Retrying {url or 'request'} in {delay:.1f}s after: {str(e)}")
+                if token.wait(delay):
+                    token.raise_if_triggered()
+                continue
+
+            if host:
+                self.breaker.record_success(host)
+            return result
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker(config=None):
+    """Get the process-wide circuit breaker, creating it from config on first use"""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            options = (config or {}).get("retry", {})
+            _breaker = CircuitBreaker(
+                threshold=options.get("failure_threshold", 3),
+                cooldown=options.get("cooldown", 30.0)
+            )
+        return _breaker
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+import itertools
+import threading
+from urllib.parse import urlsplit
+from transfer import CancelToken, TransferCancelled, TransferPaused
+from game_activity import lower_thread_priority
+
+# Lower values run first
+PRIORITY_PLAY = 0         # The user clicked Play and is waiting for the file
+PRIORITY_USER = 10        # Other user-initiated downloads
+PRIORITY_BACKGROUND = 20  # Update work that nobody is waiting on
+
+
+class DownloadJob:
+    """A transfer submitted to the DownloadScheduler"""
+
+    def __init__(self, key, fn, priority, host, seq):
+        self.key = key
+        self.fn = fn
+        self.priority = priority
+        self.host = host
+        self.seq = seq
+        self.state = "queued"  # queued, running, done, failed, paused, cancelled
+        self.result = None
+        self.error = None
+        self.token = CancelToken(background=self.is_background)
+        # Number of callers waiting on the job, see DownloadScheduler.cancel
+        self.followers = 0
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_background(self):
+        return self.priority >= PRIORITY_BACKGROUND
+
+    def done(self):
+        """Check whether the job has finished, successfully or not"""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the job and return its result, raising its error if it failed"""
+        self._done.wait(timeout)
+        if self.error:
+            raise self.error
+        return self.result
+
+    def add_done_callback(self, callback):
+        """Call callback(job) from the worker thread once the job finishes, or now if it has"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            if isinstance(error, TransferPaused):
+                self.state = "paused"
+            elif isinstance(error, TransferCancelled):
+                self.state = "cancelled"
+            else:
+                self.state = "failed" if error else "done"
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Error in download job callback for {self.key}: {str(e)}")
+
+
+class DownloadScheduler:
+    """Runs every transfer under global and per-host concurrency limits
+
+    Queued jobs start in priority order. Foreground and background jobs have
+    separate global and per-host budgets, so a Play download never waits
+    behind update work and a full update can fetch every game at once.
+    Submissions are single-flight per key: asking for a key that is
+    already queued or running returns the existing job instead of a new one.
+    While background jobs are held, queued ones wait and running ones go on.
+    """
+
+    def __init__(self, max_concurrent=4, max_per_host=3, max_background=6, max_background_per_host=6):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_per_host = max(1, int(max_per_host))
+        self.max_background = max(1, int(max_background))
+        self.max_background_per_host = max(1, int(max_background_per_host))
+        self._queue = []
+        self._running = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._background_held = False
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a scheduler from the "downloads" section of config.json"""
+        options = (config or {}).get("downloads", {})
+        return cls(
+            max_concurrent=options.get("max_concurrent", 4),
+            max_per_host=options.get("max_per_host", 3),
+            max_background=options.get("max_background", 6),
+            max_background_per_host=options.get("max_background_per_host", 6)
+        )
+
+    def submit(self, key, fn, url=None, priority=PRIORITY_USER):
+        """Queue fn(token) to run as a transfer for key and return its DownloadJob
+
+        fn receives the job's CancelToken and should pass it to every transfer
+        it starts. If a job for key is already in flight, fn is dropped and that
+        job is returned, raised to priority if it was queued with a lower one.
+        Every submit counts as one follower of the job.
+        """
+        with self._lock:
+            for job in self._queue + self._running:
+                if job.key == key:
+                    job.priority = min(job.priority, priority)
+                    job.token.background = job.is_background
+                    break
+            else:
+                host = urlsplit(url).netloc if url else ""
+                job = DownloadJob(key, fn, priority, host, next(self._seq))
+                self._queue.append(job)
+            job.followers += 1
+        self._dispatch()
+        return job
+
+    def cancel(self, job, pause=False):
+        """Stop following job, and cancel or pause it once nobody else follows it
+
+        A queued job is dropped from the queue, a running one is stopped through
+        its token. Pausing keeps the partial file so the next submit for the
+        key resumes it. Returns True if the job was stopped.
+        """
+        with self._lock:
+            job.followers = max(0, job.followers - 1)
+            if job.followers > 0 or job.done():
+                return False
+            queued = job in self._queue
+            if queued:
+                self._queue.remove(job)
+
+        if pause:
+            job.token.pause()
+        else:
+            job.token.cancel()
+
+        if queued:
+            try:
+                job.token.raise_if_triggered()
+            except TransferCancelled as e:
+                job._finish(error=e)
+        return True
+
+    def hold_background(self, held):
+        """Keep queued background jobs from starting until called with held=False"""
+        with self._lock:
+            self._background_held = held
+        if not held:
+            self._dispatch()
+
+    def get(self, key):
+        """Get the queued or running job for key, or None"""
+        with self._lock:
+            for job in self._queue + self._running:
+                if job.key == key:
+                    return job
+        return None
+
+    def is_active(self, key=None, background=None):
+        """Check whether a job (for key, or of the given kind) is queued or running"""
+        with self._lock:
+            for job in self._queue + self._running:
+                if key is not None and job.key != key:
+                    continue
+                if background is not None and job.is_background != background:
+                    continue
+                return True
+        return False
+
+    def _can_start(self, job):
+        if job.is_background and self._background_held:
+            return False
+
+        # Each kind of job only counts against its own budget
+        if job.is_background:
+            limit, per_host_limit = self.max_background, self.max_background_per_host
+        else:
+            limit, per_host_limit = self.max_concurrent, self.max_per_host
+        same_kind = [running for running in self._running if running.is_background == job.is_background]
+        if len(same_kind) >= limit:
+            return False
+
+        if job.host:
+            on_host = sum(1 for running in same_kind if running.host == job.host)
+            if on_host >= per_host_limit:
+                return False
+        return True
+
+    def _dispatch(self):
+        """Start every queued job that fits within the limits"""
+        to_start = []
+        with self._lock:
+            self._queue.sort(key=lambda queued: (queued.priority, queued.seq))
+            for job in list(self._queue):
+                if self._can_start(job):
+                    self._queue.remove(job)
+                    self._running.append(job)
+                    job.state = "running"
+                    to_start.append(job)
+
+        for job in to_start:
+            thread = threading.Thread(target=self._run, args=(job,))
+            thread.daemon = True
+            thread.start()
+
+    def _run(self, job):
+        result, error = None, None
+        try:
+            if job.is_background:
+                # Segment threads started by the job inherit the lower priority
+                lower_thread_priority()
+            job.token.raise_if_triggered()
+            result = job.fn(job.token)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                self._running.remove(job)
+            job._finish(result, error)
+            self._dispatch()
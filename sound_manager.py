@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
-import pygame
 import os
 from config import resource_path
 
 class SoundManager:
     def __init__(self, config_manager=None):
+        # Imported here, the transfer worker re-imports the launcher module without needing sound
+        import pygame
+        
         # Initialize pygame mixer for sound effects
         pygame.mixer.init()
         
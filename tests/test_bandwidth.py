@@ -0,0 +1,80 @@
+import time
+
+from bandwidth import BandwidthLimiter, TokenBucket
+
+
+class FakeToken:
+    def __init__(self, background=False):
+        self.background = background
+        self.waits = []
+
+    def wait(self, delay):
+        self.waits.append(delay)
+
+
+def test_unlimited_bucket_never_sleeps():
+    bucket = TokenBucket(0)
+    token = FakeToken()
+    bucket.consume(10 ** 9, token)
+    assert token.waits == []
+
+
+def test_bucket_passes_burst_then_sleeps_for_debt():
+    bucket = TokenBucket(1000)
+    token = FakeToken()
+    bucket.consume(1000, token)
+    assert token.waits == []
+    bucket.consume(500, token)
+    assert len(token.waits) == 1
+    assert 0.4 < token.waits[0] <= 0.5
+
+
+def test_bucket_paces_rate():
+    bucket = TokenBucket(100 * 1024)
+    started = time.monotonic()
+    for _ in range(20):
+        bucket.consume(10 * 1024)
+    # 200 KB at 100 KB/s with a one second burst
+    assert 0.8 < time.monotonic() - started < 1.5
+
+
+def test_running_transfer_follows_transfer_cap_changes():
+    bandwidth = BandwidthLimiter()
+    limiter = bandwidth.transfer()
+    limiter.consume(1)
+    assert limiter.transfer_bucket is None
+
+    bandwidth.configure(0, 1024)
+    limiter.consume(1)
+    assert limiter.transfer_bucket.rate == 1024
+
+    bandwidth.configure(0, 4096)
+    limiter.consume(1)
+    assert limiter.transfer_bucket.rate == 4096
+
+    bandwidth.configure(0, 0)
+    limiter.consume(10 ** 9)
+    assert limiter.transfer_bucket is None
+
+
+def test_global_cap_change_keeps_bucket_shared():
+    bandwidth = BandwidthLimiter(global_rate=1024)
+    bucket = bandwidth.global_bucket
+    bandwidth.configure(2048, 0)
+    assert bandwidth.global_bucket is bucket
+    assert bucket.rate == 2048
+
+
+def test_only_background_transfers_pay_background_bucket():
+    bandwidth = BandwidthLimiter()
+    bandwidth.set_background_rate(1000)
+    limiter = bandwidth.transfer()
+
+    foreground = FakeToken()
+    limiter.consume(5000, foreground)
+    assert foreground.waits == []
+
+    background = FakeToken(background=True)
+    limiter.consume(1000, background)
+    limiter.consume(1000, background)
+    assert background.waits
@@ -0,0 +1,101 @@
+import hashlib
+import random
+import zlib
+
+import pytest
+
+from delta import MAGIC, HEADER, DeltaError, apply_delta, delta_path, make_delta, publish, read_header
+from transfer import SegmentedDownloader
+
+
+def _versions(size=200000, seed=1):
+    rng = random.Random(seed)
+    base = bytes(rng.getrandbits(8) for _ in range(size))
+    target = bytearray(base)
+    target[1000:1010] = b"x" * 10
+    del target[50000:50100]
+    target[120000:120000] = b"inserted" * 20
+    return base, bytes(target)
+
+
+def _apply(base_path, delta):
+    out = bytearray()
+
+    def write(offset, data):
+        assert offset == len(out)
+        out.extend(data)
+
+    size = apply_delta(base_path, delta, write)
+    assert size == len(out)
+    return bytes(out)
+
+
+def test_delta_rebuilds_target(tmp_path):
+    base, target = _versions()
+    base_path = tmp_path / "base.swf"
+    base_path.write_bytes(base)
+
+    delta = make_delta(base, target)
+    assert len(delta) < len(target) // 50
+    assert _apply(str(base_path), delta) == target
+
+    _, base_digest, target_size, target_digest = read_header(delta)
+    assert base_digest == hashlib.sha256(base).hexdigest()
+    assert (target_size, target_digest) == (len(target), hashlib.sha256(target).hexdigest())
+
+
+def test_delta_between_unrelated_files(tmp_path):
+    base, _ = _versions(seed=1)
+    target, _ = _versions(seed=2)
+    base_path = tmp_path / "base.swf"
+    base_path.write_bytes(base)
+    assert _apply(str(base_path), make_delta(base, target)) == target
+
+
+def test_delta_rejects_other_base(tmp_path):
+    base, target = _versions()
+    other = tmp_path / "other.swf"
+    other.write_bytes(base[:-1] + b"\0")
+    with pytest.raises(DeltaError):
+        _apply(str(other), make_delta(base, target))
+
+
+def test_delta_rejects_corrupt_instructions(tmp_path):
+    base, target = _versions()
+    base_path = tmp_path / "base.swf"
+    base_path.write_bytes(base)
+    delta = make_delta(base, target)
+    prefix = len(MAGIC) + HEADER.size
+
+    with pytest.raises(DeltaError):
+        _apply(str(base_path), delta[:prefix] + b"not zlib")
+    with pytest.raises(DeltaError):
+        _apply(str(base_path), delta[:prefix] + zlib.compress(b"\x07"))
+    with pytest.raises(DeltaError):
+        read_header(b"PTDD")
+
+
+def test_publish_names_delta_by_base_digest(tmp_path):
+    base, target = _versions()
+    path = tmp_path / "PTD1.swf"
+    path.write_bytes(target)
+    base_path = tmp_path / "old.swf"
+    base_path.write_bytes(base)
+
+    output = publish(str(path), str(base_path))
+    assert output == delta_path(str(path), hashlib.sha256(base).hexdigest())
+    with open(output, "rb") as f:
+        assert _apply(str(base_path), f.read()) == target
+
+    base_path.write_bytes(target)
+    assert publish(str(path), str(base_path)) is None
+
+
+def test_only_listed_mirrors_are_asked_for_deltas():
+    assert not SegmentedDownloader(transport=object())._serves_deltas("https://ptd.onl/ptd1-latest.swf")
+
+    downloader = SegmentedDownloader(transport=object(), delta_hosts=["Mirror.example", "127.0.0.1:8000"])
+    assert downloader._serves_deltas("https://mirror.example/ptd1.swf")
+    assert downloader._serves_deltas("http://127.0.0.1:8000/ptd1.swf")
+    assert not downloader._serves_deltas("http://127.0.0.1:8001/ptd1.swf")
+    assert not downloader._serves_deltas("https://ptd.onl/ptd1-latest.swf")
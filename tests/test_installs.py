@@ -0,0 +1,111 @@
+import hashlib
+import os
+import time
+
+from config import ConfigManager
+from installs import GameInstalls
+from object_store import get_object_store
+
+
+def _config(games_dir, keep=3, max_bytes=1024 * 1024):
+    config_manager = ConfigManager()
+    config_manager.config = {"versions": {"keep": keep, "max_bytes": max_bytes}}
+    config_manager.version = {"games": {}}
+    config_manager.games_dir = str(games_dir)
+    return config_manager
+
+
+def _install(installs, game, version, data):
+    """Do what a download does: replace {game}.swf, store it and record the version"""
+    path = installs.game_path(game)
+    with open(path + ".part", "wb") as f:
+        f.write(data)
+    os.replace(path + ".part", path)
+    digest = get_object_store(installs.config_manager.games_dir).add(path)
+    installs.config_manager.set_game_version(game, version)
+    name = installs.record(game, version, digest)
+    # installed_at and last_used order the versions
+    time.sleep(0.01)
+    return name
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_rollback_restores_previous_version(tmp_path):
+    config_manager = _config(tmp_path)
+    installs = GameInstalls(config_manager)
+    _install(installs, "PTD1", "1.0", b"first build")
+    _install(installs, "PTD1", "2.0", b"second build")
+    assert installs.versions("PTD1") == ["2.0", "1.0"]
+    assert installs.active_version("PTD1") == "2.0"
+
+    assert installs.rollback("PTD1") == "1.0"
+    assert installs.active_version("PTD1") == "1.0"
+    assert _read(installs.game_path("PTD1")) == b"first build"
+    assert config_manager.version["games"]["PTD1"] == "1.0"
+    # The version it was rolled back from is still installed
+    assert _read(installs.version_path("PTD1", "2.0")) == b"second build"
+
+    assert installs.rollback("PTD1") == "2.0"
+    assert _read(installs.game_path("PTD1")) == b"second build"
+
+
+def test_rollback_without_other_version(tmp_path):
+    installs = GameInstalls(_config(tmp_path))
+    _install(installs, "PTD1", "1.0", b"only build")
+    assert installs.rollback("PTD1") is None
+    assert installs.rollback("PTD2") is None
+
+
+def test_same_version_string_for_different_bytes(tmp_path):
+    installs = GameInstalls(_config(tmp_path))
+    first = _install(installs, "PTD1", "1.0", b"build")
+    second = _install(installs, "PTD1", "1.0", b"rebuilt")
+    assert first == "1.0"
+    assert second.startswith("1.0-")
+    assert installs.rollback("PTD1") == "1.0"
+
+
+def test_collect_keeps_count_per_game(tmp_path):
+    installs = GameInstalls(_config(tmp_path, keep=2))
+    for number in range(1, 5):
+        _install(installs, "PTD1", f"{number}.0", f"build {number}".encode())
+
+    assert installs.versions("PTD1") == ["4.0", "3.0"]
+    assert not os.path.exists(installs.version_path("PTD1", "1.0"))
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("PTD1-v")]) == 2
+    # Objects no version links to any more are collected as well
+    store = get_object_store(str(tmp_path))
+    assert not store.has(hashlib.sha256(b"build 1").hexdigest())
+    assert store.has(hashlib.sha256(b"build 3").hexdigest())
+
+
+def test_collect_evicts_least_recently_used_over_max_bytes(tmp_path):
+    installs = GameInstalls(_config(tmp_path, keep=5, max_bytes=150))
+    _install(installs, "PTD1", "1.0", b"a" * 100)
+    _install(installs, "PTD2", "1.0", b"b" * 100)
+    _install(installs, "PTD1", "2.0", b"c" * 100)
+    _install(installs, "PTD2", "2.0", b"d" * 100)
+
+    # Two inactive versions of 100 bytes each do not fit, the older one goes
+    assert installs.versions("PTD1") == ["2.0"]
+    assert installs.versions("PTD2") == ["2.0", "1.0"]
+    assert not os.path.exists(installs.version_path("PTD1", "1.0"))
+    assert not get_object_store(str(tmp_path)).has(hashlib.sha256(b"a" * 100).hexdigest())
+
+
+def test_recently_used_version_survives_collection(tmp_path):
+    installs = GameInstalls(_config(tmp_path, keep=5, max_bytes=150))
+    _install(installs, "PTD1", "1.0", b"a" * 100)
+    _install(installs, "PTD2", "1.0", b"b" * 100)
+    _install(installs, "PTD1", "2.0", b"c" * 100)
+    # Switching to the old PTD1 makes it the most recently used inactive version
+    assert installs.rollback("PTD1") == "1.0"
+    assert installs.activate("PTD1", "2.0")
+    _install(installs, "PTD2", "2.0", b"d" * 100)
+
+    assert installs.versions("PTD1") == ["2.0", "1.0"]
+    assert installs.versions("PTD2") == ["2.0"]
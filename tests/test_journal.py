@@ -0,0 +1,66 @@
+import os
+
+from transfer import DownloadJournal, SegmentedDownloader, merge_ranges, missing_ranges
+
+
+def test_journal_round_trip(tmp_path):
+    journal = DownloadJournal(str(tmp_path / "game.swf.part.json"))
+    assert journal.load() is None
+
+    state = {"url": "http://mirror/game.swf", "etag": '"a"', "size": 10, "completed": [[0, 4]]}
+    journal.save(state)
+    assert journal.load() == state
+    assert not os.path.exists(journal.path + ".tmp")
+
+    journal.remove()
+    assert journal.load() is None
+    journal.remove()
+
+
+def test_unreadable_journal_loads_as_none(tmp_path):
+    path = tmp_path / "game.swf.part.json"
+    path.write_text('{"completed": [')
+    assert DownloadJournal(str(path)).load() is None
+
+
+def test_merge_ranges():
+    assert merge_ranges([[5, 8], [0, 2], [2, 4], [7, 10], [12, 12]]) == [[0, 4], [5, 10]]
+
+
+def test_missing_ranges():
+    assert missing_ranges(10, []) == [[0, 10]]
+    assert missing_ranges(10, [[2, 4], [4, 6], [8, 10]]) == [[0, 2], [6, 8]]
+    assert missing_ranges(10, [[0, 10]]) == []
+
+
+def _info(etag='"a"', size=10):
+    return {"etag": etag, "last_modified": "", "size": size}
+
+
+def test_resume_state_keeps_matching_journal(tmp_path):
+    part_path = str(tmp_path / "game.swf.part")
+    journal = DownloadJournal(part_path + ".json")
+    downloader = SegmentedDownloader(transport=object())
+
+    state = downloader._resume_state(journal, part_path, "http://mirror/game.swf", _info())
+    assert state["completed"] == []
+    assert os.path.getsize(part_path) == 10
+
+    state["completed"] = [[0, 5]]
+    journal.save(state)
+    assert downloader._resume_state(journal, part_path, "http://mirror/game.swf", _info())["completed"] == [[0, 5]]
+
+
+def test_resume_state_starts_over_when_file_changed(tmp_path):
+    part_path = str(tmp_path / "game.swf.part")
+    journal = DownloadJournal(part_path + ".json")
+    downloader = SegmentedDownloader(transport=object())
+
+    state = downloader._resume_state(journal, part_path, "http://mirror/game.swf", _info())
+    state["completed"] = [[0, 5]]
+    journal.save(state)
+
+    state = downloader._resume_state(journal, part_path, "http://mirror/game.swf", _info(etag='"b"', size=12))
+    assert state["completed"] == []
+    assert state["etag"] == '"b"'
+    assert os.path.getsize(part_path) == 12
@@ -0,0 +1,72 @@
+import hashlib
+import os
+
+import pytest
+
+from object_store import ObjectStore, validator_key
+
+
+HEADERS = {"etag": '"v1"', "content-length": "5"}
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_validator_key():
+    assert validator_key(HEADERS) == 'etag:"v1":5'
+    assert validator_key({"etag": 'W/"v1"', "content-length": "5"}) is None
+    assert validator_key({"last-modified": "Mon, 01 Jan 2024 00:00:00 GMT", "content-length": "5"}) is not None
+    assert validator_key({"last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"}) is None
+
+
+def test_add_stores_identical_files_once(tmp_path):
+    store = ObjectStore(str(tmp_path))
+    first = _write(tmp_path / "PTD1.swf", b"hello")
+    second = _write(tmp_path / "PTD1_Hacked.swf", b"hello")
+
+    digest = store.add(first, HEADERS)
+    assert digest == hashlib.sha256(b"hello").hexdigest()
+    assert store.add(second) == digest
+    assert os.path.samefile(first, store.object_path(digest))
+    assert os.path.samefile(second, store.object_path(digest))
+    assert store.digest_of(second) == digest
+
+
+def test_find_by_validators_survives_reload(tmp_path):
+    digest = ObjectStore(str(tmp_path)).add(_write(tmp_path / "PTD1.swf", b"hello"), HEADERS)
+
+    store = ObjectStore(str(tmp_path))
+    assert store.find(HEADERS) == digest
+    assert store.find({"etag": '"v2"', "content-length": "5"}) is None
+
+
+def test_link_replaces_file_and_refuses_missing_objects(tmp_path):
+    store = ObjectStore(str(tmp_path))
+    digest = store.add(_write(tmp_path / "PTD1.swf", b"hello"))
+    path = _write(tmp_path / "PTD2.swf", b"old")
+
+    store.link(digest, path)
+    assert open(path, "rb").read() == b"hello"
+
+    other = _write(tmp_path / "PTD3.swf", b"keep")
+    with pytest.raises(FileNotFoundError):
+        store.link("0" * 64, other)
+    assert open(other, "rb").read() == b"keep"
+
+
+def test_collect_removes_only_unreferenced_objects(tmp_path):
+    store = ObjectStore(str(tmp_path))
+    kept = store.add(_write(tmp_path / "PTD1.swf", b"kept"), HEADERS)
+    dropped = store.add(_write(tmp_path / "PTD2-v1.swf", b"dropped"), {"etag": '"old"', "content-length": "7"})
+
+    assert store.collect() == 0
+    store.release(str(tmp_path / "PTD2-v1.swf"))
+    assert not os.path.exists(tmp_path / "PTD2-v1.swf")
+
+    assert store.collect() == len(b"dropped")
+    assert store.has(kept)
+    assert not store.has(dropped)
+    assert store.find({"etag": '"old"', "content-length": "7"}) is None
+    assert store.find(HEADERS) == kept
@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import requests
+from transport import get_transport
+from bandwidth import get_bandwidth
+from pipeline import Verifier, IntegrityError, commit
+from delta import DELTA_FORMAT, read_header, apply_delta
+
+
+class RangeNotSupported(Exception):
+    """Raised when the server ignores a Range request"""
+
+
+class IncompleteDownload(IOError):
+    """Raised when a transfer ended before all of its bytes arrived"""
+
+
+class TransferCancelled(Exception):
+    """Raised when a transfer is stopped through its CancelToken"""
+
+
+class TransferPaused(TransferCancelled):
+    """Raised when a transfer is paused, its .part file and journal are kept"""
+
+
+class CancelToken:
+    """Cooperative cancellation shared by a job and the transfer loops running it
+
+    Transfer loops check the token between chunks. Cancelling or pausing also
+    closes every response registered with watch(), so a read blocked on the
+    socket returns right away instead of waiting for the next chunk.
+    Background tokens are charged to the background bandwidth bucket.
+    """
+
+    def __init__(self, background=False):
+        self._reason = None  # None, "cancel" or "pause"
+        self._background = background
+        self._parent = None
+        self._responses = []
+        self._children = []
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def background(self):
+        """Whether the transfer is background work, children follow their parent"""
+        return self._background or (self._parent is not None and self._parent.background)
+
+    @background.setter
+    def background(self, value):
+        self._background = value
+
+    @property
+    def triggered(self):
+        return self._reason is not None
+
+    @property
+    def paused(self):
+        return self._reason == "pause"
+
+    def cancel(self):
+        """Stop the transfer and discard its partial file"""
+        self._trigger("cancel")
+
+    def pause(self):
+        """Stop the transfer but keep its partial file so it can resume later"""
+        self._trigger("pause")
+
+    def child(self):
+        """Create a token that can be triggered on its own and is also triggered with this one"""
+        child = CancelToken()
+        child._parent = self
+        with self._lock:
+            if self._reason is None:
+                self._children.append(child)
+                return child
+        child._trigger(self._reason)
+        return child
+
+    def _trigger(self, reason):
+        with self._lock:
+            if self._reason is not None:
+                return
+            self._reason = reason
+            self._event.set()
+            responses, self._responses = self._responses, []
+            children, self._children = self._children, []
+        for response in responses:
+            self._abort(response)
+        for child in children:
+            child._trigger(reason)
+
+    @staticmethod
+    def _abort(response):
+        # Close the socket before the response: closing the stream first lets
+        # the reading thread hit EOF and hand the half-read connection back to
+        # the pool, where the next request would read the rest of this body
+        connection = getattr(getattr(response, "raw", None), "connection", None)
+        try:
+            if connection is not None:
+                connection.close()
+            response.close()
+        except Exception:
+            pass
+
+    def wait(self, timeout):
+        """Sleep for up to timeout seconds, returning True early once the token is triggered"""
+        return self._event.wait(timeout)
+
+    def raise_if_triggered(self):
+        """Raise TransferPaused or TransferCancelled once the token was triggered"""
+        if self._reason == "pause":
+            raise TransferPaused("Download paused")
+        if self._reason == "cancel":
+            raise TransferCancelled("Download cancelled")
+
+    @contextmanager
+    def watch(self, response):
+        """Close response as soon as the token is triggered while inside the block"""
+        with self._lock:
+            closed = self._reason is not None
+            if not closed:
+                self._responses.append(response)
+        if closed:
+            self._abort(response)
+            self.raise_if_triggered()
+        try:
+            yield response
+        finally:
+            with self._lock:
+                if response in self._responses:
+                    self._responses.remove(response)
+
+
+class DownloadJournal:
+    """Sidecar file recording which byte ranges of a .part file are complete"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Load the journal, returning None if it is missing or unreadable"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, state):
+        """Atomically write the journal"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Delete the journal"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or adjacent [start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(total_size, completed):
+    """Return the [start, end) gaps not covered by completed ranges"""
+    gaps = []
+    position = 0
+    for start, end in merge_ranges(completed):
+        if start > position:
+            gaps.append([position, start])
+        position = max(position, end)
+    if position < total_size:
+        gaps.append([position, total_size])
+    return gaps
+
+
+def conditional_headers(validators):
+    """Build If-None-Match/If-Modified-Since headers from stored validators"""
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers['If-None-Match'] = validators["etag"]
+        if validators.get("last_modified"):
+            headers['If-Modified-Since'] = validators["last_modified"]
+    return headers
+
+
+def validators_match(validators, headers):
+    """Check whether response headers describe the same file as stored validators
+
+    Used when a server ignores conditional headers and answers 200 anyway.
+    """
+    if not validators:
+        return False
+    etag = headers.get('etag', '')
+    if etag and validators.get("etag"):
+        return etag == validators["etag"]
+    last_modified = headers.get('last-modified', '')
+    length = headers.get('content-length')
+    return bool(last_modified and length and last_modified == validators.get("last_modified")
+                and int(length) == validators.get("content_length"))
+
+
+class ProgressReader:
+    """File-like wrapper over a response stream that reports progress and honours a CancelToken
+
+    Lets consumers such as tarfile read straight off the network while the
+    bytes are counted for progress_callback(downloaded, total) and charged to
+    an optional bandwidth limiter.
+    """
+
+    def __init__(self, stream, total=0, progress_callback=None, token=None, limiter=None):
+        self.stream = stream
+        self.total = total
+        self.downloaded = 0
+        self.progress_callback = progress_callback
+        self.token = token or CancelToken()
+        self.limiter = limiter
+
+    def read(self, size=-1):
+        self.token.raise_if_triggered()
+        data = self.stream.read(size)
+        self.token.raise_if_triggered()
+        self.downloaded += len(data)
+        if self.limiter and data:
+            self.limiter.consume(len(data), self.token)
+        if self.progress_callback and data:
+            self.progress_callback(self.downloaded, self.total)
+        return data
+
+
+class DownloadResult:
+    """Outcome of SegmentedDownloader.download"""
+
+    def __init__(self, headers, size=0, not_modified=False, ttfb=None, transferred=0, elapsed=0.0, digest=None,
+                 swf_header=None, patched=False):
+        # Headers of the probe (or streaming GET) response, for version extraction
+        self.headers = headers
+        self.size = size
+        self.not_modified = not_modified
+        # Seconds until the server answered the probe, None if it rejected HEAD
+        self.ttfb = ttfb
+        # Bytes fetched by this call, excluding any resumed part, and how long it took
+        self.transferred = transferred
+        self.elapsed = elapsed
+        # SHA-256 of the file, computed while it was written or taken from the object store
+        self.digest = digest
+        # First bytes of a transferred file, for the SWF version
+        self.swf_header = swf_header
+        # Whether the file was rebuilt from a delta against the previous version
+        self.patched = patched
+
+    @property
+    def throughput(self):
+        """Bytes per second of this transfer, or 0 if nothing was transferred"""
+        return self.transferred / self.elapsed if self.transferred and self.elapsed > 0 else 0.0
+
+
+class SegmentedDownloader:
+    # How often the journal is flushed while a transfer is running
+    JOURNAL_INTERVAL = 1.0
+
+    def __init__(self, segments=4, min_segment_size=1024 * 1024, chunk_size=64 * 1024, timeout=30, transport=None,
+                 bandwidth=None, delta_hosts=()):
+        self.transport = transport or get_transport()
+        # Global and per-transfer caps, see bandwidth.py
+        self.bandwidth = bandwidth or get_bandwidth()
+        self.segments = max(1, int(segments))
+        self.min_segment_size = max(1, int(min_segment_size))
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        # Mirrors that publish deltas, "host" or "host:port"; only they are asked for a
+        # delta from the installed version, others would answer with the whole file
+        self.delta_hosts = {host.lower() for host in delta_hosts}
+
+    @classmethod
+    def from_config(cls, config, transport=None):
+        """Create a downloader from the "downloads" section of config.json"""
+        options = (config or {}).get("downloads", {})
+        return cls(
+            transport=transport or get_transport(config),
+            segments=options.get("segments", 4),
+            min_segment_size=options.get("min_segment_size", 1024 * 1024),
+            chunk_size=options.get("chunk_size", 64 * 1024),
+            timeout=options.get("timeout", 30),
+            delta_hosts=options.get("delta_hosts", [])
+        )
+
+    def start(self):
+        """Prepare for the first download, nothing to do when transfers run in this process"""
+
+    def prewarm(self, urls):
+        """Open connections to the hosts of urls on the transport downloads use"""
+        self.transport.prewarm(urls)
+
+    def probe(self, url, headers=None):
+        """Return the status, size, range support and validators of a URL"""
+        response = self.transport.head(url, headers=headers, timeout=self.timeout, allow_redirects=True)
+        response.raise_for_status()
+
+        return {
+            "status": response.status_code,
+            "headers": response.headers,
+            "size": int(response.headers.get('content-length', 0)),
+            "accepts_ranges": response.headers.get('accept-ranges', '').lower() == 'bytes',
+            "etag": response.headers.get('etag', ''),
+            "last_modified": response.headers.get('last-modified', '')
+        }
+
+    def download(self, url, file_path, progress_callback=None, validators=None, token=None, store=None):
+        """Download url to file_path, resuming and using parallel byte ranges when possible
+
+        Data is written to "{file_path}.part" alongside a journal of completed
+        ranges and hashed as it arrives. The file is only moved to file_path
+        once its length and any Digest/Repr-Digest header check out.
+
+        Args:
+            url: URL to download
+            file_path: Destination file path
+            progress_callback: Optional callable(downloaded, total) for combined progress
+            validators: Stored validators of the existing file_path, used to
+                revalidate it with If-None-Match/If-Modified-Since
+            token: Optional CancelToken. Cancelling removes the partial file,
+                pausing keeps it and its journal for the next attempt
+            store: Optional ObjectStore. When the validators of url match a
+                stored object, file_path is linked to it without a transfer.
+                Otherwise an existing file_path is patched with a delta when
+                the server has one for it (RFC 3229 A-IM with its ETag)
+
+        Returns:
+            DownloadResult, with not_modified set when the transfer was skipped
+            and digest set to the SHA-256 of the file otherwise
+
+        Raises:
+            TransferCancelled: The token was cancelled (TransferPaused if paused)
+            IntegrityError: The file failed verification, its .part file is removed
+        """
+        part_path = file_path + ".part"
+        journal = DownloadJournal(part_path + ".json")
+        token = token or CancelToken()
+
+        try:
+            return self._download(url, file_path, part_path, journal, progress_callback, validators, token,
+                                  self.bandwidth.transfer(), store)
+        except IntegrityError:
+            # The bytes on disk are bad, a retry must not resume from them
+            self._discard(part_path, journal)
+            raise
+        except Exception:
+            if not token.triggered:
+                raise
+            if not token.paused:
+                self._discard(part_path, journal)
+            # Errors from the closed sockets are only a symptom of the cancel
+            token.raise_if_triggered()
+            raise
+
+    @staticmethod
+    def _discard(part_path, journal):
+        journal.remove()
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+
+    def _download(self, url, file_path, part_path, journal, progress_callback, validators, token, limiter, store=None):
+
+        # Only revalidate when there is a file to keep
+        conditional = conditional_headers(validators) if os.path.exists(file_path) else {}
+
+        started = time.monotonic()
+        ttfb = None
+        try:
+            info = self.probe(url, conditional)
+            ttfb = time.monotonic() - started
+        except requests.RequestException:
+            # Some servers reject HEAD, let the streaming GET report real errors
+            info = {"status": 0, "headers": {}, "size": 0, "accepts_ranges": False, "etag": "", "last_modified": ""}
+
+        if conditional and (info["status"] == 304 or validators_match(validators, info["headers"])):
+            return DownloadResult(info["headers"], os.path.getsize(file_path), not_modified=True, ttfb=ttfb)
+
+        digest = store.find(info["headers"]) if store is not None else None
+        if digest:
+            # Same content as a stored object, e.g. an earlier version or another game
+            try:
+                store.link(digest, file_path)
+            except FileNotFoundError:
+                # Collected since find(), download it instead
+                digest = None
+        if digest:
+            journal.remove()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return DownloadResult(info["headers"], os.path.getsize(file_path), ttfb=ttfb, digest=digest)
+
+        # A journal means a full transfer is under way, finish that instead
+        if (self._serves_deltas(url) and info["status"] == 200 and conditional.get('If-None-Match')
+                and journal.load() is None):
+            patched = None
+            try:
+                patched = self._download_delta(url, file_path, part_path, conditional, info, progress_callback,
+                                               token, limiter)
+            except Exception as e:
+                token.raise_if_triggered()
+                print(f"Could not patch {file_path}, downloading the whole file: {str(e)}")
+                self._discard(part_path, journal)
+            if patched:
+                verifier, transferred = patched
+                commit(part_path, file_path)
+                return DownloadResult(info["headers"], os.path.getsize(file_path), ttfb=ttfb, transferred=transferred,
+                                      elapsed=time.monotonic() - started, digest=verifier.hash.hexdigest,
+                                      swf_header=verifier.swf.header, patched=True)
+
+        headers = info["headers"]
+        resumed = 0
+        verifier = Verifier(part_path)
+        # Ranged bodies are checked against the probe size, already enforced by _download_ranges
+        expected_size = None
+        if info["accepts_ranges"] and info["size"] > 0:
+            state = self._resume_state(journal, part_path, url, info)
+            resumed = sum(end - start for start, end in merge_ranges(state["completed"]))
+            try:
+                self._download_ranges(url, part_path, journal, state, progress_callback, token, limiter, verifier)
+            except RangeNotSupported:
+                # The file changed since the journal was written, or the server
+                # advertised ranges but answered with the full body
+                journal.remove()
+                resumed = 0
+                verifier = Verifier(part_path)
+                headers = self._download_stream(url, part_path, progress_callback, token=token, limiter=limiter,
+                                                verifier=verifier)
+                expected_size = self._expected_size(headers)
+        else:
+            journal.remove()
+            headers = self._download_stream(url, part_path, progress_callback, conditional, token, limiter, verifier)
+            if headers is None:
+                return DownloadResult(info["headers"], os.path.getsize(file_path), not_modified=True, ttfb=ttfb)
+            expected_size = self._expected_size(headers)
+
+        token.raise_if_triggered()
+        size = os.path.getsize(part_path)
+        digest = verifier.verify(size, expected_size, headers)
+        commit(part_path, file_path)
+        journal.remove()
+        return DownloadResult(headers, size, ttfb=ttfb, transferred=size - resumed,
+                              elapsed=time.monotonic() - started, digest=digest, swf_header=verifier.swf.header)
+
+    @staticmethod
+    def _expected_size(headers):
+        """Length a streamed body must have, None when it is unknown or content-encoded"""
+        if headers.get('content-encoding', 'identity').lower() != 'identity':
+            return None
+        return int(headers.get('content-length', 0)) or None
+
+    def _serves_deltas(self, url):
+        if not self.delta_hosts:
+            return False
+        parts = urlsplit(url)
+        return parts.netloc.lower() in self.delta_hosts or (parts.hostname or "") in self.delta_hosts
+
+    def _download_delta(self, url, file_path, part_path, conditional, info, progress_callback, token, limiter):
+        """Fetch a delta from the installed file_path and write the patched file to part_path
+
+        Returns (Verifier, delta size), or None when the server has no delta
+        for this file and the whole file has to be downloaded.
+        """
+        headers = {'A-IM': DELTA_FORMAT, 'If-None-Match': conditional['If-None-Match']}
+        with self.transport.get(url, headers=headers, stream=True, timeout=self.timeout) as r, token.watch(r):
+            r.raise_for_status()
+            if r.status_code != 226 or DELTA_FORMAT not in r.headers.get('im', '').lower():
+                # The body is the whole file, leave it to the segmented transfer
+                return None
+
+            total_size = int(r.headers.get('content-length', 0))
+            delta = bytearray()
+            for chunk in r.iter_content(chunk_size=self.chunk_size):
+                token.raise_if_triggered()
+                if chunk:
+                    delta += chunk
+                    if limiter:
+                        limiter.consume(len(chunk), token)
+                    if progress_callback:
+                        progress_callback(len(delta), total_size)
+        delta = bytes(delta)
+
+        _, _, target_size, target_digest = read_header(delta)
+        verifier = Verifier(part_path)
+        with open(part_path, 'wb') as f:
+            def write(offset, data):
+                f.write(data)
+                verifier.write(offset, data)
+
+            apply_delta(file_path, delta, write)
+        token.raise_if_triggered()
+        # The delta names its target, the probe may announce its digest as well
+        if verifier.verify(target_size, info["size"] or None, info["headers"]) != target_digest:
+            raise IntegrityError("Patched file does not match the target of the delta")
+        return verifier, len(delta)
+
+    def _resume_state(self, journal, part_path, url, info):
+        """Return journal state to continue from, or a fresh one"""
+        state = journal.load()
+        validator_matches = state is not None and (
+            (info["etag"] and state.get("etag") == info["etag"]) or
+            (not info["etag"] and info["last_modified"] and state.get("last_modified") == info["last_modified"])
+        )
+
+        if (validator_matches and state.get("url") == url and state.get("size") == info["size"]
+                and os.path.exists(part_path) and os.path.getsize(part_path) == info["size"]):
+            return state
+
+        # Start over with a preallocated file so every segment can write at its own offset
+        with open(part_path, 'wb') as f:
+            f.truncate(info["size"])
+
+        state = {
+            "url": url,
+            "etag": info["etag"],
+            "last_modified": info["last_modified"],
+            "size": info["size"],
+            "completed": []
+        }
+        journal.save(state)
+        return state
+
+    def _download_stream(self, url, file_path, progress_callback=None, conditional=None, token=None, limiter=None,
+                         verifier=None):
+        """Download over a single streaming connection, feeding verifier as it goes
+
+        Returns the response headers, or None if a conditional request was answered with 304.
+        """
+        token = token or CancelToken()
+        with self.transport.get(url, headers=conditional, stream=True, timeout=self.timeout) as r, token.watch(r):
+            r.raise_for_status()
+            if r.status_code == 304:
+                return None
+
+            total_size = int(r.headers.get('content-length', 0))
+            downloaded = 0
+
+            with open(file_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
+                    token.raise_if_triggered()
+                    if chunk:
+                        f.write(chunk)
+                        if verifier:
+                            verifier.write(downloaded, chunk)
+                        downloaded += len(chunk)
+                        if limiter:
+                            limiter.consume(len(chunk), token)
+                        if progress_callback:
+                            progress_callback(downloaded, total_size)
+
+            return r.headers
+
+    def _split(self, gaps):
+        """Split missing [start, end) ranges into at most self.segments pieces"""
+        remaining = sum(end - start for start, end in gaps)
+        target = max(self.min_segment_size, -(-remaining // self.segments))
+
+        pieces = []
+        for start, end in gaps:
+            while end - start > target and len(pieces) < self.segments - 1:
+                pieces.append([start, start + target])
+                start += target
+            pieces.append([start, end])
+        return pieces
+
+    def _download_ranges(self, url, part_path, journal, state, progress_callback=None, token=None, limiter=None,
+                         verifier=None):
+        """Fetch the missing byte ranges of part_path in parallel, feeding verifier as they arrive"""
+        token = token or CancelToken()
+        total_size = state["size"]
+        completed = merge_ranges(state["completed"])
+        pieces = self._split(missing_ranges(total_size, completed))
+
+        # If-Range makes the server send the full body instead if the file changed
+        validator = state["etag"] or state["last_modified"]
+
+        lock = threading.Lock()
+        stop_event = threading.Event()
+        errors = []
+        # Current write position of each piece, journaled as [start, position)
+        positions = [start for start, _ in pieces]
+        counters = {
+            'downloaded': sum(end - start for start, end in completed),
+            'last_flush': time.monotonic()
+        }
+
+        def flush_journal():
+            ranges = completed + [[pieces[i][0], positions[i]] for i in range(len(pieces))]
+            state["completed"] = merge_ranges(ranges)
+            try:
+                journal.save(state)
+            except OSError as e:
+                print(f"Error saving download journal: {str(e)}")
+
+        def fetch_piece(index):
+            start, end = pieces[index]
+            try:
+                headers = {'Range': f'bytes={start}-{end - 1}'}
+                if validator:
+                    headers['If-Range'] = validator
+
+                with self.transport.get(url, headers=headers, stream=True, timeout=self.timeout) as r, token.watch(r):
+                    r.raise_for_status()
+                    if r.status_code != 206 or not r.headers.get('content-range', '').startswith(f'bytes {start}-'):
+                        raise RangeNotSupported(f"Server ignored range {start}-{end - 1}")
+
+                    # Unbuffered, so journaled positions never run ahead of the file
+                    with open(part_path, 'r+b', buffering=0) as f:
+                        f.seek(start)
+                        for chunk in r.iter_content(chunk_size=self.chunk_size):
+                            if stop_event.is_set() or token.triggered:
+                                return
+                            if not chunk:
+                                continue
+                            chunk = chunk[:end - positions[index]]
+                            f.write(chunk)
+                            if verifier:
+                                verifier.write(positions[index], chunk)
+
+                            with lock:
+                                positions[index] += len(chunk)
+                                counters['downloaded'] += len(chunk)
+                                downloaded = counters['downloaded']
+                                now = time.monotonic()
+                                if now - counters['last_flush'] >= self.JOURNAL_INTERVAL:
+                                    counters['last_flush'] = now
+                                    flush_journal()
+
+                            if limiter:
+                                limiter.consume(len(chunk), token)
+                            if progress_callback:
+                                progress_callback(downloaded, total_size)
+
+                            if positions[index] >= end:
+                                break
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                stop_event.set()
+
+        threads = [threading.Thread(target=fetch_piece, args=(i,), daemon=True) for i in range(len(pieces))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Record what made it to disk so a later attempt can resume from here
+        with lock:
+            flush_journal()
+
+        token.raise_if_triggered()
+        if errors:
+            # Prefer the range error so the caller can fall back to a single stream
+            for error in errors:
+                if isinstance(error, RangeNotSupported):
+                    raise error
+            raise errors[0]
+
+        if missing_ranges(total_size, state["completed"]):
+            raise IncompleteDownload(f"Incomplete download: {counters['downloaded']} of {total_size} bytes")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Backends selectable with "transport" in the "downloads" section of config.json
+#
+# Every backend provides the same interface:
+#   head(url, headers=None, timeout=None, allow_redirects=False) -> requests.Response
+#   get(url, headers=None, timeout=None, stream=False) -> requests.Response, redirects followed
+#   prewarm(urls, timeout=5)
+#   stats() -> dict, see TransportStats.snapshot
+# Streamed responses support iter_content(), raw.read(), close() and use as a
+# context manager, and failures raise the usual requests exceptions.
+BACKENDS = ("requests", "asyncio")
+
+
+class TransportStats:
+    """Request, connection and byte counters of a transport
+
+    Throughput is measured over busy time, while at least one request is in
+    flight, so idle gaps and overlapping requests do not skew it.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self._active = 0
+        self._busy_since = 0.0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Count a request being sent"""
+        with self._lock:
+            self.requests += 1
+            if not self._active:
+                self._busy_since = time.monotonic()
+            self._active += 1
+
+    def end(self, received=0):
+        """Count a request whose response was read or closed, with its body bytes"""
+        with self._lock:
+            self.bytes += received
+            self._active -= 1
+            if not self._active:
+                self.busy += time.monotonic() - self._busy_since
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+
+    def snapshot(self, backend, connections=None):
+        """Return the counters as a dict, connections overrides the counted new connections"""
+        with self._lock:
+            busy = self.busy + (time.monotonic() - self._busy_since if self._active else 0.0)
+            connections = self.connections if connections is None else connections
+            return {
+                "backend": backend,
+                "requests": self.requests,
+                "connections": connections,
+                "reused": max(0, self.requests - connections),
+                "bytes": self.bytes,
+                "busy": busy,
+                "throughput": self.bytes / busy if busy > 0 else 0.0
+            }
+
+
+class HttpTransport:
+    """Shared HTTP session reusing keep-alive connections across HEAD and GET requests
+
+    The session is only used for stateless requests (no cookies or auth are
+    changed after creation), so it can be shared between download threads.
+    """
+
+    name = "requests"
+
+    def __init__(self, pool_connections=8, pool_maxsize=16, timeout=30):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._stats = TransportStats()
+
+        # pool_connections is the number of hosts kept, pool_maxsize the connections per host
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.adapter = adapter
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a transport sized from the "downloads" section of config.json"""
+        options = (config or {}).get("downloads", {})
+        segments = options.get("segments", 4)
+        return cls(
+            pool_connections=options.get("pool_connections", 8),
+            # Room for every segment of a transfer plus update checks running alongside it
+            pool_maxsize=options.get("pool_maxsize", max(16, segments * 4)),
+            timeout=options.get("timeout", 30)
+        )
+
+    def head(self, url, **kwargs):
+        """Send a HEAD request over the shared session"""
+        return self._request(self.session.head, url, kwargs)
+
+    def get(self, url, **kwargs):
+        """Send a GET request over the shared session"""
+        return self._request(self.session.get, url, kwargs)
+
+    def _request(self, send, url, kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        self._stats.begin()
+        try:
+            response = send(url, **kwargs)
+        except Exception:
+            self._stats.end()
+            raise
+        if not kwargs.get("stream"):
+            self._stats.end(len(response.content))
+            return response
+
+        # Count a streamed body once it is closed, tell() is the bytes read off the socket
+        close = response.close
+        closed = []
+
+        def close_and_count():
+            if not closed:
+                closed.append(True)
+                self._stats.end(response.raw.tell() if response.raw is not None else 0)
+            close()
+
+        response.close = close_and_count
+        return response
+
+    def stats(self):
+        """Return request, connection reuse and throughput counters, see TransportStats"""
+        # urllib3 counts the connections each host pool opened
+        pools = self.adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        return self._stats.snapshot(self.name, connections)
+
+    def prewarm(self, urls, timeout=5):
+        """Open connections to the hosts of urls in the background"""
+        origins = []
+        for url in urls:
+            parts = urlsplit(url)
+            origin = f"{parts.scheme}://{parts.netloc}/"
+            if parts.netloc and origin not in origins:
+                origins.append(origin)
+
+        def warm(origin):
+            try:
+                # The response itself does not matter, only the pooled connection
+                self.head(origin, timeout=timeout).close()
+            except requests.RequestException as e:
+                print(f"Could not pre-warm connection to {origin}: {str(e)}")
+
+        for origin in origins:
+            thread = threading.Thread(target=warm, args=(origin,))
+            thread.daemon = True
+            thread.start()
+
+
+def create_transport(config=None, backend=None):
+    """Create the transport backend named by backend or by "transport" in config.json"""
+    backend = backend or (config or {}).get("downloads", {}).get("transport", "requests")
+    if backend == "asyncio":
+        from async_transport import AsyncioTransport
+        return AsyncioTransport.from_config(config)
+    if backend != "requests":
+        print(f"Unknown transport backend {backend}, using requests")
+    return HttpTransport.from_config(config)
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport(config=None):
+    """Get the process-wide transport, creating it from config on first use"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = create_transport(config)
+        return _transport
@@ -1,50 +1,86 @@
 #!/usr/bin/env python3
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 import time
 import os
-import requests
 import tkinter as tk
 from base_manager import BaseManager
+from transfer import TransferCancelled, conditional_headers, validators_match
+from transport import get_transport
+from fingerprint import extract_filename_and_version
+from mirrors import MirrorRanking, download_from_mirrors
+from retry import CircuitOpen, RetryPolicy
+from connectivity import get_connectivity
+from progress import ProgressBus, format_transfer
+from scheduler import DownloadScheduler, PRIORITY_BACKGROUND
+from worker import create_downloader
+from object_store import get_object_store
+from installs import GameInstalls
+from game_index import get_game_index
 
 class UpdateManager(BaseManager):
+    # Update checks run in parallel and must all answer within CHECK_DEADLINE seconds
+    CHECK_WORKERS = 6
+    CHECK_TIMEOUT = 10
+    CHECK_DEADLINE = 15
+    # Unreachable hosts should fail well before the deadline so a mirror or retry can still answer
+    CHECK_CONNECT_TIMEOUT = 3
+
     def __init__(self, config_manager, game_manager, download_manager=None, status_callback=None):
         super().__init__(status_callback)
         self.config_manager = config_manager
         self.game_manager = game_manager
         self.download_manager = download_manager
-        self.is_updating = False # To prevent multiple update downloads at once
+        self._downloader = None
+        self._scheduler = None
+        self._progress_bus = None
+        self.transport = get_transport(config_manager.config)
+        # Update checks get one quick retry, all within the check deadline
+        self.check_retry = RetryPolicy.from_config(config_manager.config, attempts=2, max_delay=1.0)
+        # Latency of the last update check: {total, games: {game: seconds}, timed_out}
+        self.check_stats = {"total": None, "games": {}, "timed_out": []}
 
-    def _extract_filename_and_version(self, url, response):
-        """Extract filename and version from URL or response headers"""
-        filename = ""
-        version = ""
-        
-        if "content-disposition" in response.headers:
-            try:
-                filename = response.headers['content-disposition'].split('filename=')[1].strip('"')
-            except (IndexError, KeyError):
-                filename = url.split('/')[-1]
-        else:
-            filename = url.split('/')[-1]
-        
-        if '-v' in filename:
-            try:
-                version = filename.split('-v')[1].split('.swf')[0]
-            except (IndexError, KeyError):
-                version = str(int(time.time()))
-        else:
-            version = str(int(time.time()))
-            
-        return filename, version
+    def _get_downloader(self):
+        """Get the segmented downloader, shared with DownloadManager when available"""
+        if self.download_manager:
+            return self.download_manager.downloader
+        if self._downloader is None:
+            self._downloader = create_downloader(self.config_manager.config, self.transport)
+        return self._downloader
+
+    @property
+    def is_updating(self):
+        """Check whether update downloads are queued or running on the scheduler"""
+        return self._get_scheduler().is_active(background=True)
+
+    def _get_scheduler(self):
+        """Get the download scheduler, shared with DownloadManager when available"""
+        if self.download_manager:
+            return self.download_manager.scheduler
+        if self._scheduler is None:
+            self._scheduler = DownloadScheduler.from_config(self.config_manager.config)
+        return self._scheduler
+
+    def _get_retry(self):
+        """Get the download retry policy, shared with DownloadManager when available"""
+        if self.download_manager:
+            return self.download_manager.retry
+        return RetryPolicy.from_config(self.config_manager.config)
+
+    def _get_progress_bus(self):
+        """Get the progress bus, shared with DownloadManager when available"""
+        if self.download_manager:
+            return self.download_manager.progress_bus
+        if self._progress_bus is None:
+            self._progress_bus = ProgressBus()
+        return self._progress_bus
+
+    def _extract_filename_and_version(self, url, response, local_path=None, header=None):
+        """Extract filename and a stable version from the response, see fingerprint.py"""
+        return extract_filename_and_version(url, response, self.transport, local_path, header)
     
     def check_updates(self, root=None):
         """Check for updates to Flash Player and games"""
-        if self.download_manager and self.download_manager.is_download_in_progress():
-            self.show_dialog(root, "Download in Progress", 
-                           "Cannot check for updates while another download is in progress.", 
-                           dialog_type="info")
-            return
-
         if self.is_updating:
             self.show_dialog(root, "Update in Progress", 
                            "An update process is already running.", 
@@ -56,38 +92,312 @@ class UpdateManager(BaseManager):
         thread.daemon = True
         thread.start()
     
+    def _check_game(self, game, stats, deadline_at=None):
+        """Fetch the server version of a game, returning (server_version, latency)
+
+        server_version is None when the installed file is still current.
+        Retries stop at deadline_at, a time.monotonic() value.
+        """
+        started = time.monotonic()
+        deadline_at = deadline_at or started + self.CHECK_DEADLINE
+        try:
+            ranking = MirrorRanking(self.config_manager, game)
+            urls = ranking.rank_for_check(self.config_manager.get_game_urls(game))
+            if not urls:
+                raise ValueError(f"No URL configured for {game}")
+            
+            # Revalidate the installed file instead of relying on the filename alone
+            validators = self.config_manager.get_validators(game)
+            if not os.path.exists(os.path.join(self.config_manager.games_dir, f"{game}.swf")):
+                validators = None
+            
+            def head(url, remaining):
+                timeout = min(self.CHECK_TIMEOUT, max(remaining, 0.1))
+                response = self.transport.head(url, headers=conditional_headers(validators),
+                                               timeout=(min(self.CHECK_CONNECT_TIMEOUT, timeout), timeout))
+                response.raise_for_status()
+                return response
+            
+            # Retry transient errors, then ask the next mirror when one is down
+            for i, url in enumerate(urls):
+                try:
+                    response = self.check_retry.call(lambda remaining: head(url, remaining), url,
+                                                     deadline=deadline_at - time.monotonic())
+                except Exception as e:
+                    if not isinstance(e, CircuitOpen):
+                        ranking.record(url, error=True)
+                    if i == len(urls) - 1:
+                        raise
+                    continue
+                ranking.record(url, ttfb=response.elapsed.total_seconds())
+                break
+            
+            if response.status_code == 304 or validators_match(validators, response.headers):
+                # Unchanged since it was downloaded
+                return None, time.monotonic() - started
+            
+            _, server_version = self._extract_filename_and_version(url, response)
+            return server_version, time.monotonic() - started
+        finally:
+            stats["games"][game] = time.monotonic() - started
+
+    def _update_message(self, game, current_version, server_version):
+        """Describe the update of a game, or return None if it has none"""
+        if server_version is None:
+            return None
+        
+        if not server_version:
+            # No stable version could be derived, only report missing games
+            if current_version:
+                return None
+            server_version = "latest"
+        
+        if not current_version or current_version != server_version:
+            return f"{game}: v{current_version or 'none'} → v{server_version}"
+        return None
+
+    def _check_updates_offline(self, root, games):
+        """Answer an update check from the results of the last one, without network calls"""
+        cache = self.config_manager.check_cache
+        update_messages = []
+        checked_at = []
+        for game, current_version in games.items():
+            entry = cache.get(game)
+            if not entry:
+                continue
+            checked_at.append(entry.get("checked_at", 0))
+            message = self._update_message(game, current_version, entry.get("server_version"))
+            if message:
+                update_messages.append(message)
+        
+        if not checked_at:
+            status = "Offline, updates have not been checked yet"
+        else:
+            since = time.strftime("%Y-%m-%d %H:%M", time.localtime(min(checked_at)))
+            if update_messages:
+                status = f"Offline, updates found as of {since}: " + ", ".join(update_messages)
+            else:
+                status = f"Offline, no updates as of {since}"
+        root.after(0, lambda: self.set_status(status))
+
+    def _run_checks(self, games, started, on_result):
+        """Check every game in parallel, calling on_result(game, message, error) as each one answers
+
+        message is the update description, or None when the game is current.
+        error is the exception of a failed check. Returns the games that did
+        not answer before the check deadline.
+        """
+        timed_out = []
+        self.check_stats = {"total": None, "games": {}, "timed_out": timed_out}
+        
+        # Fan the HEAD requests out so one slow host does not hold up the others
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.CHECK_WORKERS, len(games))))
+        deadline_at = started + self.CHECK_DEADLINE
+        futures = {executor.submit(self._check_game, game, self.check_stats, deadline_at): game for game in games}
+        
+        try:
+            # The deadline counts from started, which precedes the connectivity probe
+            for future in as_completed(futures, timeout=max(0, deadline_at - time.monotonic())):
+                game = futures[future]
+                try:
+                    server_version, _ = future.result()
+                    
+                    # Remembered for checks made while offline
+                    with self.config_manager.lock:
+                        self.config_manager.check_cache[game] = {
+                            "server_version": server_version,
+                            "checked_at": time.time()
+                        }
+                except Exception as e:
+                    print(f"Error checking updates for {game}: {str(e)}")
+                    on_result(game, None, e)
+                    continue
+                on_result(game, self._update_message(game, games[game], server_version), None)
+        except FuturesTimeoutError:
+            # Report what arrived in time and leave the stragglers out
+            timed_out.extend(game for future, game in futures.items() if not future.done())
+            print(f"Update check deadline reached, not checked: {', '.join(timed_out)}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        self.config_manager.save_check_cache()
+        return timed_out
+
     def _check_updates_thread(self, root):
         """Background thread for checking updates"""
         try:
-            updates_available = False
             update_messages = []
             
-            for game, current_version in self.config_manager.version["games"].items():
-                if game in self.config_manager.config["game_urls"]:
-                    try:
-                        url = self.config_manager.config["game_urls"][game]
-                        response = requests.head(url, timeout=10)
-                        response.raise_for_status()
-                        
-                        _, server_version = self._extract_filename_and_version(url, response)
-                        
-                        if not current_version or current_version != server_version:
-                            updates_available = True
-                            update_messages.append(f"{game}: v{current_version or 'none'} → v{server_version}")
-                    except Exception as e:
-                        print(f"Error checking updates for {game}: {str(e)}")
+            started = time.monotonic()
+            
+            games = {game: current_version
+                     for game, current_version in self.config_manager.version["games"].items()
+                     if game in self.config_manager.config["game_urls"]}
+            
+            # Skip the HEAD requests entirely when the hosts cannot be reached
+            if not get_connectivity().ensure_probed():
+                self._check_updates_offline(root, games)
+                return
+            
+            if root and self.config_manager.config.get("updates", {}).get("pipeline", False):
+                self._check_and_download(root, games, started)
+                return
+            
+            def on_result(game, message, error):
+                if message:
+                    update_messages.append(message)
+            
+            timed_out = self._run_checks(games, started, on_result)
+            updates_available = bool(update_messages)
+            
+            if get_connectivity().offline:
+                # The network went away during the check
+                self._check_updates_offline(root, games)
+                return
+            
+            self.check_stats["total"] = time.monotonic() - started
             
             if updates_available and root:
                 update_text = "Updates available: " + ", ".join(update_messages)
                 root.after(0, lambda: self.set_status(update_text))
-                root.after(0, lambda: self._show_update_dialog(root, update_messages))
+                root.after(0, lambda: self._show_update_dialog(root, update_messages, timed_out))
+            elif timed_out:
+                root.after(0, lambda: self.set_status(f"No updates found, could not check: {', '.join(timed_out)}"))
             else:
                 root.after(0, lambda: self.set_status("No updates available"))
                 
         except Exception as e:
             root.after(0, lambda: self.set_status(f"Error checking updates: {str(e)}"))
     
-    def _show_update_dialog(self, root, update_messages):
+    def _check_and_download(self, root, games, started):
+        """Check every game and start each update download as soon as its check reports it
+
+        Runs on the check thread. The dialog opens right away with a row per
+        game, and rows fill in on the Tk thread as checks and transfers finish.
+        Downloads run in parallel under the scheduler's background limits.
+        """
+        dialog = {"rows": {}, "closed": False, "found": []}
+        root.after(0, lambda: self._show_pipeline_dialog(root, list(games), dialog))
+        
+        def on_result(game, message, error):
+            root.after(0, lambda: self._on_pipeline_check(dialog, game, message, error))
+        
+        timed_out = self._run_checks(games, started, on_result)
+        
+        offline = get_connectivity().offline
+        if offline:
+            # The network went away during the check
+            self._check_updates_offline(root, games)
+        
+        self.check_stats["total"] = time.monotonic() - started
+        root.after(0, lambda: self._finish_pipeline_check(dialog, timed_out, offline))
+
+    def _show_pipeline_dialog(self, root, games, dialog):
+        """Show the live update dialog of a pipelined check, one row per game"""
+        update_window = tk.Toplevel(root)
+        update_window.title("Updates")
+        update_window.geometry("400x320")
+        update_window.resizable(False, False)
+        update_window.transient(root)
+        update_window.grab_set()
+        
+        self.center_window(update_window, root)
+        
+        dialog['header'] = tk.Label(update_window, text="Checking for updates...")
+        dialog['header'].pack(pady=10)
+        
+        updates_frame = tk.Frame(update_window)
+        updates_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        game_rows = dialog['rows']
+        for i, game in enumerate(games):
+            game_frame = tk.Frame(updates_frame)
+            game_frame.grid(row=i, column=0, sticky=tk.W+tk.E, pady=2)
+            game_frame.columnconfigure(0, weight=1)
+            
+            message_label = tk.Label(game_frame, text=f"{game}: checking...", anchor=tk.W, fg="gray")
+            message_label.grid(row=0, column=0, sticky=tk.W)
+            
+            progress_label = tk.Label(game_frame, text="", width=15, anchor=tk.E)
+            progress_label.grid(row=0, column=1, sticky=tk.E, padx=5)
+            
+            # Only used to retry a failed download
+            download_btn = tk.Button(game_frame, text="Download", state=tk.DISABLED,
+                                   command=lambda g=game: self._download_update(g, game_rows, None))
+            download_btn.grid(row=0, column=2, padx=5, sticky=tk.E)
+            
+            game_rows[game] = {
+                'message_label': message_label,
+                'progress_label': progress_label,
+                'download_btn': download_btn,
+                'frame': game_frame,
+                'active': False
+            }
+        
+        btn_frame = tk.Frame(update_window)
+        btn_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        def close_window():
+            dialog['closed'] = True
+            # Pause the updates this dialog started, the next attempt resumes their partial files
+            for row in game_rows.values():
+                job = row.get('job')
+                if job is not None and not job.done():
+                    self._get_scheduler().cancel(job, pause=True)
+            update_window.destroy()
+        
+        update_window.protocol("WM_DELETE_WINDOW", close_window)
+        tk.Button(btn_frame, text="Close", command=close_window).pack(side=tk.RIGHT, padx=5)
+
+    def _on_pipeline_check(self, dialog, game, message, error):
+        """Fill in the row of a checked game and start its download if it has an update"""
+        row = dialog['rows'].get(game)
+        if row is None or dialog['closed']:
+            return
+        
+        try:
+            if message:
+                dialog['found'].append(message)
+                row['message_label'].config(text=message, fg="black")
+                row['active'] = True
+                self._submit_updates([game], dialog['rows'], None)
+            elif error:
+                row['message_label'].config(text=f"{game}: could not check")
+                row['progress_label'].config(text="Error!")
+            else:
+                row['message_label'].config(text=f"{game}: up to date")
+        except tk.TclError:
+            # Window was destroyed
+            pass
+
+    def _finish_pipeline_check(self, dialog, timed_out, offline=False):
+        """Report the outcome of a pipelined check once every game has answered or timed out"""
+        found = dialog['found']
+        if offline:
+            # The status already shows the cached answer
+            pass
+        elif found:
+            self.set_status("Updates available: " + ", ".join(found))
+        elif timed_out:
+            self.set_status(f"No updates found, could not check: {', '.join(timed_out)}")
+        else:
+            self.set_status("No updates available")
+        
+        if dialog['closed'] or 'header' not in dialog:
+            return
+        try:
+            for game in timed_out:
+                row = dialog['rows'].get(game)
+                if row is not None:
+                    row['message_label'].config(text=f"{game}: could not check in time")
+            if found:
+                dialog['header'].config(text=f"Downloading {len(found)} update{'s' if len(found) > 1 else ''}:")
+            else:
+                dialog['header'].config(text="No updates available")
+        except tk.TclError:
+            pass
+
+    def _show_update_dialog(self, root, update_messages, timed_out=None):
         """Show a simple, stateless dialog with available updates"""
         update_window = tk.Toplevel(root)
         update_window.title("Updates Available")
@@ -100,6 +410,9 @@ class UpdateManager(BaseManager):
 
         tk.Label(update_window, text="The following updates are available:").pack(pady=10)
         
+        if timed_out:
+            tk.Label(update_window, text=f"Could not check in time: {', '.join(timed_out)}", fg="gray").pack()
+        
         updates_frame = tk.Frame(update_window)
         updates_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
@@ -135,7 +448,16 @@ class UpdateManager(BaseManager):
                                    command=lambda: self._download_all_updates(update_messages, game_rows, download_all_btn))
         download_all_btn.pack(side=tk.LEFT, padx=5)
         
-        tk.Button(btn_frame, text="Close", command=update_window.destroy).pack(side=tk.RIGHT, padx=5)
+        def close_window():
+            # Pause the updates this dialog started, the next attempt resumes their partial files
+            for row in game_rows.values():
+                job = row.get('job')
+                if job is not None and not job.done():
+                    self._get_scheduler().cancel(job, pause=True)
+            update_window.destroy()
+        
+        update_window.protocol("WM_DELETE_WINDOW", close_window)
+        tk.Button(btn_frame, text="Close", command=close_window).pack(side=tk.RIGHT, padx=5)
 
     def _toggle_buttons(self, game_rows, download_all_btn, state):
         """Enable or disable all download buttons."""
@@ -144,29 +466,23 @@ class UpdateManager(BaseManager):
                 download_all_btn.config(state=state)
             for game, row in game_rows.items():
                 # Only toggle buttons for active rows
-                if row.get('active', False):
-                    row['download_btn'].config(state=state)
+                if not row.get('active', False):
+                    continue
+                # Rows whose download is still running stay disabled
+                job = row.get('job')
+                if state == tk.NORMAL and job is not None and not job.done():
+                    continue
+                row['download_btn'].config(state=state)
         except (tk.TclError, KeyError):
             # Window or widgets might have been destroyed
             pass
 
     def _download_update(self, game, game_rows, download_all_btn):
         """Download a single game update."""
-        if self.is_updating:
-            return
-        
-        self._toggle_buttons(game_rows, download_all_btn, tk.DISABLED)
-        self.is_updating = True
-
-        thread = threading.Thread(target=self._download_worker, args=([game], game_rows, download_all_btn))
-        thread.daemon = True
-        thread.start()
+        self._submit_updates([game], game_rows, download_all_btn)
 
     def _download_all_updates(self, update_messages, game_rows, download_all_btn):
         """Download all available updates."""
-        if self.is_updating:
-            return
-            
         # Get the list of games that are still active in the UI
         games_to_download = [game for game, row in game_rows.items() if row.get('active', False)]
         
@@ -174,115 +490,156 @@ class UpdateManager(BaseManager):
             self.set_status("All available updates have been downloaded.")
             return
 
-        self._toggle_buttons(game_rows, download_all_btn, tk.DISABLED)
-        self.is_updating = True
-
-        thread = threading.Thread(target=self._download_worker, args=(games_to_download, game_rows, download_all_btn))
-        thread.daemon = True
-        thread.start()
+        self._submit_updates(games_to_download, game_rows, download_all_btn)
 
-    def _download_worker(self, games, game_rows, download_all_btn):
-        """Worker thread to download a list of games sequentially."""
-        for game in games:
+    def _make_row_updater(self, game, ui_row):
+        """Create the UI update function for a row, called on the Tk thread"""
+        def update_ui(progress, downloaded=None, total=None, rate=None, eta=None):
             try:
-                ui_row = game_rows.get(game)
-                if not ui_row:
-                    continue
+                # Update status bar
+                if progress < 100:
+                    status_msg = f"Downloading {game}: {progress}%"
+                    if downloaded is not None and total is not None and total > 0:
+                        status_msg = f"Downloading {game}: {progress}% {format_transfer(downloaded, total, rate, eta)}"
+                    self.set_status(status_msg)
+                else:
+                    self.set_status(f"Download complete: {game}")
 
-                # Define a thread-safe UI update function
-                def update_ui(progress, downloaded=None, total=None):
-                    try:
-                        # Update status bar
-                        if progress < 100:
-                            status_msg = f"Downloading {game}: {progress}%"
-                            if downloaded is not None and total is not None and total > 0:
-                                downloaded_mb = downloaded / (1024 * 1024)
-                                total_mb = total / (1024 * 1024)
-                                status_msg = f"Downloading {game}: {progress}% ({downloaded_mb:.1f}/{total_mb:.1f} MB)"
-                            self.set_status(status_msg)
-                        else:
-                            self.set_status(f"Download complete: {game}")
-
-                        # Update dialog UI
-                        if progress < 100:
-                            progress_text = f"{progress}%"
-                            if downloaded is not None and total is not None and total > 0:
-                                downloaded_mb = downloaded / (1024 * 1024)
-                                total_mb = total / (1024 * 1024)
-                                progress_text = f"{progress}% ({downloaded_mb:.1f}/{total_mb:.1f} MB)"
-                            ui_row['progress_label'].config(text=progress_text)
-                            ui_row['download_btn'].config(text="Downloading...")
-                        else:
-                            ui_row['progress_label'].config(text="Done!")
-                            ui_row['download_btn'].config(text="Downloaded", state=tk.DISABLED)
-                            # Mark as inactive so it's not re-enabled, then schedule for removal
-                            ui_row['active'] = False
-                            if 'frame' in ui_row:
-                                ui_row['frame'].after(500, ui_row['frame'].destroy)
-                    except (tk.TclError, KeyError):
-                        # Widget was destroyed
-                        pass
-                
-                # Initial UI update
-                ui_row['progress_label'].after(0, lambda: update_ui(0))
+                # Update dialog UI
+                if progress < 100:
+                    progress_text = f"{progress}%"
+                    if downloaded is not None and total is not None and total > 0:
+                        progress_text = f"{progress}% {format_transfer(downloaded, total, rate, eta)}"
+                    ui_row['progress_label'].config(text=progress_text)
+                    ui_row['download_btn'].config(text="Downloading...")
+                else:
+                    ui_row['progress_label'].config(text="Done!")
+                    ui_row['download_btn'].config(text="Downloaded", state=tk.DISABLED)
+                    # Mark as inactive so it's not re-enabled, then schedule for removal
+                    ui_row['active'] = False
+                    if 'frame' in ui_row:
+                        ui_row['frame'].after(500, ui_row['frame'].destroy)
+            except (tk.TclError, KeyError):
+                # Widget was destroyed
+                pass
+        
+        return update_ui
 
-                # Download the game
-                file_path, _ = self._download_game_internal(game, progress_callback=lambda p, d, t: ui_row['progress_label'].after(0, lambda: update_ui(p, d, t)))
+    def _submit_game(self, game):
+        """Queue a background download of a game and return its scheduler job"""
+        if self.download_manager:
+            return self.download_manager.submit_game(game, priority=PRIORITY_BACKGROUND)
+        
+        def fetch(token):
+            file_path, _ = self._download_game_internal(game, progress_callback=self._get_progress_bus().reporter(game),
+                                                        token=token)
+            if not file_path:
+                raise Exception(f"Failed to download {game}")
+            return file_path
+        
+        return self._get_scheduler().submit(game, fetch, url=self.config_manager.get_game_url(game),
+                                            priority=PRIORITY_BACKGROUND)
 
-                if file_path:
+    def _submit_updates(self, games, game_rows, download_all_btn):
+        """Queue game updates as background jobs on the download scheduler."""
+        self._toggle_buttons(game_rows, download_all_btn, tk.DISABLED)
+        
+        progress_bus = self._get_progress_bus()
+        pending = set(game for game in games if game in game_rows)
+        lock = threading.Lock()
+        
+        def on_done(job, game, ui_row, update_ui):
+            progress_bus.unsubscribe(game, update_ui)
+            file_path = None if job.error else job.result
+            
+            try:
+                if isinstance(job.error, TransferCancelled):
+                    # Paused when the dialog was closed, its rows are gone
+                    self.set_status(f"Download of {game} {job.state}")
+                elif file_path:
                     # Final UI update for success
                     ui_row['progress_label'].after(0, lambda: update_ui(100))
                 else:
                     # UI update for failure
-                    try:
-                        ui_row['progress_label'].after(0, lambda: ui_row['progress_label'].config(text="Error!"))
-                        ui_row['download_btn'].after(0, lambda: ui_row['download_btn'].config(text="Failed"))
-                        self.set_status(f"Error downloading {game}")
-                    except (tk.TclError, KeyError):
-                        pass
-                
-                time.sleep(0.5) # Small delay between downloads
-
-            except Exception as e:
-                print(f"Error in download worker for {game}: {str(e)}")
+                    ui_row['progress_label'].after(0, lambda: ui_row['progress_label'].config(text="Error!"))
+                    ui_row['download_btn'].after(0, lambda: ui_row['download_btn'].config(text="Failed"))
+                    self.set_status(f"Error downloading {game}")
+            except (tk.TclError, KeyError):
+                pass
+            
+            with lock:
+                pending.discard(game)
+                finished = not pending
+            
+            if finished:
+                # Re-enable buttons when all downloads are done
+                self._toggle_buttons(game_rows, download_all_btn, tk.NORMAL)
+                # Pipelined checks submit one game at a time, wait for the last of them
+                if not self.is_updating:
+                    self.set_status("Update process finished.")
+        
+        for game in list(pending):
+            ui_row = game_rows[game]
+            update_ui = self._make_row_updater(game, ui_row)
+            ui_row['progress_label'].config(text="Queued")
+            
+            # The transfer only stores byte counts, the bus redraws the row on its tick
+            progress_bus.attach(ui_row['progress_label'].winfo_toplevel())
+            progress_bus.subscribe(game, update_ui)
+            
+            # Joins a download of the same game that is already in flight, e.g. from Play
+            job = self._submit_game(game)
+            ui_row['job'] = job
+            job.add_done_callback(lambda job, game=game, ui_row=ui_row, update_ui=update_ui:
+                                  on_done(job, game, ui_row, update_ui))
 
-        # Re-enable buttons when all downloads are done
-        self.is_updating = False
-        self._toggle_buttons(game_rows, download_all_btn, tk.NORMAL)
-        self.set_status("Update process finished.")
+    def _download_game_internal(self, game, progress_callback=None, parent=None, token=None):
+        """Core download functionality.
 
-    def _download_game_internal(self, game, progress_callback=None, parent=None):
-        """Core download functionality."""
+        progress_callback(downloaded, total) is called from transfer threads
+        and should only record the counts, e.g. a ProgressBus reporter.
+        TransferCancelled from the optional cancel token is re-raised.
+        """
         try:
-            url = self.config_manager.config["game_urls"][game]
-            response = requests.head(url, timeout=10)
-            response.raise_for_status()
-            
-            _, version = self._extract_filename_and_version(url, response)
+            urls = self.config_manager.get_game_urls(game)
+            if not urls:
+                raise KeyError(game)
             
             game_filename = f"{game}.swf"
             file_path = os.path.join(self.config_manager.games_dir, game_filename)
+            store = get_object_store(self.config_manager.games_dir)
+            index = get_game_index(self.config_manager.games_dir)
             
-            with requests.get(url, stream=True, timeout=30) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get('content-length', 0))
-                downloaded = 0
-                
-                with open(file_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if progress_callback and total_size > 0:
-                                progress = int((downloaded / total_size) * 100)
-                                progress_callback(progress, downloaded, total_size)
-                                time.sleep(0.01)
-            
-            self.config_manager.version["games"][game] = version
-            self.config_manager.save_version_info()
-            self.set_status(f"{game} v{version} downloaded successfully")
+            # Resumes from a previous .part file when one exists, and skips the
+            # transfer when the stored validators show the file is unchanged or
+            # the object store already holds it
+            with index.changing():
+                url, download = download_from_mirrors(self._get_downloader(), MirrorRanking(self.config_manager, game),
+                                                      urls, file_path, progress_callback,
+                                                      validators=self.config_manager.get_validators(game),
+                                                      token=token, retry=self._get_retry(), store=store)
+                digest = store.add(file_path, None if download.not_modified else download.headers, download.digest)
+                index.update(file_path)
+            installs = GameInstalls(self.config_manager)
+            
+            if download.not_modified:
+                version = self.config_manager.version["games"].get(game, "")
+                installs.record(game, version, digest)
+                self.set_status(f"{game} is already up to date")
+                return file_path, version
+            
+            _, version = self._extract_filename_and_version(url, download, file_path, download.swf_header)
+            self.config_manager.set_validators(game, download.headers)
+            if not version:
+                version = self.config_manager.version["games"].get(game, "")
+            
+            self.config_manager.set_game_version(game, version)
+            installs.record(game, version, digest)
+            self.set_status(f"{game} v{version} {'patched' if download.patched else 'downloaded'} successfully")
             return file_path, version
             
+        except TransferCancelled:
+            raise
         except Exception as e:
             error_msg = f"Failed to download {game}: {str(e)}"
             self.set_status(f"Failed to download {game}")
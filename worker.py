@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+import atexit
+import itertools
+import multiprocessing
+import pickle
+import queue
+import threading
+from multiprocessing import shared_memory
+from transfer import SegmentedDownloader, CancelToken, IncompleteDownload
+from bandwidth import get_bandwidth
+from game_activity import lower_thread_priority
+
+
+class SharedProgress:
+    """Block of (downloaded, total) counters in shared memory, one slot per running transfer
+
+    The worker process stores a slot's two 8-byte counters on every chunk and
+    the launcher reads them on its own schedule, without locks or messages.
+    A read racing a write at worst sees the counters one chunk apart.
+    """
+
+    def __init__(self, slots=64, name=None):
+        self.slots = slots
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * 16)
+        self.counters = self.shm.buf.cast('q')
+        self._free = list(range(slots)) if self.owner else []
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def allocate(self):
+        """Reserve a zeroed slot for a new transfer"""
+        with self._lock:
+            if not self._free:
+                raise RuntimeError("Too many transfers running in the worker")
+            slot = self._free.pop()
+        self.write(slot, 0, 0)
+        return slot
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def write(self, slot, downloaded, total):
+        self.counters[2 * slot] = downloaded
+        self.counters[2 * slot + 1] = total
+
+    def read(self, slot):
+        """Return (downloaded, total) of a slot"""
+        return self.counters[2 * slot], self.counters[2 * slot + 1]
+
+    def close(self):
+        """Detach from the block, and free it if this side created it"""
+        self.counters.release()
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _pack_error(error):
+    """Return error if it survives pickling, otherwise an IOError with its message"""
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return IOError(f"{type(error).__name__}: {str(error)}")
+
+
+def _worker_main(conn, progress_name, slots, config):
+    """Entry point of the transfer worker process
+
+    Runs each requested download on its own thread with a SegmentedDownloader
+    and reports only the outcome over conn; progress goes to shared memory.
+    """
+    progress = SharedProgress(slots, progress_name)
+    downloader = SegmentedDownloader.from_config(config)
+    bandwidth = get_bandwidth()
+    tokens = {}
+    send_lock = threading.Lock()
+
+    def run(job_id, slot, url, file_path, validators, token, store):
+        def report(downloaded, total):
+            progress.write(slot, downloaded, total)
+
+        if token.background:
+            # This thread and the segment threads it starts do the actual I/O
+            lower_thread_priority()
+        try:
+            reply = ("done", job_id, downloader.download(url, file_path, report, validators=validators, token=token,
+                                                         store=store))
+        except Exception as e:
+            reply = ("error", job_id, _pack_error(e))
+        finally:
+            tokens.pop(job_id, None)
+        with send_lock:
+            conn.send(reply)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            # The launcher is gone
+            break
+
+        kind = message[0]
+        if kind == "download":
+            _, job_id, slot, url, file_path, validators, background, store = message
+            token = CancelToken(background=background)
+            tokens[job_id] = token
+            threading.Thread(target=run, args=(job_id, slot, url, file_path, validators, token, store),
+                             daemon=True).start()
+        elif kind == "stop":
+            _, job_id, pause = message
+            token = tokens.get(job_id)
+            if token is not None and pause:
+                token.pause()
+            elif token is not None:
+                token.cancel()
+        elif kind == "background":
+            _, job_id, background = message
+            token = tokens.get(job_id)
+            if token is not None:
+                token.background = background
+        elif kind == "prewarm":
+            _, urls = message
+            downloader.prewarm(urls)
+        elif kind == "limits":
+            _, global_rate, transfer_rate, background_rate = message
+            bandwidth.configure(global_rate, transfer_rate)
+            bandwidth.set_background_rate(background_rate)
+        elif kind == "exit":
+            break
+
+    # Keep partial files so the transfers resume next time
+    for token in list(tokens.values()):
+        token.pause()
+    progress.close()
+
+
+class WorkerDownloader(SegmentedDownloader):
+    """SegmentedDownloader whose transfers run in a separate worker process
+
+    Network and disk I/O happen in the worker, so the Tk process does no work
+    per chunk. The thread calling download() only polls the transfer's
+    shared-memory progress slot every POLL_INTERVAL seconds, forwards it to
+    progress_callback and relays token and bandwidth limit changes. The worker
+    is started on first use and restarted if it dies, in which case running
+    transfers fail with IncompleteDownload and resume from their journal.
+    start() launches the worker ahead of the first download, and prewarm()
+    opens connections in the worker, where the transfers run.
+
+    The worker inherits the priority of the thread that starts it, and lowered
+    priorities cannot be raised again. Worker processes are therefore started
+    from a thread created along with the downloader, which should happen on a
+    thread that was not lowered. The worker lowers background transfers itself.
+    """
+
+    # Seconds between progress reads while a transfer is running
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, config=None, progress_slots=64, **kwargs):
+        super().__init__(**kwargs)
+        self.config = config or {}
+        self.progress_slots = progress_slots
+        self._process = None
+        self._conn = None
+        self._progress = None
+        self._pending = {}  # {job_id: {done, reply, conn}}
+        self._limits = None
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._spawn_requests = queue.Queue()
+        threading.Thread(target=self._spawner, daemon=True).start()
+
+    @classmethod
+    def from_config(cls, config, transport=None):
+        downloader = super().from_config(config, transport)
+        downloader.config = config or {}
+        return downloader
+
+    def _spawner(self):
+        """Start worker processes on request, keeping the priority this thread was created with"""
+        while True:
+            request = self._spawn_requests.get()
+            try:
+                request["conn"] = self._start_worker()
+            except Exception as e:
+                request["error"] = e
+            request["done"].set()
+
+    def start(self):
+        """Start the worker process in the background, so the first download does not wait for it"""
+        threading.Thread(target=self._start_in_background, daemon=True).start()
+
+    def _start_in_background(self, urls=None):
+        try:
+            conn = self._ensure_worker()
+            if urls:
+                self._send(conn, ("prewarm", urls))
+        except Exception as e:
+            print(f"Error starting transfer worker: {str(e)}")
+
+    def prewarm(self, urls):
+        """Open connections to the hosts of urls here, for probes, and in the worker, for transfers"""
+        urls = list(urls)
+        super().prewarm(urls)
+        threading.Thread(target=self._start_in_background, args=(urls,), daemon=True).start()
+
+    def _ensure_worker(self):
+        """Start the worker process unless it is running, return its connection"""
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                return self._conn
+
+            # The calling job thread may run at background priority, which the worker would inherit
+            request = {"done": threading.Event(), "conn": None, "error": None}
+            self._spawn_requests.put(request)
+            request["done"].wait()
+            if request["error"] is not None:
+                raise request["error"]
+            return request["conn"]
+
+    def _start_worker(self):
+        """Start a worker process and return its connection, called on the spawner thread with _lock held"""
+        if self._progress is None:
+            self._progress = SharedProgress(self.progress_slots)
+            atexit.register(self.shutdown)
+        # spawn behaves the same everywhere and does not fork the Tk process
+        context = multiprocessing.get_context("spawn")
+        conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_worker_main,
+                                        args=(child_conn, self._progress.name, self.progress_slots, self.config),
+                                        daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = conn
+        self._limits = None
+        threading.Thread(target=self._read_replies, args=(conn,), daemon=True).start()
+        return conn
+
+    def _read_replies(self, conn):
+        while True:
+            try:
+                kind, job_id, value = conn.recv()
+            except (EOFError, OSError):
+                break
+            pending = self._pending.get(job_id)
+            if pending is not None:
+                pending["reply"] = (kind, value)
+                pending["done"].set()
+
+        # The worker exited, fail whatever it was still running
+        with self._lock:
+            if self._conn is conn:
+                self._process = None
+        for pending in list(self._pending.values()):
+            if pending["conn"] is conn and not pending["done"].is_set():
+                pending["reply"] = ("error", IncompleteDownload("Transfer worker exited"))
+                pending["done"].set()
+
+    def _send(self, conn, message):
+        with self._send_lock:
+            conn.send(message)
+
+    def _sync_limits(self, conn):
+        """Pass the current bandwidth limits on to the worker when they changed"""
+        limits = (self.bandwidth.global_bucket.rate, self.bandwidth.transfer_rate,
+                  self.bandwidth.background_bucket.rate)
+        if limits != self._limits:
+            self._limits = limits
+            self._send(conn, ("limits",) + limits)
+
+    def download(self, url, file_path, progress_callback=None, validators=None, token=None, store=None):
+        """Run SegmentedDownloader.download in the worker process, see there"""
+        token = token or CancelToken()
+        token.raise_if_triggered()
+        conn = self._ensure_worker()
+
+        job_id = next(self._ids)
+        slot = self._progress.allocate()
+        pending = {"done": threading.Event(), "reply": None, "conn": conn}
+        self._pending[job_id] = pending
+        try:
+            self._sync_limits(conn)
+            background = token.background
+            self._send(conn, ("download", job_id, slot, url, file_path, validators, background, store))
+
+            stopped = False
+            last = None
+            while True:
+                done = pending["done"].wait(self.POLL_INTERVAL)
+                if progress_callback:
+                    current = self._progress.read(slot)
+                    if current != last and current[1]:
+                        last = current
+                        progress_callback(*current)
+                if done:
+                    break
+
+                if token.triggered and not stopped:
+                    stopped = True
+                    self._send(conn, ("stop", job_id, token.paused))
+                if token.background != background:
+                    background = token.background
+                    self._send(conn, ("background", job_id, background))
+                self._sync_limits(conn)
+        except (EOFError, OSError) as e:
+            raise IncompleteDownload(f"Transfer worker unavailable: {str(e)}")
+        finally:
+            self._pending.pop(job_id, None)
+            self._progress.release(slot)
+
+        kind, value = pending["reply"]
+        if kind == "error":
+            if token.triggered:
+                token.raise_if_triggered()
+            raise value
+        return value
+
+    def shutdown(self):
+        """Stop the worker, pausing its transfers, and free the progress block"""
+        with self._lock:
+            process, self._process = self._process, None
+            conn = self._conn
+        if process is not None and process.is_alive():
+            try:
+                self._send(conn, ("exit",))
+            except (EOFError, OSError):
+                pass
+            process.join(2)
+            if process.is_alive():
+                process.terminate()
+        if self._progress is not None:
+            self._progress.close()
+            self._progress = None
+
+
+def create_downloader(config, transport=None):
+    """Create the downloader selected by "worker_process" in the "downloads" section of config.json"""
+    if (config or {}).get("downloads", {}).get("worker_process", False):
+        return WorkerDownloader.from_config(config, transport)
+    return SegmentedDownloader.from_config(config, transport)